@@ -0,0 +1,345 @@
+from datetime import date as _date
+import argparse
+
+import numpy as np
+
+from betlog import NO_DATE, BetLog
+from kpis import OUTCOMES, SERIES_POINTS, SETTLED_OUTCOMES, counted_stakes, lttb, outcome_codes
+from pricing import american_to_decimal_array
+from storage import open_store
+import journal
+import profiling
+
+# Default windows for the rolling ROI / win rate
+ROLLING_BETS = 100
+ROLLING_DAYS = 30
+# Dimensions compared on implied vs realized win rate
+IMPLIED_DIMENSIONS = ("sportsbook", "market")
+
+WIN, LOSS = OUTCOMES["Win"], OUTCOMES["Loss"]
+
+
+def _window_sums(values, window):
+    """Sum of the last `window` values ending at each position (fewer at the start)."""
+    totals = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    ends = np.arange(1, len(values) + 1)
+    return totals[ends] - totals[np.maximum(ends - window, 0)]
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), 0.0)
+
+
+def _day(ordinal):
+    return _date.fromordinal(int(ordinal)) if ordinal != NO_DATE else None
+
+
+# -------------------------------
+# Accumulator
+# -------------------------------
+class LedgerAnalytics:
+    """
+    Performance analytics over the ledger in ledger order: rolling ROI and win rate (by
+    the last N settled bets and by the last D days), max drawdown of cumulative Net PnL
+    and its longest duration, win / loss streaks, and average implied probability vs
+    realized win rate per sportsbook and market.
+
+    add() takes the ledger a BetLog chunk at a time; each chunk is a handful of
+    whole-column numpy passes, and only small running state is carried between
+    chunks (the last N settled bets, per-day sums, per-group sums), so a streamed
+    export or an incremental dashboard build adds just its new bets. as_dict() /
+    from_dict() round-trip that state through JSON.
+    """
+
+    def __init__(self, bets_window=ROLLING_BETS, days_window=ROLLING_DAYS, keep_series=False):
+        self.bets_window, self.days_window = int(bets_window), int(days_window)
+        self.bets = self.settled = 0
+        # Drawdown: running cumulative PnL, its peak (bet index, latest date seen there)
+        self.cumulative = self.peak = 0.0
+        self.peak_index, self.peak_day, self.latest_day = -1, NO_DATE, NO_DATE
+        self.max_drawdown, self.drawdown_days = 0.0, [NO_DATE, NO_DATE]
+        self.longest_bets = self.longest_days = 0
+        # Streaks: signed current run (+ wins / - losses) and the longest of each
+        self.streak = self.longest_win = self.longest_loss = 0
+        # Last bets_window settled bets: net, counted stake, won
+        self.tail = np.zeros((3, 0))
+        # date ordinal -> [net, counted stake, wins, settled bets]
+        self.days = {}
+        # dimension -> key -> [bets, summed implied probability, wins]
+        self.groups = {dim: {} for dim in IMPLIED_DIMENSIONS}
+        # Rolling-by-bets series (settled bet number, ROI, win rate), if kept
+        self.series = [] if keep_series else None
+
+    def add(self, log):
+        """Add the next bets (a BetLog, in ledger order)."""
+        if not len(log):
+            return self
+        outcome = outcome_codes(log)
+        net = np.nan_to_num(log.floats["Net PnL ($)"], nan=0.0)
+        settled = SETTLED_OUTCOMES[outcome]
+        stake = counted_stakes(log, outcome)  # as the KPIs count it
+        won = outcome == WIN
+
+        self._add_drawdown(log, net)
+        self._add_streaks(outcome[settled & (outcome <= LOSS)] == WIN)
+        self._add_rolling(net[settled], stake[settled], won[settled])
+        self._add_days(log.dates[settled], net[settled], stake[settled], won[settled])
+        self._add_implied(log, outcome)
+        self.bets += len(log)
+        return self
+
+    def _add_drawdown(self, log, net):
+        n = len(net)
+        index = self.bets + np.arange(n)
+        cumulative = self.cumulative + np.cumsum(net)
+        # Dates are not always in ledger order: measure days on the latest date seen so far
+        latest = np.maximum.accumulate(np.maximum(log.dates.astype(np.int64), self.latest_day))
+        peaks = np.maximum.accumulate(np.maximum(cumulative, self.peak))
+        at_peak = cumulative >= peaks
+        peak_index = np.maximum.accumulate(np.where(at_peak, index, self.peak_index))
+        local = peak_index - self.bets
+        start_day = self.peak_day
+        if start_day == NO_DATE and (latest != NO_DATE).any():
+            start_day = int(latest[latest != NO_DATE][0])  # an undated start counts from the first date
+        peak_day = np.where(local >= 0, latest[np.maximum(local, 0)], start_day)
+
+        drawdown = peaks - cumulative
+        worst = int(np.argmax(drawdown))
+        if drawdown[worst] > self.max_drawdown:
+            self.max_drawdown = float(drawdown[worst])
+            self.drawdown_days = [int(peak_day[worst]), int(latest[worst])]
+        self.longest_bets = max(self.longest_bets, int((index - peak_index).max()))
+        days = np.where((peak_day != NO_DATE) & (latest != NO_DATE), latest - peak_day, 0)
+        self.longest_days = max(self.longest_days, int(days.max()))
+
+        self.cumulative, self.peak = float(cumulative[-1]), float(peaks[-1])
+        self.peak_index, self.peak_day = int(peak_index[-1]), int(peak_day[-1])
+        self.latest_day = int(latest[-1])
+
+    def _add_streaks(self, wins):
+        """wins: one bool per won / lost bet (pushes and open bets neither extend nor break a run)."""
+        if not len(wins):
+            return
+        starts = np.concatenate(([0], np.flatnonzero(wins[1:] != wins[:-1]) + 1))
+        lengths = np.diff(np.concatenate((starts, [len(wins)])))
+        signs = np.where(wins[starts], 1, -1)
+        if self.streak * signs[0] > 0:
+            lengths[0] += abs(self.streak)  # the run carried over from the last chunk goes on
+        self.longest_win = max(self.longest_win, int(lengths[signs > 0].max(initial=0)))
+        self.longest_loss = max(self.longest_loss, int(lengths[signs < 0].max(initial=0)))
+        self.streak = int(signs[-1] * lengths[-1])
+
+    def _add_rolling(self, net, stake, won):
+        if not len(net):
+            return
+        columns = np.concatenate((self.tail, np.vstack((net, stake, won.astype(float)))), axis=1)
+        if self.series is not None:
+            sums = [_window_sums(column, self.bets_window)[self.tail.shape[1]:] for column in columns]
+            counts = np.minimum(self.settled + np.arange(1, len(net) + 1), self.bets_window)
+            numbers = self.settled + np.arange(1, len(net) + 1)
+            self.series.append((numbers, _ratio(sums[0], sums[1]), sums[2] / counts))
+        self.tail = columns[:, -self.bets_window:]
+        self.settled += len(net)
+
+    def _add_days(self, dates, net, stake, won):
+        dated = dates != NO_DATE
+        if not dated.any():
+            return
+        offsets = dates[dated].astype(np.int64)
+        first = int(offsets.min())
+        offsets -= first
+        sums = [np.bincount(offsets, weights=column[dated]) for column in (net, stake, won.astype(float))]
+        counts = np.bincount(offsets)
+        for offset in np.flatnonzero(counts).tolist():
+            day = self.days.setdefault(first + offset, [0.0, 0.0, 0, 0])
+            day[0] += float(sums[0][offset])
+            day[1] += float(sums[1][offset])
+            day[2] += int(sums[2][offset])
+            day[3] += int(counts[offset])
+
+    def _add_implied(self, log, outcome):
+        decimal = american_to_decimal_array(log.floats["Odds"])
+        graded = ((outcome == WIN) | (outcome == LOSS)) & (decimal > 1)
+        implied = np.where(graded, 1 / np.where(decimal > 1, decimal, 1), 0.0)
+        for dim in IMPLIED_DIMENSIONS:
+            header = dim.title()
+            codes, keys = log.codes[header][graded], log.categories[header]
+            bets = np.bincount(codes, minlength=len(keys))
+            probability = np.bincount(codes, weights=implied[graded], minlength=len(keys))
+            wins = np.bincount(codes, weights=(outcome[graded] == WIN).astype(float), minlength=len(keys))
+            groups = self.groups[dim]
+            for code in np.flatnonzero(bets).tolist():
+                group = groups.setdefault(str(keys[code]), [0, 0.0, 0])
+                group[0] += int(bets[code])
+                group[1] += float(probability[code])
+                group[2] += int(wins[code])
+
+    # -------------------------------
+    # Results
+    # -------------------------------
+    def rolling_days(self):
+        """(dates, ROI, win rate, settled bets) over the days_window days ending on each day with settled bets."""
+        if not self.days:
+            return [], np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64)
+        ordinals = np.array(sorted(self.days), dtype=np.int64)
+        first = int(ordinals[0])
+        dense = np.zeros((4, int(ordinals[-1]) - first + 1))
+        dense[:, ordinals - first] = np.array([self.days[ordinal] for ordinal in ordinals.tolist()]).T
+        sums = [_window_sums(column, self.days_window)[ordinals - first] for column in dense]
+        return (
+            [_date.fromordinal(ordinal) for ordinal in ordinals.tolist()],
+            _ratio(sums[0], sums[1]),
+            _ratio(sums[2], sums[3]),
+            sums[3].astype(np.int64),
+        )
+
+    def rolling_bets(self, points=SERIES_POINTS):
+        """(settled bet number, ROI, win rate) over the last bets_window settled bets, downsampled (keep_series only)."""
+        if not self.series:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        numbers, roi, win = (np.concatenate(parts) for parts in zip(*self.series))
+        keep = lttb(numbers, roi, points)
+        return numbers[keep], roi[keep], win[keep]
+
+    def implied(self, dimension):
+        """{key: {"bets", "implied_pct", "win_pct", "edge_pct"}} over won and lost bets with odds."""
+        out = {}
+        for key, (bets, probability, wins) in sorted(self.groups[dimension].items()):
+            implied, win = probability / bets, wins / bets
+            out[key] = {"bets": bets, "implied_pct": implied, "win_pct": win, "edge_pct": win - implied}
+        return out
+
+    def result(self):
+        """Headline figures (rates as fractions, like kpis) plus the implied-vs-realized groups."""
+        net, stake, won = self.tail.sum(axis=1)
+        count = self.tail.shape[1]
+        days, roi, win, settled = self.rolling_days()
+        return {
+            "bets": self.bets,
+            "rolling_bets": {
+                "window": self.bets_window, "bets": count,
+                "roi_pct": float(net / stake) if stake > 0 else 0.0,
+                "win_pct": float(won / count) if count else 0.0,
+            },
+            "rolling_days": {
+                "window": self.days_window, "through": days[-1] if days else None,
+                "bets": int(settled[-1]) if days else 0,
+                "roi_pct": float(roi[-1]) if days else 0.0,
+                "win_pct": float(win[-1]) if days else 0.0,
+            },
+            "drawdown": {
+                "max": self.max_drawdown,
+                "peak": _day(self.drawdown_days[0]),
+                "trough": _day(self.drawdown_days[1]),
+                "current": self.peak - self.cumulative,
+                "longest_bets": self.longest_bets,
+                "longest_days": self.longest_days,
+            },
+            "streaks": {"longest_win": self.longest_win, "longest_loss": self.longest_loss, "current": self.streak},
+            "implied": {dim: self.implied(dim) for dim in IMPLIED_DIMENSIONS},
+        }
+
+    # -------------------------------
+    # Saved state
+    # -------------------------------
+    _SCALARS = (
+        "bets_window", "days_window", "bets", "settled", "cumulative", "peak", "peak_index", "peak_day",
+        "latest_day", "max_drawdown", "drawdown_days", "longest_bets", "longest_days", "streak",
+        "longest_win", "longest_loss", "groups",
+    )
+
+    def as_dict(self):
+        """Running state as JSON-ready values (rolling series are not kept)."""
+        state = {name: getattr(self, name) for name in self._SCALARS}
+        state["tail"] = self.tail.tolist()
+        state["days"] = sorted(self.days.items())
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        """Inverse of as_dict(), to keep adding to a saved state."""
+        stats = cls(state["bets_window"], state["days_window"])
+        for name in cls._SCALARS:
+            setattr(stats, name, state[name])
+        stats.tail = np.array(state["tail"], dtype=float).reshape(3, -1)
+        stats.days = {int(ordinal): list(sums) for ordinal, sums in state["days"]}
+        return stats
+
+
+def analyze(log, bets_window=ROLLING_BETS, days_window=ROLLING_DAYS):
+    """LedgerAnalytics over a whole BetLog in one chunk, keeping the rolling series for charts."""
+    with profiling.span("analytics", rows=len(log)):
+        return LedgerAnalytics(bets_window, days_window, keep_series=True).add(log)
+
+
+# -------------------------------
+# Dashboard sheet rows
+# -------------------------------
+def analytics_rows(stats):
+    """[label, value] rows of the headline analytics (one table, ten figures)."""
+    result = stats.result()
+    by_bets, by_days = result["rolling_bets"], result["rolling_days"]
+    drawdown, streaks = result["drawdown"], result["streaks"]
+    return [
+        ["Analytics", "Value"],
+        ["Max Drawdown ($)", drawdown["max"]],
+        ["Current Drawdown ($)", drawdown["current"]],
+        ["Longest Drawdown (bets)", drawdown["longest_bets"]],
+        ["Longest Drawdown (days)", drawdown["longest_days"]],
+        ["Longest Win Streak", streaks["longest_win"]],
+        ["Longest Loss Streak", streaks["longest_loss"]],
+        [f"ROI last {by_bets['window']} bets", by_bets["roi_pct"]],
+        [f"Win % last {by_bets['window']} bets", by_bets["win_pct"]],
+        [f"ROI last {by_days['window']} days", by_days["roi_pct"]],
+        [f"Win % last {by_days['window']} days", by_days["win_pct"]],
+    ]
+
+
+def implied_rows(stats, dimension):
+    """Table rows (dicts) of implied vs realized win rate for one dimension."""
+    return [
+        {
+            dimension.title(): key,
+            "Bets": group["bets"],
+            "Implied Win %": group["implied_pct"],
+            "Win %": group["win_pct"],
+            "Edge (%)": group["edge_pct"],
+        }
+        for key, group in stats.implied(dimension).items()
+    ]
+
+
+def dashboard_sections(stats):
+    """kpis.dashboard_rows() keyword arguments adding these analytics to the Dashboard sheet."""
+    return {
+        "side": analytics_rows(stats),
+        "tables": {f"Implied vs Realized by {dim.title()}": implied_rows(stats, dim) for dim in IMPLIED_DIMENSIONS},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print rolling ROI, drawdown, streaks and implied vs realized win rate.")
+    parser.add_argument("--bets", type=int, default=ROLLING_BETS, help=f"rolling window in settled bets (default {ROLLING_BETS})")
+    parser.add_argument("--days", type=int, default=ROLLING_DAYS, help=f"rolling window in days (default {ROLLING_DAYS})")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    with profiling.operation("analytics") as timing:
+        store = open_store(readonly=True)
+        try:
+            log = BetLog.from_rows(journal.merged_rows(store))
+        finally:
+            store.close()
+        stats = LedgerAnalytics(args.bets, args.days).add(log)
+        timing.add(rows=len(log))
+    for label, value in analytics_rows(stats)[1:]:
+        print(f"{label:<26} {value:,.4f}" if isinstance(value, float) else f"{label:<26} {value}")
+    for dim in IMPLIED_DIMENSIONS:
+        print(f"\nImplied vs realized by {dim}:")
+        for row in implied_rows(stats, dim):
+            key = row[dim.title()] or "(blank)"
+            print(f"  {key:<16} {row['Bets']:>7}  implied {row['Implied Win %']:.1%}  won {row['Win %']:.1%}"
+                  f"  edge {row['Edge (%)']:+.1%}")
@@ -1,12 +1,135 @@
+import numpy as np
 import streamlit as st
 from datetime import datetime
-import openpyxl
 from log_new_bets import log_bet  # reuse your existing function
-
-FILE_PATH = "Bet_Tracker.xlsx"
+from pricing import price_bet
+from simulate import (
+    BANKROLL_UNITS, HORIZON, KELLY_FRACTION, PERCENTILES, PROBABILITY_MODELS, betting_history, simulate,
+    simulation_rows,
+)
+from analytics import IMPLIED_DIMENSIONS, ROLLING_BETS, ROLLING_DAYS, analyze, implied_rows
+from betlog import NO_DATE
+from kpis import (
+    FILTER_COLUMNS, PAGE_SIZES, SERIES_POINTS, breakdown_rows, combine_kpis, daily_pnl, ledger_view, month_bounds,
+    months_in_range, pnl_series, query_ledger, rollup_days, sums_kpis,
+)
+from storage import (
+    HEADERS, UNSETTLED_RESULTS, compact_in_background, ledger_signature, open_store, partition_manifest,
+)
+import journal
+import profiling
 
 st.set_page_config(page_title="📊 Bet Tracker", layout="wide")
 
+# Timing spans are off unless the Performance panel (or BET_TRACKER_PROFILE=1) turns them on
+if "profile" in st.session_state:
+    profiling.enable(st.session_state["profile"])
+
+
+# -------------------------------
+# Cached ledger reads
+# -------------------------------
+# Months of bets the Bet Log shows until another date range is picked
+RECENT_MONTHS = 3
+# Rolling windows offered in the Analytics panel
+BET_WINDOWS = (25, 50, ROLLING_BETS, 250, 500)
+DAY_WINDOWS = (7, 14, ROLLING_DAYS, 90, 365)
+# Path counts offered by the bankroll simulator
+SIMULATION_PATHS = (10_000, 100_000, 1_000_000)
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_summary(signature):
+    """
+    All-time sums read without the bets: {"partitions": the manifest, "groups": {dimension:
+    {key: kpis}} from the rollups and the manifest, "series": the cumulative PnL chart's
+    pnl_series() from the day rollups, "ledger": None}. For a ledger that can only be read
+    whole (Excel) the same are summed from every bet and "ledger" is their ledger_view(),
+    so the workbook is loaded once.
+    """
+    with profiling.operation("app load summary") as timing:
+        store = open_store(readonly=True)
+        try:
+            if store.partitioned:
+                partitions = store.partitions()
+                groups = {dim: sums_kpis(store.rollups(dim)) for dim in ("sportsbook", "league", "market")}
+                groups["month"] = sums_kpis({part["month"]: part for part in partitions})
+                series = pnl_series(rollup_days(store.rollups("day")), SERIES_POINTS)
+                timing.add(rows=len(partitions))
+                return {"partitions": partitions, "groups": groups, "series": series, "ledger": None}
+            ledger = journal.merged_rows(store)
+        finally:
+            store.close()
+        timing.add(rows=len(ledger))
+        view = ledger_view(ledger)
+        return {
+            "partitions": partition_manifest(ledger),
+            "groups": view["kpis"]["groups"],
+            "series": pnl_series(daily_pnl(view["log"]), SERIES_POINTS),
+            "ledger": view,
+        }
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_ledger(signature, months=None):
+    """
+    The bets of the given partitions ("YYYY-MM" months; None for every bet) as a
+    columnar BetLog plus their KPIs, parsed once per ledger version and month set.
+    `signature` is ledger_signature(): only used as the cache key. Treat the result as read-only.
+    """
+    with profiling.operation("app load ledger", partitions=None if months is None else len(months)) as timing:
+        store = open_store(readonly=True)
+        try:
+            # Bets still in the write-ahead journal are shown as if already folded in
+            ledger = journal.merged_rows(store, months=months)
+        finally:
+            store.close()
+
+        # RowID (ledger row id) is kept so edits/deletes map back to the store;
+        # every KPI and group-by comes from whole-column scans
+        view = ledger_view(ledger)
+        timing.add(rows=len(view["log"]))
+    return view
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_analytics(signature, months, bets_window, days_window, _log):
+    """
+    analyze() of the loaded bets (`_log`: load_ledger(signature, months)'s BetLog, not
+    hashed), once per ledger version, month set and pair of windows. Returns the
+    LedgerAnalytics, its result() and the rolling ROI / win rate series for the charts.
+    """
+    with profiling.operation("app analytics", rows=len(_log)):
+        stats = analyze(_log, bets_window, days_window)
+        numbers, roi, win = stats.rolling_bets()
+        days, day_roi, day_win, _ = stats.rolling_days()
+        return {
+            "stats": stats,
+            "result": stats.result(),
+            "by_bets": {"Settled bet #": numbers, "ROI (%)": roi * 100, "Win %": win * 100},
+            "by_days": {"Date": days, "ROI (%)": day_roi * 100, "Win %": day_win * 100},
+        }
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_simulation(signature, months, params, _log):
+    """
+    simulate() from the loaded bets' betting_history() (`_log`, not hashed), once per
+    ledger version, month set and parameters. Returns (unit, results).
+    """
+    with profiling.operation("app simulate", paths=params["paths"], bets=params["bets"]):
+        history = betting_history(_log, params["model"])
+        results = simulate(history, params["paths"], params["bets"], params["bankroll"], params["kelly"],
+                           params["seed"])
+    return history["unit"], results
+
+
+def invalidate_ledger():
+    """Drop the cached ledger after this session writes to it."""
+    load_summary.clear()
+    load_ledger.clear()
+
+
 st.title("📊 Bet Tracker Dashboard")
 
 # -------------------------------
@@ -38,6 +161,7 @@ with st.sidebar.form("log_bet_form"):
     result = st.selectbox("Result", ["Open", "Win", "Loss", "Push"])
     bonus = st.checkbox("Bonus Bet?")
     date = st.date_input("Date", datetime.today())
+    allow_duplicate = st.checkbox("Log even if already logged", help="Same date, book, league, market, pick, odds and stake")
 
     submitted = st.form_submit_button("Log Bet")
 
@@ -52,7 +176,7 @@ with st.sidebar.form("log_bet_form"):
         elif not pick:
             st.error("❌ Pick / Wager is required.")
         else:
-            log_bet(
+            logged = log_bet(
                 date.strftime("%m/%d/%y"),
                 sportsbook,
                 league,
@@ -62,50 +186,75 @@ with st.sidebar.form("log_bet_form"):
                 stake,
                 result,
                 bonus,
-                profit_boost
+                profit_boost,
+                allow_duplicate=allow_duplicate,
             )
-            st.success(f"✅ Logged bet: {league} - {market} - {pick} ({sportsbook})")
+            if logged:
+                invalidate_ledger()
+                st.success(f"✅ Logged bet: {league} - {market} - {pick} ({sportsbook})")
+            else:
+                st.warning(f"⚠️ Already logged: {league} - {market} - {pick} ({sportsbook}). Not logged again.")
 
 # -------------------------------
 # Main Dashboard
 # -------------------------------
 try:
-    wb = openpyxl.load_workbook(FILE_PATH, data_only=True)
-    ws_log = wb["Bet Log"]
+    signature = ledger_signature()
+    summary = load_summary(signature)
+    partitions, whole_ledger = summary["partitions"], summary["ledger"]
+    dated = [part["month"] for part in partitions if part["month"]]
 
     st.subheader("📑 Bet Log")
 
-    header_row = next(ws_log.iter_rows(min_row=1, max_row=1, values_only=True), None)
-    headers = []
-    if header_row:
-        for idx, value in enumerate(header_row):
-            headers.append(value if value not in (None, "") else f"Column {idx + 1}")
-
-    max_col = len(headers) if headers else ws_log.max_column
-    data_rows = list(ws_log.iter_rows(min_row=2, max_col=max_col, values_only=True))
-    table_data = []
-
-    if headers:
-        for row in data_rows:
-            if not any(cell not in (None, "") for cell in row):
-                continue
-            row_dict = {
-                headers[idx]: (row[idx] if idx < len(row) else None)
-                for idx in range(len(headers))
-            }
-            table_data.append(row_dict)
-
-    wb.close()
-
-    # ----- attach RowID (actual Excel row number) so edits/deletes map to Excel -----
-    # table_data currently contains rows as dicts keyed by headers from the sheet.
-    # Excel row 2 is the first data row, so RowID = index + 2.
-    for i, r in enumerate(table_data):
-        r["RowID"] = i + 2  # keep as int
-
-    st.write("")  # spacing
-    st.subheader("🗂️ Bet Log (editable helpers)")
-    st.dataframe(table_data, width="stretch")
+    # Only the monthly partitions overlapping the date range are read from the ledger
+    full_range = (month_bounds(dated[0])[0], month_bounds(dated[-1])[1]) if dated else None
+    recent = (month_bounds(dated[-RECENT_MONTHS:][0])[0], full_range[1]) if dated else None
+    date_range = st.date_input("Date range", value=recent, key="log_dates",
+                               help="Bets outside it are not loaded; all-time KPIs below still count them.")
+    # The full range also keeps bets whose date does not parse
+    start = end = None
+    if date_range and tuple(date_range) != full_range:
+        start, end = (list(date_range) + [None])[:2] if isinstance(date_range, (list, tuple)) else (date_range, None)
+    if whole_ledger is not None:
+        ledger, months = whole_ledger, None
+    else:
+        months = None if start is None and end is None else tuple(months_in_range(partitions, start, end))
+        ledger = load_ledger(signature, months)
+    log = ledger["log"]
+    ledger_bets = sum(part["bets"] for part in partitions)
+
+    # Filtered, sorted and paged on the cached columnar copy; only the visible page is sent to the browser
+    with st.expander("🔎 Filter & sort", expanded=False):
+        f1, f2 = st.columns(2)
+        with f1:
+            sort_by = st.selectbox("Sort by", ["RowID"] + HEADERS, key="log_sort")
+        with f2:
+            descending = st.checkbox("Newest / largest first", key="log_desc")
+        filter_cols = st.columns(len(FILTER_COLUMNS))
+        filters = {}
+        for col, column in zip(filter_cols, FILTER_COLUMNS):
+            with col:
+                filters[column] = st.multiselect(
+                    column, log.values_of(column), key=f"log_filter_{column}"
+                )
+
+    p1, p2 = st.columns([1, 4])
+    with p1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="log_page_size")
+    view = query_ledger(ledger, start, end, filters, sort_by, descending,
+                        page=st.session_state.get("log_page", 1), page_size=page_size)
+    # Narrower filters can leave fewer pages than the one being shown
+    st.session_state["log_page"] = view["page"]
+    with p2:
+        st.number_input(f"Page (of {view['pages']})", min_value=1, max_value=view["pages"], step=1, key="log_page")
+    st.dataframe(view["frame"], width="stretch", hide_index=True)
+    first = (view["page"] - 1) * page_size
+    if view["total"]:
+        st.caption(f"Rows {first + 1:,}–{min(first + page_size, view['total']):,} "
+                   f"of {view['total']:,} matching ({len(log):,} bets loaded of {ledger_bets:,})")
+    else:
+        st.caption(f"No bets match these filters ({len(log):,} bets loaded of {ledger_bets:,})")
+    page_ids = view["row_ids"]
 
     # -------------------------
     # Helpers to recalc values
@@ -116,99 +265,65 @@ try:
         except (TypeError, ValueError):
             return default
 
-    def american_to_decimal_local(odds):
-        if odds in ("", None):
-            return 0.0
-        odds = float(odds)
-        return 1 + (odds / 100 if odds > 0 else 100 / abs(odds))
-
-    def recompute_row_values(ws, row):
-        """Recompute Payout (K), Net PnL (L), Cumulative (M) for a given row based on current fields."""
-        stake_val = ws[f"F{row}"].value
-        odds_val = ws[f"G{row}"].value
-        result_raw = (ws[f"H{row}"].value or "").strip()
-        result = result_raw if isinstance(result_raw, str) else ""
-        bonus = bool(ws[f"I{row}"].value)
-
-        # Locate optional Profit Boost (%) column
-        profit_boost = 0.0
-        header_values = [cell.value for cell in ws[1]]
-        try:
-            boost_col = header_values.index("Profit Boost (%)") + 1
-            profit_boost = _to_float(ws.cell(row=row, column=boost_col).value, 0.0)
-        except ValueError:
-            profit_boost = 0.0
-
-        stake = _to_float(stake_val)
-        actual_stake = 0.0 if bonus else stake
-
-        dec_odds_original = american_to_decimal_local(odds_val)
-        base_profit = (dec_odds_original - 1) * stake
-        if profit_boost and profit_boost > 0:
-            boosted_profit = base_profit * (1 + profit_boost / 100)
-            dec_odds_effective = (
-                1 + ((dec_odds_original - 1) * (1 + profit_boost / 100))
-                if stake not in (0, None)
-                else dec_odds_original
-            )
-        else:
-            boosted_profit = base_profit
-            dec_odds_effective = dec_odds_original
-
-        ws[f"J{row}"] = dec_odds_effective
-
-        normalized_result = result.title()
-        boost_active = bool(profit_boost and profit_boost > 0)
-
-        if normalized_result == "Win":
-            if bonus:
-                payout = boosted_profit if boost_active else stake * (dec_odds_original - 1)
-            else:
-                payout = (
-                    actual_stake + boosted_profit
-                    if boost_active
-                    else actual_stake * dec_odds_original
+    # -------------------------
+    # Settle open bets
+    # -------------------------
+    with st.expander("✅ Settle open bets"):
+        # A mask over the cached Result codes: no per-row work
+        open_bets = log[log.isin("Result", UNSETTLED_RESULTS)]
+        if months is not None:
+            st.caption("Open bets in the selected date range.")
+        if len(open_bets):
+            c1, c2 = st.columns(2)
+            with c1:
+                book_filter = st.selectbox("Sportsbook", ["All"] + open_bets.values_of("Sportsbook"), key="settle_book")
+            shown = open_bets
+            if book_filter != "All":
+                shown = shown[shown.isin("Sportsbook", [book_filter])]
+            dates = [int(ordinal) for ordinal in np.unique(shown.dates) if ordinal != NO_DATE]
+            with c2:
+                date_filter = st.selectbox(
+                    "Date", ["All"] + dates, key="settle_date",
+                    format_func=lambda d: d if d == "All" else datetime.fromordinal(d).strftime("%m/%d/%y"),
                 )
-        elif normalized_result == "Push":
-            payout = actual_stake
-        elif normalized_result == "Loss":
-            payout = 0.0
-        else:
-            payout = None
-
-        net = payout - actual_stake if payout is not None else None
-
-        if net is not None:
-            prev_raw = ws[f"M{row-1}"].value if row > 2 else 0
-            prev_cum = _to_float(prev_raw, 0.0) if prev_raw not in (None, "") else 0.0
-            cumulative = prev_cum + net
+            if date_filter != "All":
+                shown = shown[shown.dates == date_filter]
+
+            # Options are sent to the browser: cap them like a Bet Log page
+            choices = shown[:PAGE_SIZES[-1]]
+            if len(shown) > len(choices):
+                st.caption(f"Showing the first {len(choices)} of {len(shown):,}; filter by sportsbook or date.")
+            labels = {}
+            for pos in range(len(choices)):
+                bet = choices.record(pos)
+                labels[bet["RowID"]] = (f"{bet['RowID']} · {bet['Date']} · {bet['Sportsbook']} · "
+                                        f"{bet['Pick']} ({bet['Odds']}, ${bet['Stake ($)']})")
+            to_settle = st.multiselect(
+                f"Open bets ({len(shown)})",
+                list(labels),
+                format_func=labels.get,
+                key="settle_rows",
+            )
+            outcome = st.radio("Result", ["Win", "Loss", "Push"], horizontal=True, key="settle_result")
+            if to_settle and st.button(f"Settle {len(to_settle)} bet(s) as {outcome}"):
+                # One journaled event: repriced together, one cumulative pass, one save
+                with profiling.operation("app settle", rows=len(to_settle)):
+                    journal.settle_bets({rid: outcome for rid in to_settle})
+                invalidate_ledger()
+
+                st.success(f"Settled rows {sorted(to_settle)} as {outcome}.")
+                st.rerun()
         else:
-            cumulative = None
-
-        ws[f"K{row}"] = payout
-        ws[f"L{row}"] = net
-        ws[f"M{row}"] = cumulative
-
-    def recompute_cumulative(ws):
-        """Recompute cumulative PnL (M) from row 2..max."""
-        last = 0.0
-        for r in range(2, ws.max_row + 1):
-            net = ws[f"L{r}"].value
-            net = _to_float(net, default=0.0) if net not in ("", None) else None
-            if net is None:
-                ws[f"M{r}"] = None
-            else:
-                last = (last if isinstance(last, (int, float)) else 0.0) + net
-                ws[f"M{r}"] = last
+            st.info("No open bets.")
 
     # -------------------------
     # Edit a single row
     # -------------------------
     with st.expander("✏️ Edit a row"):
-        if table_data:
-            row_ids = [r["RowID"] for r in table_data]
-            chosen = st.selectbox("Select RowID to edit", row_ids)
-            current = next((r for r in table_data if r["RowID"] == chosen), None)
+        if len(log):
+            chosen = st.selectbox("Select RowID to edit (rows on this page)", page_ids)
+            pos = log.position(chosen) if chosen is not None else None
+            current = log.record(pos) if pos is not None else None
 
             if current:
                 from datetime import datetime as _dt
@@ -248,33 +363,31 @@ try:
                     )
 
                 if st.button("Save changes"):
-                    import openpyxl
-                    wb_edit = openpyxl.load_workbook(FILE_PATH)
-                    ws = wb_edit["Bet Log"]
-
                     r = int(chosen)
-                    ws[f"A{r}"] = date_in
-                    ws[f"B{r}"] = sportsbook_in
-                    ws[f"C{r}"] = league_in
-                    ws[f"D{r}"] = market_in
-                    ws[f"E{r}"] = pick_in
-                    ws[f"F{r}"] = float(stake_in)
-                    ws[f"G{r}"] = float(odds_in)
-                    ws[f"H{r}"] = result_in
-                    ws[f"I{r}"] = bool(bonus_in)
-
-                    header_values = [cell.value for cell in ws[1]]
-                    try:
-                        boost_col = header_values.index("Profit Boost (%)") + 1
-                        ws.cell(row=r, column=boost_col, value=profit_boost_in)
-                    except ValueError:
-                        pass
-
-                    recompute_row_values(ws, r)
-                    recompute_cumulative(ws)
-
-                    wb_edit.save(FILE_PATH)
-                    wb_edit.close()
+                    dec_odds, payout, net = price_bet(
+                        float(odds_in), float(stake_in), result_in, bool(bonus_in), profit_boost_in
+                    )
+                    record = {
+                        "Date": date_in,
+                        "Sportsbook": sportsbook_in,
+                        "League": league_in,
+                        "Market": market_in,
+                        "Pick": pick_in,
+                        "Stake ($)": float(stake_in),
+                        "Odds": float(odds_in),
+                        "Result": result_in,
+                        "Bonus": bool(bonus_in),
+                        "Decimal Odds": dec_odds,
+                        "Payout ($)": payout,
+                        "Net PnL ($)": net,
+                        "Profit Boost (%)": profit_boost_in,
+                    }
+
+                    # Journaled and folded into the ledger in the background
+                    with profiling.operation("app edit", rows=1):
+                        journal.update_bet(r, record)
+                    invalidate_ledger()
+
                     st.success(f"Row {r} updated.")
                     st.rerun()
         else:
@@ -284,62 +397,44 @@ try:
     # Delete rows
     # -------------------------
     with st.expander("🗑️ Delete rows"):
-        if table_data:
-            row_ids = [r["RowID"] for r in table_data]
-            to_delete = st.multiselect("Select RowID(s) to delete", row_ids)
+        if len(log):
+            to_delete = st.multiselect("Select RowID(s) to delete (rows on this page)", page_ids)
+            soft = st.checkbox(
+                "Soft delete (instant, space is reclaimed by compaction)",
+                value=True,
+                help="Soft-deleted rows disappear immediately and other RowIDs do not move "
+                     "until the ledger is compacted.",
+            )
             if to_delete and st.button("Confirm delete"):
-                import openpyxl
-                wb_del = openpyxl.load_workbook(FILE_PATH)
-                ws = wb_del["Bet Log"]
-
-                # Delete from bottom up to preserve indices
-                for rid in sorted(to_delete, reverse=True):
-                    ws.delete_rows(int(rid), 1)
+                # Journaled; the fold does one compaction pass (or tombstones) plus one cumulative pass
+                with profiling.operation("app delete", rows=len(to_delete)):
+                    journal.delete_bets(to_delete, soft=soft)
+                invalidate_ledger()
 
-                # Recompute cumulative after deletions
-                recompute_cumulative(ws)
-
-                wb_del.save(FILE_PATH)
-                wb_del.close()
                 st.success(f"Deleted rows: {sorted(to_delete)}")
                 st.rerun()
         else:
             st.info("No rows to delete yet.")
 
-    # ---- KPIs computed directly from Bet Log (no Dashboard dependency) ----
-    def _to_number(x):
-        try:
-            return float(x)
-        except (TypeError, ValueError):
-            return 0.0
+        if st.button("🧹 Compact ledger"):
+            if compact_in_background():
+                invalidate_ledger()
+                st.info("Compaction started in the background. RowIDs may shift once it finishes.")
+            else:
+                st.info("A compaction is already running.")
 
+    # ---- KPIs computed directly from Bet Log (no Dashboard dependency), cached with the ledger ----
     st.subheader("📈 KPIs")
 
-    # Build safe list of dict rows keyed by header names (already done above as table_data)
-    rows = table_data  # alias for readability
-
-    total_pnl = sum(_to_number(r.get("Net PnL ($)")) for r in rows)
-    total_stake = sum(
-        _to_number(r.get("Stake ($)"))
-        for r in rows
-        if (r.get("Result") not in ("Open", "", None)) and not r.get("Bonus")
-    )
-
-    result_vals = [(r.get("Result") or "").strip() for r in rows]
-
-    wins = sum(1 for v in result_vals if v == "Win")
-    total_bets = sum(1 for v in result_vals if v not in ("", None, "Open"))
-    pending_bets = sum(1 for v in result_vals if v in ("", "Open"))
-
-    win_pct = (wins / total_bets) if total_bets > 0 else 0.0
-    roi_pct = (total_pnl / total_stake) if total_stake > 0 else 0.0
-
-    # Open Bets KPI
-    open_bets = sum(1 for v in result_vals if v == "Open")
-
-    # Sportsbook KPI breakdown
-    from collections import Counter
-    books = Counter(r.get("Sportsbook") for r in rows if r.get("Sportsbook"))
+    # All time: manifest sums for the months not loaded, plus the loaded bets (journaled changes included)
+    loaded = {part["month"] for part in partitions} if months is None else set(months)
+    kpis = combine_kpis([part for part in partitions if part["month"] not in loaded] + [ledger["kpis"]["totals"]])
+    # Rollups: one row per book / league / market / month (journaled bets join them once folded)
+    groups = summary["groups"]
+    total_pnl, total_stake = kpis["total_pnl"], kpis["total_stake"]
+    win_pct, roi_pct = kpis["win_pct"], kpis["roi_pct"]
+    open_bets = kpis["open_bets"]
+    books = {book: g["bets"] for book, g in groups["sportsbook"].items() if book}
 
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1: st.metric("Total PnL ($)", f"{total_pnl:,.2f}")
@@ -348,6 +443,16 @@ try:
     with col4: st.metric("ROI (%)", f"{roi_pct*100:.2f}%")
     with col5: st.metric("Open Bets", open_bets)
 
+    st.subheader("📉 Cumulative PnL")
+    series = summary["series"]
+    if series:
+        st.line_chart(
+            {"Date": [day for day, _ in series], "Cumulative PnL ($)": [cum for _, cum in series]},
+            x="Date", y="Cumulative PnL ($)", color="#00B050",
+        )
+    else:
+        st.info("No dated bets yet.")
+
     st.subheader("📚 Bets by Sportsbook")
     if books:
         cols = st.columns(len(books))
@@ -357,5 +462,123 @@ try:
     else:
         st.info("No sportsbook activity yet.")
 
+    with st.expander("📊 Breakdowns"):
+        dimension = st.selectbox("Group by", list(groups), format_func=str.title)
+        st.dataframe(breakdown_rows(groups, dimension), width="stretch", hide_index=True)
+
+    # Rolling ROI, drawdown, streaks and implied vs realized win rate of the loaded bets
+    with st.expander("📐 Analytics" + ("" if months is None else " (selected dates)")):
+        w1, w2 = st.columns(2)
+        with w1:
+            bets_window = st.selectbox("Rolling window (settled bets)", BET_WINDOWS,
+                                       index=BET_WINDOWS.index(ROLLING_BETS), key="analytics_bets")
+        with w2:
+            days_window = st.selectbox("Rolling window (days)", DAY_WINDOWS,
+                                       index=DAY_WINDOWS.index(ROLLING_DAYS), key="analytics_days")
+        analytics = load_analytics(signature, months, bets_window, days_window, log)
+        result = analytics["result"]
+        drawdown, streaks = result["drawdown"], result["streaks"]
+
+        a1, a2, a3, a4 = st.columns(4)
+        with a1: st.metric("Max Drawdown ($)", f"{drawdown['max']:,.2f}",
+                           help=f"{drawdown['peak']} to {drawdown['trough']}" if drawdown["peak"] else None)
+        with a2: st.metric("Longest Drawdown", f"{drawdown['longest_bets']} bets / {drawdown['longest_days']} days")
+        with a3: st.metric("Longest Win / Loss Streak", f"{streaks['longest_win']} / {streaks['longest_loss']}")
+        with a4: st.metric("Current Streak", f"{abs(streaks['current'])} {'W' if streaks['current'] >= 0 else 'L'}")
+
+        by_bets, by_days = result["rolling_bets"], result["rolling_days"]
+        r1, r2, r3, r4 = st.columns(4)
+        with r1: st.metric(f"ROI last {bets_window} bets", f"{by_bets['roi_pct']*100:.2f}%")
+        with r2: st.metric(f"Win % last {bets_window} bets", f"{by_bets['win_pct']*100:.2f}%")
+        with r3: st.metric(f"ROI last {days_window} days", f"{by_days['roi_pct']*100:.2f}%")
+        with r4: st.metric(f"Win % last {days_window} days", f"{by_days['win_pct']*100:.2f}%")
+
+        c1, c2 = st.columns(2)
+        with c1:
+            st.caption(f"Rolling ROI / win rate, last {bets_window} settled bets")
+            if len(analytics["by_bets"]["Settled bet #"]):
+                st.line_chart(analytics["by_bets"], x="Settled bet #", y=["ROI (%)", "Win %"])
+        with c2:
+            st.caption(f"Rolling ROI / win rate, last {days_window} days")
+            if analytics["by_days"]["Date"]:
+                st.line_chart(analytics["by_days"], x="Date", y=["ROI (%)", "Win %"])
+
+        implied_by = st.selectbox("Implied vs realized win rate by", IMPLIED_DIMENSIONS,
+                                  format_func=str.title, key="analytics_implied")
+        st.caption("Won and lost bets: average probability implied by the odds taken vs the share won.")
+        st.dataframe(implied_rows(analytics["stats"], implied_by), width="stretch", hide_index=True)
+
+    # Monte Carlo bankroll paths resampled from the loaded bets: flat staking vs fractional Kelly
+    with st.expander("🎲 Bankroll simulator" + ("" if months is None else " (selected dates)")):
+        with st.form("simulation_form"):
+            s1, s2, s3 = st.columns(3)
+            with s1:
+                sim_paths = st.selectbox("Paths", SIMULATION_PATHS, index=1, format_func="{:,}".format)
+                sim_bets = st.number_input("Bets per path", min_value=10, max_value=100_000, value=HORIZON, step=100)
+            with s2:
+                sim_bankroll = st.number_input("Starting bankroll (units)", min_value=1, max_value=100_000,
+                                               value=BANKROLL_UNITS, help="A unit is the median cash stake.")
+                sim_kelly = st.slider("Kelly fraction", 0.05, 1.0, KELLY_FRACTION, 0.05)
+            with s3:
+                sim_model = st.selectbox(
+                    "Win probabilities", PROBABILITY_MODELS, format_func=str.title,
+                    help="Calibrated: the odds' implied probability scaled to the realized win rate. "
+                         "Implied: the odds' implied probability as is (vig included).",
+                )
+                sim_seed = st.number_input("Seed", min_value=0, max_value=2**32 - 1, value=0)
+            if st.form_submit_button("Run simulation"):
+                st.session_state["simulation"] = {
+                    "paths": int(sim_paths), "bets": int(sim_bets), "bankroll": int(sim_bankroll),
+                    "kelly": float(sim_kelly), "model": sim_model, "seed": int(sim_seed),
+                }
+
+        params = st.session_state.get("simulation")
+        if params:
+            try:
+                with st.spinner(f"Simulating {params['paths']:,} paths..."):
+                    unit, results = load_simulation(signature, months, params, log)
+            except ValueError as exc:
+                st.info(f"Nothing to simulate: {exc}.")
+            else:
+                st.caption(
+                    f"{params['paths']:,} paths of {params['bets']:,} bets, seed {params['seed']}. Unit "
+                    f"${unit:,.2f}, starting bankroll ${params['bankroll'] * unit:,.2f}; ruin is ending "
+                    f"below one unit."
+                )
+                st.dataframe(simulation_rows(results), width="stretch", hide_index=True)
+                bands = {"Bet #": results["flat"]["bands"]["step"]}
+                for strategy, label in (("flat", "Flat"), ("kelly", "Kelly")):
+                    for p in (PERCENTILES[0], 50, PERCENTILES[-1]):
+                        bands[f"{label} P{p}"] = results[strategy]["bands"]["percentiles"][p]
+                st.line_chart(bands, x="Bet #", y=[name for name in bands if name != "Bet #"])
+
 except FileNotFoundError:
     st.warning("⚠️ No Bet Tracker file found yet. Log your first bet to create one.")
+
+# -------------------------
+# Performance
+# -------------------------
+with st.expander("⏱️ Performance"):
+    st.checkbox(
+        "Record timings",
+        value=profiling.ENABLED,
+        key="profile",
+        help="Time load / parse / compute / save steps of every operation in this app process.",
+    )
+    if profiling.RECENT:
+        st.dataframe(
+            [
+                {
+                    "Operation": op["op"],
+                    "ms": op["ms"],
+                    "Rows": op.get("rows"),
+                    "Bytes": op.get("bytes"),
+                    "Steps": " · ".join(f"{span['span']} {span['ms']:.1f} ms" for span in op["spans"]),
+                }
+                for op in reversed(profiling.RECENT)
+            ],
+            width="stretch",
+            hide_index=True,
+        )
+    elif profiling.ENABLED:
+        st.caption("No operations recorded yet (cached reads are not re-timed).")
@@ -0,0 +1,383 @@
+from datetime import datetime, timedelta
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# -------------------------------
+# Synthetic ledgers
+# -------------------------------
+SPORTSBOOKS = ["DraftKings", "FanDuel", "BetMGM", "Caesars", "ESPN Bet", "BetRivers", "Fanatics"]
+LEAGUES = ["NFL", "NBA", "MLB", "NHL", "NCAAF", "NCAAB", "EPL", "UFC"]
+MARKETS = ["Moneyline", "Spread", "Total", "Player Prop", "Parlay", "Futures"]
+RESULTS = ["Win", "Loss", "Push", "Open"]
+RESULT_WEIGHTS = [0.46, 0.46, 0.03, 0.05]
+BOOSTS = [25, 30, 50, 100]
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def synthetic_bets(n, seed=0, chunk_size=10_000):
+    """
+    Yield n unpriced Bet Log records that look like a real ledger: dates in order,
+    mostly -110 style favourites with some long shots, ~5% bonus bets, ~8% profit
+    boosts and open bets concentrated at the end. Same seed, same ledger.
+    """
+    rng = np.random.default_rng(seed)
+    start = datetime(2023, 1, 1)
+    days = max(n // 25, 1)  # ~25 bets a day
+    for offset in range(0, n, chunk_size):
+        size = min(chunk_size, n - offset)
+        idx = np.arange(offset, offset + size)
+        favourite = rng.random(size) < 0.6
+        odds = np.where(
+            favourite,
+            -rng.choice([105, 110, 110, 115, 120, 150, 200, 300], size),
+            rng.choice([100, 110, 120, 150, 200, 250, 400, 800], size),
+        )
+        stake = rng.choice([5, 10, 10, 20, 25, 50, 100], size)
+        result = rng.choice(RESULTS, size, p=RESULT_WEIGHTS)
+        # Anything in the last 2% of the ledger is still open
+        result = np.where(idx >= n * 0.98, "Open", result)
+        bonus = rng.random(size) < 0.05
+        boost = np.where(rng.random(size) < 0.08, rng.choice(BOOSTS, size), 0)
+        books = rng.choice(SPORTSBOOKS, size)
+        leagues = rng.choice(LEAGUES, size)
+        markets = rng.choice(MARKETS, size)
+        for j in range(size):
+            day = start + timedelta(days=int(idx[j] * days // n))
+            yield {
+                "Date": day.strftime("%m/%d/%y"),
+                "Sportsbook": str(books[j]),
+                "League": str(leagues[j]),
+                "Market": str(markets[j]),
+                "Pick": f"Pick {idx[j]}",
+                "Stake ($)": int(stake[j]),
+                "Odds": int(odds[j]),
+                "Result": str(result[j]),
+                "Bonus": bool(bonus[j]),
+                "Profit Boost (%)": int(boost[j]),
+            }
+
+
+def build_ledger(n, backend, seed=0, force=False):
+    """
+    Write a priced synthetic ledger of n bets for `backend` into the current directory.
+    Raises FileExistsError if there already is one (a real ledger, perhaps) or a journal
+    of bets not yet folded into one, unless force, which replaces it. The files derived
+    from a ledger (fingerprints, dashboard state, SQLite's -wal / -shm) go with it.
+    """
+    from dashboard import state_path
+    from journal import journal_path
+    from storage import DB_PATH, FILE_PATH, FingerprintIndex, SQLiteStore, iter_priced
+
+    path = FILE_PATH if backend == "excel" else DB_PATH
+    journal = journal_path(backend)
+    for existing in (path, journal):
+        if os.path.exists(existing) and not force:
+            raise FileExistsError(f"{os.path.abspath(existing)} already exists; pass --force to replace it")
+    # A leftover journal would be folded into the new ledger; stale fingerprints and
+    # dashboard state would skew the dedupe and incremental dashboard cases
+    for stale in (path, path + "-wal", path + "-shm", journal, FingerprintIndex.sidecar(path), state_path(FILE_PATH)):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    records = iter_priced(synthetic_bets(n, seed))
+    if backend == "excel":
+        from export_xlsx import write_workbook
+        from writer import ledger_lock
+        with ledger_lock("excel"):
+            write_workbook(records, FILE_PATH, reprice=False)
+        return FILE_PATH
+
+    store = SQLiteStore(DB_PATH)
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= 10_000:
+            store.append(chunk)
+            chunk = []
+    store.append(chunk)
+    store.save()
+    store.close()
+    return DB_PATH
+
+
+# -------------------------------
+# Cases (each runs in a fresh process against a fresh copy of the ledger)
+# -------------------------------
+def _new_bet(i=0):
+    return {
+        "date": "06/01/25",
+        "sportsbook": SPORTSBOOKS[i % len(SPORTSBOOKS)],
+        "league": "NBA",
+        "market": "Moneyline",
+        "pick": f"Bench {i}",
+        "odds": -110,
+        "stake": 10,
+        "result": "Open",
+    }
+
+
+def case_log_bet():
+    import journal
+    from log_new_bets import log_bet
+    journal.FOLD_DELAY = 3600  # time the journaled write only
+    bet = _new_bet()
+    log_bet(bet["date"], bet["sportsbook"], bet["league"], bet["market"], bet["pick"], bet["odds"], bet["stake"])
+
+
+def case_log_bets_bulk():
+    from log_new_bets import log_bets
+    log_bets([_new_bet(i) for i in range(1000)])
+
+
+def case_dashboard():
+    from dashboard import build_dashboard
+    build_dashboard()
+
+
+def case_dashboard_stream():
+    from dashboard import build_dashboard_streaming
+    build_dashboard_streaming()
+
+
+def case_app_load():
+    import journal
+    from kpis import ledger_view
+    from storage import open_store
+    # Same path as app.load_ledger() on a cache miss
+    store = open_store(readonly=True)
+    try:
+        rows = journal.merged_rows(store)
+    finally:
+        store.close()
+    ledger_view(rows)
+
+
+def case_app_load_recent():
+    import journal
+    from kpis import ledger_view
+    from storage import open_store
+    # app.py's default view: the partition manifest plus the last three months of bets
+    store = open_store(readonly=True)
+    try:
+        months = [part["month"] for part in store.partitions() if part["month"]][-3:]
+        rows = journal.merged_rows(store, months=months)
+    finally:
+        store.close()
+    ledger_view(rows)
+
+
+def case_analytics():
+    import journal
+    from analytics import analyze
+    from betlog import BetLog
+    from storage import open_store
+    # Same path as the app's Analytics panel over every bet, charts included
+    store = open_store(readonly=True)
+    try:
+        log = BetLog.from_rows(journal.merged_rows(store))
+    finally:
+        store.close()
+    stats = analyze(log)
+    stats.result()
+    stats.rolling_bets()
+
+
+def case_simulate():
+    import journal
+    from betlog import BetLog
+    from simulate import betting_history, simulate
+    from storage import open_store
+    store = open_store(readonly=True)
+    try:
+        log = BetLog.from_rows(journal.merged_rows(store))
+    finally:
+        store.close()
+    # 100k paths of 1,000 bets on every CPU (the app's default simulation)
+    simulate(betting_history(log), paths=100_000, horizon=1000)
+
+
+def _row_ids():
+    from storage import open_store
+    store = open_store(readonly=True)
+    try:
+        return [row_id for row_id, _ in store.rows()]
+    finally:
+        store.close()
+
+
+def case_edit():
+    import writer
+    row_ids = _row_ids()
+    row_id = row_ids[len(row_ids) // 10]  # early edit: 90% of the cumulative column moves
+
+    def edit(store):
+        store.update(row_id, {"Result": "Win", "Payout ($)": 100.0, "Net PnL ($)": 90.0})
+        store.recompute_cumulative(from_row=row_id)
+
+    writer.run(edit)
+
+
+def _bulk_delete(soft):
+    import writer
+    row_ids = _row_ids()
+    doomed = row_ids[len(row_ids) // 10::100]  # 1% of bets, spread over the ledger
+    writer.run(lambda store: store.delete(doomed, soft=soft))
+
+
+def case_delete_bulk():
+    _bulk_delete(soft=False)
+
+
+def case_delete_bulk_soft():
+    _bulk_delete(soft=True)
+
+
+CASES = {
+    "log_bet": case_log_bet,
+    "log_bets_bulk": case_log_bets_bulk,
+    "dashboard": case_dashboard,
+    "dashboard_stream": case_dashboard_stream,
+    "app_load": case_app_load,
+    "app_load_recent": case_app_load_recent,
+    "analytics": case_analytics,
+    "simulate": case_simulate,
+    "edit": case_edit,
+    "delete_bulk": case_delete_bulk,
+    "delete_bulk_soft": case_delete_bulk_soft,
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_case(name):
+    """Child side: run one case in the current directory and print one JSON line."""
+    # Import the project up front so the numbers are the operation, not module loading
+    import dashboard, journal, kpis, log_new_bets, storage, writer  # noqa: F401
+    rss_before = _peak_rss_mb()
+    started = time.perf_counter()
+    CASES[name]()
+    seconds = time.perf_counter() - started
+    rss_after = _peak_rss_mb()
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_rss_mb": rss_after,
+        "peak_rss_delta_mb": None if rss_after is None else rss_after - rss_before,
+    }))
+
+
+# -------------------------------
+# Driver
+# -------------------------------
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes, backend, cases, repeat=1, seed=0, log=sys.stderr):
+    """Run every case at every size; returns the machine-readable report."""
+    env = dict(os.environ, BET_TRACKER_BACKEND=backend)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bet-bench-") as root:
+        for label in sizes:
+            n = SIZES.get(label) or int(label)
+            pristine = os.path.join(root, f"ledger-{n}")
+            os.makedirs(pristine)
+            started = time.perf_counter()
+            cwd = os.getcwd()
+            os.chdir(pristine)
+            try:
+                build_ledger(n, backend, seed)
+            finally:
+                os.chdir(cwd)
+            print(f"generated {n:,} bets in {time.perf_counter() - started:.1f}s", file=log)
+
+            for name in cases:
+                for attempt in range(repeat):
+                    workdir = os.path.join(root, "run")
+                    shutil.rmtree(workdir, ignore_errors=True)
+                    shutil.copytree(pristine, workdir)
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), "--case", name],
+                        cwd=workdir, env=env, capture_output=True, text=True,
+                    )
+                    entry = {"case": name, "bets": n, "backend": backend, "run": attempt + 1}
+                    if proc.returncode == 0:
+                        entry.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+                        print(f"{name:>18} {n:>9,}  {entry['seconds']:8.3f}s", file=log)
+                    else:
+                        entry["error"] = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+                        print(f"{name:>18} {n:>9,}  FAILED: {entry['error']}", file=log)
+                    results.append(entry)
+            shutil.rmtree(pristine)
+
+    return {
+        "revision": _git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Bet Tracker on synthetic ledgers.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"],
+                        help="ledger sizes: 10k, 100k, 1m or a number of bets")
+    parser.add_argument("--backend", default=os.environ.get("BET_TRACKER_BACKEND", "sqlite"),
+                        choices=["sqlite", "excel"])
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--generate", metavar="N", help="only write a synthetic ledger of N bets here")
+    parser.add_argument("--force", action="store_true",
+                        help="with --generate, replace a ledger already in this directory")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case)
+    elif args.generate:
+        try:
+            path = build_ledger(SIZES.get(args.generate) or int(args.generate), args.backend, args.seed, args.force)
+        except FileExistsError as exc:
+            sys.exit(f"❌ Nothing generated, {exc}")
+        print(f"✅ Wrote synthetic ledger to {path}")
+    else:
+        report = run_benchmarks(args.sizes, args.backend, args.cases, args.repeat, args.seed)
+        text = json.dumps(report, indent=2)
+        if args.out:
+            with open(args.out, "w") as handle:
+                handle.write(text + "\n")
+            print(f"✅ Benchmark report written to {args.out}", file=sys.stderr)
+        else:
+            print(text)
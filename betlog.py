@@ -0,0 +1,219 @@
+from datetime import date as _date, datetime
+
+import numpy as np
+import pandas as pd
+
+from pricing import as_float_column
+from storage import HEADERS
+
+# -------------------------------
+# Column layout
+# -------------------------------
+# float64 columns (NaN = blank), keyed by Bet Log header
+FLOAT_COLUMNS = {
+    "Stake ($)": "stake",
+    "Odds": "odds",
+    "Decimal Odds": "decimal_odds",
+    "Payout ($)": "payout",
+    "Net PnL ($)": "net_pnl",
+    "Cumulative PnL ($)": "cumulative_pnl",
+    "Profit Boost (%)": "profit_boost",
+}
+# Dictionary-encoded text columns: int32 codes into a small array of distinct values
+CATEGORICAL_COLUMNS = {
+    "Sportsbook": "sportsbook",
+    "League": "league",
+    "Market": "market",
+    "Pick": "pick",
+    "Result": "result",
+}
+# Whole numbers in these columns are shown without a trailing .0
+INTEGER_LIKE = ("Odds", "Profit Boost (%)")
+
+DATE_FORMATS = ("%m/%d/%y", "%m/%d/%Y", "%Y-%m-%d")
+NO_DATE = 0  # ordinal of a blank or unparseable date
+
+_ordinal_cache = {}
+
+
+def date_ordinal(value):
+    """A Bet Log date (datetime or MM/DD/YY string) as a proleptic ordinal; NO_DATE if unparseable."""
+    if isinstance(value, (datetime, _date)):
+        return value.toordinal()
+    key = "" if value is None else str(value).strip()
+    ordinal = _ordinal_cache.get(key)
+    if ordinal is None:
+        ordinal = NO_DATE
+        for fmt in DATE_FORMATS:
+            try:
+                ordinal = datetime.strptime(key, fmt).toordinal()
+                break
+            except ValueError:
+                continue
+        _ordinal_cache[key] = ordinal
+    return ordinal
+
+
+def _encode(values, strip=False):
+    """(int32 codes, object array of distinct values) with None / blanks as ""."""
+    values = ["" if value is None else (str(value).strip() if strip else str(value)) for value in values]
+    codes, categories = pd.factorize(pd.Series(values, dtype=object), sort=False)
+    return codes.astype(np.int32), np.asarray(categories, dtype=object)
+
+
+# -------------------------------
+# BetLog
+# -------------------------------
+class BetLog:
+    """
+    The ledger held column by column: float64 arrays for money and odds, int32
+    date ordinals, dictionary-encoded sportsbook / league / market / pick / result
+    and a bool array for Bonus, plus the row ids. Slicing returns a BetLog sharing
+    the same arrays (a view for slices, a copy of just the selected rows otherwise),
+    so filters and KPI scans run on whole columns instead of per-row dicts.
+    """
+
+    def __init__(self, row_ids, dates, floats, codes, categories, bonus, raw_dates=None):
+        self.row_ids = row_ids
+        self.dates = dates
+        self.floats = floats            # header -> float64 array
+        self.codes = codes              # header -> int32 array
+        self.categories = categories    # header -> object array (shared by every view)
+        self.bonus = bonus
+        # Dates that did not parse, kept as written: position -> value
+        self.raw_dates = raw_dates or {}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (row_id, record) pairs, e.g. store.rows() or journal.merged_rows()."""
+        row_ids, dates, bonus = [], [], []
+        floats = {header: [] for header in FLOAT_COLUMNS}
+        texts = {header: [] for header in CATEGORICAL_COLUMNS}
+        raw_dates = {}
+        for pos, (row_id, record) in enumerate(rows):
+            row_ids.append(row_id)
+            value = record.get("Date")
+            ordinal = date_ordinal(value)
+            if ordinal == NO_DATE and value not in (None, ""):
+                raw_dates[pos] = value
+            dates.append(ordinal)
+            bonus.append(bool(record.get("Bonus")))
+            for header, column in floats.items():
+                column.append(record.get(header))
+            for header, column in texts.items():
+                column.append(record.get(header))
+
+        encoded = {header: _encode(values, strip=header == "Result") for header, values in texts.items()}
+        return cls(
+            np.asarray(row_ids, dtype=np.int64),
+            np.asarray(dates, dtype=np.int32),
+            {header: as_float_column(values) for header, values in floats.items()},
+            {header: codes for header, (codes, _) in encoded.items()},
+            {header: categories for header, (_, categories) in encoded.items()},
+            np.asarray(bonus, dtype=bool),
+            raw_dates,
+        )
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def __getitem__(self, key):
+        """Rows by slice, boolean mask or positions, as a BetLog over the same categories."""
+        raw_dates = {}
+        if self.raw_dates:
+            positions = np.arange(len(self))[key]
+            raw_dates = {new: self.raw_dates[old] for new, old in enumerate(np.atleast_1d(positions))
+                         if old in self.raw_dates}
+        return BetLog(
+            self.row_ids[key],
+            self.dates[key],
+            {header: values[key] for header, values in self.floats.items()},
+            {header: values[key] for header, values in self.codes.items()},
+            self.categories,
+            self.bonus[key],
+            raw_dates,
+        )
+
+    @property
+    def nbytes(self):
+        """Memory held by the columns (arrays plus distinct text values)."""
+        total = self.row_ids.nbytes + self.dates.nbytes + self.bonus.nbytes
+        total += sum(values.nbytes for values in self.floats.values())
+        total += sum(values.nbytes for values in self.codes.values())
+        total += sum(sum(len(value) for value in values) for values in self.categories.values())
+        return total
+
+    # -------------------------------
+    # Column access
+    # -------------------------------
+    def column(self, header):
+        """Decoded values of one column (text columns as an object array)."""
+        if header in self.floats:
+            return self.floats[header]
+        if header in self.codes:
+            return self.categories[header][self.codes[header]]
+        if header == "Bonus":
+            return self.bonus
+        if header == "Date":
+            return np.array([self._date_value(pos) for pos in range(len(self))], dtype=object)
+        if header == "RowID":
+            return self.row_ids
+        raise KeyError(header)
+
+    def values_of(self, header):
+        """Distinct values present in a text column, sorted."""
+        present = np.unique(self.codes[header])
+        return sorted(self.categories[header][present], key=str)
+
+    def isin(self, header, values):
+        """Boolean mask of rows whose text column is one of `values`."""
+        wanted = np.isin(self.categories[header], [str(value) for value in values])
+        return wanted[self.codes[header]]
+
+    def days(self):
+        """Dates as datetime64[D], NaT where blank or unparseable."""
+        out = (self.dates.astype("int64") - _date(1970, 1, 1).toordinal()).astype("datetime64[D]")
+        out[self.dates == NO_DATE] = np.datetime64("NaT")
+        return out
+
+    def position(self, row_id):
+        """Position of a row id, or None. Row ids are ascending in ledger order."""
+        pos = int(np.searchsorted(self.row_ids, row_id))
+        return pos if pos < len(self) and self.row_ids[pos] == row_id else None
+
+    def _date_value(self, pos):
+        ordinal = int(self.dates[pos])
+        if ordinal == NO_DATE:
+            return self.raw_dates.get(pos)
+        return _date.fromordinal(ordinal).strftime("%m/%d/%y")
+
+    def record(self, pos):
+        """One bet as a Bet Log record (dict keyed by HEADERS) plus its RowID."""
+        record = {}
+        for header in HEADERS:
+            if header in self.floats:
+                value = float(self.floats[header][pos])
+                value = None if np.isnan(value) else value
+                if header in INTEGER_LIKE and value is not None and value.is_integer():
+                    value = int(value)
+            elif header in self.codes:
+                value = self.categories[header][self.codes[header][pos]]
+            elif header == "Bonus":
+                value = bool(self.bonus[pos])
+            else:
+                value = self._date_value(pos)
+            record[header] = value
+        record["RowID"] = int(self.row_ids[pos])
+        return record
+
+    def to_frame(self):
+        """A DataFrame of these rows in Bet Log column order (for display: build it for a page)."""
+        data = {}
+        for header in HEADERS:
+            values = self.column(header)
+            if header in INTEGER_LIKE and np.all(np.isnan(values) | (values == np.round(values))):
+                values = pd.array(np.where(np.isnan(values), 0, values).astype("int64"), dtype="Int64")
+                values[np.isnan(self.floats[header])] = pd.NA
+            data[header] = values
+        data["RowID"] = self.row_ids
+        return pd.DataFrame(data)
@@ -1,172 +1,384 @@
 import openpyxl
 from openpyxl.chart import LineChart, BarChart, Reference
-from openpyxl.styles import PatternFill
-from openpyxl.formatting.rule import CellIsRule
+from contextlib import nullcontext
 from datetime import datetime
-from openpyxl.chart.marker import DataPoint
-from openpyxl.utils import get_column_letter
-
-FILE_PATH = "Bet_Tracker.xlsx"
-
-HEADERS = [
-    "Date",
-    "Sportsbook",
-    "League",
-    "Market",
-    "Pick",
-    "Stake ($)",
-    "Odds",
-    "Result",
-    "Bonus",
-    "Decimal Odds",
-    "Payout ($)",
-    "Net PnL ($)",
-    "Cumulative PnL ($)"
-]
-
-def ensure_bet_log_headers(ws):
-    header_values = [cell.value for cell in ws[1]] if ws.max_row >= 1 else []
-    if not any(header_values):
-        ws.append(HEADERS)
-        return
+import argparse
+import hashlib
+import json
+import os
 
-    rename_map = {"Bet Type": "Market", "Selection": "Pick"}
-    for idx, value in enumerate(header_values, start=1):
-        if value in rename_map:
-            ws.cell(row=1, column=idx, value=rename_map[value])
+from analytics import LedgerAnalytics, dashboard_sections
+from export_xlsx import export_ledger, rewrite_ledger, workbook_extras
+import journal
+import profiling
+from betlog import BetLog
+from kpis import (
+    SERIES_HEADERS, SERIES_POINTS, SERIES_SHEET, aggregate, aggregate_log, breakdown_range, daily_pnl,
+    dashboard_rows, pnl_series,
+)
+from storage import (
+    BACKEND, DASHBOARD_MARK_KEY, DASHBOARD_STALE_KEY, FILE_PATH, HEADERS, add_net_pnl_formatting,
+    ensure_bet_log_headers, export_excel, file_signature, open_store, reprice_sheet,
+)
+from writer import ledger_lock
 
-    header_values = [cell.value for cell in ws[1]]
-    if "League" not in header_values:
-        try:
-            sportsbook_idx = header_values.index("Sportsbook") + 1
-        except ValueError:
-            sportsbook_idx = 2
-        ws.insert_cols(sportsbook_idx + 1)
-        ws.cell(row=1, column=sportsbook_idx + 1, value="League")
 
-    for idx, header in enumerate(HEADERS, start=1):
-        ws.cell(row=1, column=idx, value=header)
+# -------------------------------
+# Dashboard sheet
+# -------------------------------
+def write_dashboard_sheet(ws_dash, ws_series, summary, series, stats):
+    """
+    Fill a new, empty Dashboard sheet row by row (KPIs, the LedgerAnalytics `stats` and
+    breakdowns), and the empty PnL Series sheet the line chart plots with `series`
+    (pnl_series(): a few hundred points at most).
+    """
+    # -------------------------------
+    # 5. Write KPIs, analytics and breakdowns to Dashboard sheet
+    # -------------------------------
+    rows = dashboard_rows(summary, **dashboard_sections(stats))
+    for row in rows:
+        ws_dash.append(row)
+
+    # -------------------------------
+    # 6. Charts
+    # -------------------------------
+    # Line Chart: Cumulative Net PnL, one (downsampled) point per day
+    ws_series.append(SERIES_HEADERS)
+    for day, cumulative in series:
+        ws_series.append([day, cumulative])
+        ws_series.cell(row=ws_series.max_row, column=1).number_format = "mm/dd/yy"
+    last_row = max(ws_series.max_row, 2)
 
-STAKE_COL = HEADERS.index("Stake ($)") + 1
-RESULT_COL = HEADERS.index("Result") + 1
-NET_PNL_COL = HEADERS.index("Net PnL ($)") + 1
-CUM_PNL_COL = HEADERS.index("Cumulative PnL ($)") + 1
+    line = LineChart()
+    line.title = "Cumulative Net PnL Over Time"
+    line.x_axis.title = "Date"
+    line.y_axis.title = "Cumulative Net PnL ($)"
 
-STAKE_COL_LETTER = get_column_letter(STAKE_COL)
-RESULT_COL_LETTER = get_column_letter(RESULT_COL)
-NET_PNL_COL_LETTER = get_column_letter(NET_PNL_COL)
-CUM_PNL_COL_LETTER = get_column_letter(CUM_PNL_COL)
+    dates = Reference(ws_series, min_col=1, min_row=2, max_row=last_row)
+    cumulative = Reference(ws_series, min_col=2, min_row=2, max_row=last_row)
+    line.add_data(cumulative, titles_from_data=False)
+    line.set_categories(dates)
+
+    line.series[0].graphicalProperties.line.width = 20000
+    line.series[0].graphicalProperties.line.solidFill = "00B050"
+    line.height = 10
+    line.width = 20
+    line.legend = None
+    ws_dash.add_chart(line, "A12")
+
+    # Bar Chart: Net PnL by Sportsbook, one bar per book from the By Sportsbook table
+    by_book = breakdown_range(rows, "sportsbook")
+    if by_book is not None:
+        first, last, key_col, net_col = by_book
+        bar = BarChart()
+        bar.title = "Net PnL by Sportsbook"
+        bar.x_axis.title = "Sportsbook"
+        bar.y_axis.title = "Net PnL ($)"
+        sportsbooks = Reference(ws_dash, min_col=key_col, min_row=first, max_row=last)
+        net_pnl = Reference(ws_dash, min_col=net_col, min_row=first, max_row=last)
+        bar.add_data(net_pnl, titles_from_data=False)
+        bar.set_categories(sportsbooks)
+        bar.height, bar.width = 10, 20
+        bar.legend = None
+        ws_dash.add_chart(bar, "L12")
 
-# -------------------------------
-# 1. Load or create Bet Log
-# -------------------------------
-try:
-    wb = openpyxl.load_workbook(FILE_PATH)
-    ws_log = wb["Bet Log"]
-except FileNotFoundError:
-    wb = openpyxl.Workbook()
-    ws_log = wb.active
-    ws_log.title = "Bet Log"
-    ws_log.append(HEADERS)
-    wb.save(FILE_PATH)
-else:
-    ensure_bet_log_headers(ws_log)
 
 # -------------------------------
-# 1a. Convert Date column to Excel datetime format
+# High-water mark of the last build
 # -------------------------------
-for row in range(2, ws_log.max_row + 1):
-    cell = ws_log[f"A{row}"]
+# Saved next to the workbook after every full-mode build: how far the Bet Log had got
+# (last sheet row, and last ledger id for SQLite), the KPI summary, Net PnL per day and
+# the analytics' running state at that point and the workbook's file signature. The next build only converts, reprices and aggregates the
+# bets added since; it starts over whenever an earlier bet was edited or deleted.
+def state_path(path):
+    return path + ".dashboard.json"
+
+
+def load_state(path):
+    """The last build's state, or None if there is none (or it is unreadable or from an older version)."""
     try:
-        if isinstance(cell.value, str):
-            cell.value = datetime.strptime(cell.value, "%m/%d/%y")
-            cell.number_format = "mm/dd/yy"
-    except Exception:
-        pass
+        with open(state_path(path), encoding="utf-8") as handle:
+            state = json.load(handle)
+    except (FileNotFoundError, ValueError):
+        return None
+    return state if "days" in state and "analytics" in state else None
 
-# -------------------------------
-# 2. Conditional formatting for Net PnL
-# -------------------------------
-if ws_log.max_row > 1:
-    net_pnl_range = f"{NET_PNL_COL_LETTER}2:{NET_PNL_COL_LETTER}{ws_log.max_row}"
-    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-
-    ws_log.conditional_formatting.add(
-        net_pnl_range,
-        CellIsRule(operator='greaterThan', formula=['0'], fill=green_fill)
-    )
-    ws_log.conditional_formatting.add(
-        net_pnl_range,
-        CellIsRule(operator='lessThan', formula=['0'], fill=red_fill)
-    )
 
-# -------------------------------
-# 3. Create or refresh Dashboard sheet
-# -------------------------------
-if "Dashboard" in wb.sheetnames:
-    del wb["Dashboard"]
-ws_dash = wb.create_sheet("Dashboard")
+def save_state(path, state):
+    tmp = state_path(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as handle:
+        json.dump(state, handle)
+    os.replace(tmp, state_path(path))
 
-# -------------------------------
-# 4. Calculate KPIs in Python
-# -------------------------------
-total_pnl = sum(ws_log[f"{NET_PNL_COL_LETTER}{row}"].value or 0 for row in range(2, ws_log.max_row + 1))
-total_stake = sum(ws_log[f"{STAKE_COL_LETTER}{row}"].value or 0 for row in range(2, ws_log.max_row + 1))
-wins = sum(1 for row in range(2, ws_log.max_row + 1) if ws_log[f"{RESULT_COL_LETTER}{row}"].value == "Win")
-total_bets = sum(1 for row in range(2, ws_log.max_row + 1) if ws_log[f"{RESULT_COL_LETTER}{row}"].value not in (None, ""))
-pending_bets = sum(1 for row in range(2, ws_log.max_row + 1) if ws_log[f"{RESULT_COL_LETTER}{row}"].value in (None, ""))
 
-win_pct = wins / total_bets if total_bets > 0 else 0
-roi_pct = total_pnl / total_stake if total_stake > 0 else 0
+def _cell_key(value):
+    """
+    Cell value as hashed. Numbers go through 12 significant digits: a saved workbook
+    reads back 10.0 as 10 and drops the last digit of some floats.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return repr(value)
+    return format(float(value), ".12g")
+
+
+def rows_hash(ws, last_row):
+    """Content hash of Bet Log rows 2..last_row (Excel backend: catches edits to earlier bets)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for values in ws.iter_rows(min_row=2, max_row=last_row, max_col=len(HEADERS), values_only=True):
+        digest.update("\x1f".join(_cell_key(value) for value in values).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+def _same_signature(state, path):
+    signature = file_signature(path)
+    return state is not None and signature is not None and state.get("signature") == list(signature)
+
+
+def _ledger_changes(store, state, path):
+    """
+    SQLite: (bets added since the last build, or None if it has to start over (no or
+    foreign state, workbook changed, or the ledger's stale flag raised by an edit or
+    delete at or below the mark), the new mark). Moves the mark to the ledger's current
+    end and commits, so writers wait only for this check, never for a workbook rebuild.
+    """
+    # Nothing changes between the check and the new mark; bets saved after it are above the mark
+    store.conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = (
+            _same_signature(state, path)
+            and state.get("last_id") is not None
+            and store.get_meta(DASHBOARD_MARK_KEY) == str(state["last_id"])
+            and store.get_meta(DASHBOARD_STALE_KEY, "0") == "0"
+        )
+        changes = store.rows_after(state["last_id"]) if current else None
+        last_id = store.next_row_id() - 1
+        store.set_meta(DASHBOARD_MARK_KEY, last_id)
+        store.set_meta(DASHBOARD_STALE_KEY, "0")
+        store.conn.commit()
+    except BaseException:
+        store.conn.rollback()
+        raise
+    return changes, last_id
+
+
+_date_cache = {}
+
+
+def to_excel_date(value):
+    """MM/DD/YY text as a datetime; anything else (already a date, blank, unparseable) as-is."""
+    if not isinstance(value, str):
+        return value
+    parsed = _date_cache.get(value)
+    if parsed is None:
+        try:
+            parsed = datetime.strptime(value, "%m/%d/%y")
+        except ValueError:
+            parsed = value
+        _date_cache[value] = parsed
+    return parsed
 
-# -------------------------------
-# 5. Write KPIs to Dashboard sheet
-# -------------------------------
-ws_dash["A1"], ws_dash["B1"] = "KPI", "Value"
-ws_dash["A2"], ws_dash["B2"] = "Total PnL ($)", total_pnl
-ws_dash["A3"], ws_dash["B3"] = "Total Stake ($)", total_stake
-ws_dash["A4"], ws_dash["B4"] = "Wins", wins
-ws_dash["A5"], ws_dash["B5"] = "Total Bets", total_bets
-ws_dash["A6"], ws_dash["B6"] = "Pending Bets", pending_bets
-ws_dash["A7"], ws_dash["B7"] = "Win %", win_pct
-ws_dash["A8"], ws_dash["B8"] = "ROI (%)", roi_pct
 
 # -------------------------------
-# 6. Charts
+# Full mode: load, update in place, save
 # -------------------------------
-# Line Chart: Cumulative Net PnL
-line = LineChart()
-line.title = "Cumulative Net PnL Over Time"
-line.x_axis.title = "Date"
-line.y_axis.title = "Cumulative Net PnL ($)"
-
-dates = Reference(ws_log, min_col=1, min_row=2, max_row=ws_log.max_row)
-cumulative = Reference(ws_log, min_col=CUM_PNL_COL, min_row=2, max_row=ws_log.max_row)
-line.add_data(cumulative, titles_from_data=False)
-line.set_categories(dates)
-
-line.series[0].graphicalProperties.line.width = 20000
-line.series[0].graphicalProperties.line.solidFill = "00B050"
-line.height = 10
-line.width = 20
-line.legend = None
-ws_dash.add_chart(line, "A12")
-
-# Bar Chart: Net PnL by Sportsbook
-bar = BarChart()
-bar.title = "Net PnL by Sportsbook"
-bar.x_axis.title = "Sportsbook"
-bar.y_axis.title = "Net PnL ($)"
-sportsbooks = Reference(ws_log, min_col=2, min_row=2, max_row=ws_log.max_row)
-net_pnl = Reference(ws_log, min_col=NET_PNL_COL, min_row=2, max_row=ws_log.max_row)
-bar.add_data(net_pnl, titles_from_data=False)
-bar.set_categories(sportsbooks)
-bar.height, bar.width = 10, 20
-ws_dash.add_chart(bar, "L12")
+def build_dashboard(path=FILE_PATH, full=False, points=SERIES_POINTS):
+    """
+    Update the workbook's Bet Log, Dashboard and PnL Series sheets. Only bets added
+    since the last build are processed unless an earlier one changed, or full is set.
+    The cumulative PnL chart gets at most `points` points.
+    """
+    with profiling.operation("dashboard", path=path) as timing:
+        _build_dashboard(path, full, points)
+        timing.add(bytes=profiling.file_size(path))
+
+
+def _build_dashboard(path, full=False, points=SERIES_POINTS):
+    # -------------------------------
+    # 1. Load or create Bet Log
+    # -------------------------------
+    # Fold journaled bets into the ledger so the workbook includes them
+    if journal.has_pending():
+        journal.fold_now()
+
+    state = None if full else load_state(path)
+    added = None  # bets to append to the workbook (SQLite), None to export it afresh
+    last_id = None
+
+    # The SQLite ledger is the system of record; refresh the workbook's Bet Log from it first
+    if BACKEND != "excel":
+        try:
+            with open_store(create=False) as store:
+                with profiling.span("ledger changes") as timing:
+                    added, last_id = _ledger_changes(store, state, path)
+                    timing.add(rows=-1 if added is None else len(added))
+                if added is None:
+                    state = None
+                    # Outside any transaction: bets saved meanwhile are past last_id and are
+                    # left for the next build; an edit or delete raises the stale flag again
+                    with profiling.span("export ledger") as timing:
+                        timing.add(rows=export_excel(store, path, last_id))
+        except FileNotFoundError:
+            state = None
+        if added == []:
+            return  # nothing new since the last build
+    elif _same_signature(state, path):
+        return  # the workbook is exactly as the last build left it
+
+    # An Excel ledger is read, rebuilt and saved under the ledger lock, so no bet the writer
+    # saves meanwhile is overwritten (the journal is folded above: that takes the lock too)
+    with ledger_lock() if BACKEND == "excel" else nullcontext():
+        _update_workbook(path, state, added, last_id, points)
+
+
+def _update_workbook(path, state, added, last_id, points):
+    try:
+        with profiling.span("load workbook", bytes=profiling.file_size(path)):
+            wb = openpyxl.load_workbook(path)
+        ws_log = wb["Bet Log"]
+    except FileNotFoundError:
+        wb = openpyxl.Workbook()
+        ws_log = wb.active
+        ws_log.title = "Bet Log"
+        ws_log.append(HEADERS)
+        wb.save(path)
+        state = None
+    else:
+        ensure_bet_log_headers(ws_log)
+
+    # Excel: bets below the mark must be exactly as the last build wrote them
+    if BACKEND == "excel" and state is not None:
+        with profiling.span("check earlier rows", rows=state["last_row"] - 1):
+            if ws_log.max_row < state["last_row"] or rows_hash(ws_log, state["last_row"]) != state["hash"]:
+                state = None
+
+    first_row = 2 if state is None else state["last_row"] + 1
+    for _, record in added or ():
+        ws_log.append([record.get(header) for header in HEADERS])
+
+    # -------------------------------
+    # 1a. Convert Date column to Excel datetime format
+    # -------------------------------
+    with profiling.span("parse dates", rows=ws_log.max_row - first_row + 1):
+        for row in range(first_row, ws_log.max_row + 1):
+            cell = ws_log.cell(row=row, column=1)
+            value = to_excel_date(cell.value)
+            if value is not cell.value:
+                cell.value = value
+                cell.number_format = "mm/dd/yy"
+
+    # -------------------------------
+    # 1b. Reprice derived columns with the shared pricing engine
+    # -------------------------------
+    with profiling.span("reprice"):
+        reprice_sheet(ws_log, from_row=first_row)
+
+    # -------------------------------
+    # 2. Conditional formatting for Net PnL
+    # -------------------------------
+    add_net_pnl_formatting(ws_log)
+
+    # -------------------------------
+    # 3. Create or refresh Dashboard and PnL Series sheets
+    # -------------------------------
+    for name in ("Dashboard", SERIES_SHEET):
+        if name in wb.sheetnames:
+            del wb[name]
+    ws_dash = wb.create_sheet("Dashboard")
+    ws_series = wb.create_sheet(SERIES_SHEET)
+
+    # -------------------------------
+    # 4. Calculate KPIs in Python
+    # -------------------------------
+    rows = [
+        (row_id, dict(zip(HEADERS, values)))
+        for row_id, values in enumerate(
+            ws_log.iter_rows(min_row=first_row, max_col=len(HEADERS), values_only=True), start=first_row
+        )
+        if any(cell not in (None, "") for cell in values)
+    ]
+    with profiling.span("kpis"):
+        # Cell values are copied into columns once; every KPI, group-by and day sum is a column scan
+        log = BetLog.from_rows(rows)
+        if state is None:
+            summary = aggregate_log(log)
+            days = daily_pnl(log)
+            stats = LedgerAnalytics().add(log)
+        else:
+            # Only the new bets, added to the totals saved by the last build
+            summary = aggregate((record for _, record in rows), summary=state["summary"])
+            days = daily_pnl(log, {int(ordinal): net for ordinal, net in state["days"]})
+            stats = LedgerAnalytics.from_dict(state["analytics"]).add(log)
+
+    with profiling.span("dashboard sheet") as timing:
+        series = pnl_series(days, points)
+        write_dashboard_sheet(ws_dash, ws_series, summary, series, stats)
+        timing.add(rows=len(series))
+
+    # -------------------------------
+    # 7. Save workbook
+    # -------------------------------
+    with profiling.span("save workbook"):
+        wb.save(path)
+
+    new_state = {
+        "last_row": ws_log.max_row, "last_id": last_id, "summary": summary, "days": sorted(days.items()),
+        "analytics": stats.as_dict(),
+    }
+    if BACKEND == "excel":
+        with profiling.span("hash rows", rows=ws_log.max_row - 1):
+            new_state["hash"] = rows_hash(ws_log, ws_log.max_row)
+    new_state["signature"] = list(file_signature(path))
+    save_state(path, new_state)
+
 
 # -------------------------------
-# 7. Save workbook
+# Streaming mode: constant memory in the number of bets
 # -------------------------------
-wb.save(FILE_PATH)
-print(f"✅ Bet Tracker Dashboard ready: {FILE_PATH}")
+def build_dashboard_streaming(path=FILE_PATH, points=SERIES_POINTS):
+    """
+    Rebuild the workbook without holding it in memory: the Bet Log is streamed from
+    the ledger (or read-only from the existing workbook), repriced in chunks and
+    written by the xlsxwriter exporter while KPIs aggregate in the same pass.
+    Only the Dashboard sheet's rows (one per group) are kept in memory.
+    """
+    with profiling.operation("dashboard --stream", path=path) as timing:
+        _build_dashboard_streaming(path, points)
+        timing.add(bytes=profiling.file_size(path))
+
+
+def _build_dashboard_streaming(path, points):
+    if journal.has_pending():
+        journal.fold_now()
+
+    if BACKEND != "excel":
+        try:
+            export_ledger(path, points=points)
+        except FileNotFoundError:
+            build_dashboard(path, points=points)
+        return
+
+    if not os.path.exists(path) or workbook_extras(path)[1]:
+        # A streamed rewrite would flatten the ledger's other sheets: update it in place instead
+        return build_dashboard(path, points=points)
+    rewrite_ledger(path, points)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the Bet Tracker Excel dashboard.")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the Bet Log (read-only / write-only) so memory stays flat on large ledgers")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild from every bet instead of only those added since the last build")
+    parser.add_argument("--points", type=int, default=SERIES_POINTS,
+                        help=f"most points in the cumulative PnL chart (default {SERIES_POINTS})")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    if args.stream:
+        build_dashboard_streaming(FILE_PATH, points=args.points)
+    else:
+        build_dashboard(FILE_PATH, full=args.full, points=args.points)
+    print(f"✅ Bet Tracker Dashboard ready: {FILE_PATH}")
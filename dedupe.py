@@ -0,0 +1,61 @@
+import os
+
+from storage import BACKEND, fingerprint, ledger_path, open_store, workbook_index
+import journal
+
+
+# -------------------------------
+# Duplicate detection
+# -------------------------------
+# A bet is a duplicate when the ledger already holds one with the same fingerprint
+# (date, sportsbook, league, market, pick, odds and stake; see storage.fingerprint).
+# Lookups go through the ledger's fingerprint index: an indexed column in SQLite,
+# a sidecar file next to a workbook.
+class DuplicateFilter:
+    """
+    Flags records the ledger already holds, for one bulk write (runs on the writer
+    with the open store). Counts are matched, not just presence: importing an export
+    holding two identical bets into a ledger holding one of them logs the second.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # fingerprint -> bets in the ledger not yet matched by a record of this write
+        self.remaining = {}
+
+    def flags(self, records):
+        """One bool per record, True for a duplicate. Call before appending them."""
+        fingerprints = [fingerprint(record) for record in records]
+        unseen = {fp for fp in fingerprints if fp not in self.remaining}
+        if unseen:
+            counts = self.store.fingerprint_counts(unseen)
+            for fp in unseen:
+                self.remaining[fp] = counts.get(fp, 0)
+        out = []
+        for fp in fingerprints:
+            duplicate = self.remaining[fp] > 0
+            if duplicate:
+                self.remaining[fp] -= 1
+            out.append(duplicate)
+        return out
+
+
+def is_logged(record, backend=None):
+    """
+    Whether a bet with the same fingerprint is already in the ledger or waiting in
+    its journal, without loading the ledger (one indexed lookup).
+    """
+    backend = backend or BACKEND
+    fp = fingerprint(record)
+    events, _ = journal.read_events(backend)
+    if any(event.get("op") == "append" and fingerprint(event["record"]) == fp for event in events):
+        return True
+    if not os.path.exists(ledger_path(backend)):
+        return False
+    if backend == "excel":
+        return fp in workbook_index(ledger_path(backend)).counts
+    store = open_store(backend, readonly=True)
+    try:
+        return bool(store.fingerprint_counts([fp]))
+    finally:
+        store.close()
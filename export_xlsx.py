@@ -0,0 +1,256 @@
+import openpyxl
+import xlsxwriter
+from datetime import datetime, date as _date
+import argparse
+import os
+import sys
+
+from analytics import LedgerAnalytics, dashboard_sections
+from betlog import BetLog
+import journal
+import profiling
+from kpis import (
+    SERIES_HEADERS, SERIES_POINTS, SERIES_SHEET, add_day, aggregate, breakdown_range, dashboard_rows,
+    pnl_series,
+)
+from storage import BACKEND, FILE_PATH, HEADERS, holds_lock, iter_priced, open_store, read_bet_log
+from writer import ledger_lock, lock_path
+
+NET_PNL_COL = HEADERS.index("Net PnL ($)")
+
+# openpyxl's 20 x 10 cm charts, in pixels
+CHART_SIZE = {"width": 756, "height": 378}
+# Bets per analytics chunk while streaming
+ANALYTICS_CHUNK = 5000
+# Sheets write_workbook() writes; a workbook with any other cannot be rewritten by it
+LEDGER_SHEETS = ("Bet Log", "Dashboard", SERIES_SHEET)
+
+
+def parse_date(value):
+    """Bet Log dates are stored as MM/DD/YY strings; Excel wants real datetimes."""
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, "%m/%d/%y")
+        except ValueError:
+            return value
+    if isinstance(value, _date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _write_value(ws, row, col, value, date_format):
+    if value is None or value == "":
+        return
+    if isinstance(value, datetime):
+        ws.write_datetime(row, col, value, date_format)
+    elif isinstance(value, bool):
+        ws.write_boolean(row, col, value)
+    elif isinstance(value, (int, float)):
+        ws.write_number(row, col, value)
+    else:
+        ws.write_string(row, col, str(value))
+
+
+def workbook_extras(path):
+    """
+    ({name: value} custom document properties, [names of sheets besides LEDGER_SHEETS])
+    of an existing workbook, read in read-only mode.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        properties = {prop.name: prop.value for prop in wb.custom_doc_props}
+        return properties, [name for name in wb.sheetnames if name not in LEDGER_SHEETS]
+    finally:
+        wb.close()
+
+
+def write_workbook(records, path=FILE_PATH, reprice=True, points=SERIES_POINTS, properties=None):
+    """
+    Write the Bet Log, Dashboard and PnL Series sheets with xlsxwriter in constant_memory
+    mode. `records` is any iterable of Bet Log records (None = blank row), consumed once:
+    rows are repriced in chunks, written and aggregated (KPIs, Net PnL per day and the
+    analytics, a chunk of columns at a time) as they stream past, so memory stays flat
+    in the number of bets. The cumulative PnL chart gets
+    at most `points` points. properties are custom document properties {name: value}.
+    Written next to `path` and renamed into place. Returns the KPI summary.
+    Raises ValueError for the Excel ledger unless the caller holds writer.ledger_lock().
+    """
+    if is_excel_ledger(path) and not holds_lock(lock_path("excel")):
+        raise ValueError(f"{path} is the Excel ledger; only rewrite it under the ledger lock (rewrite_ledger())")
+    tmp_path = path + ".tmp"
+    wb = xlsxwriter.Workbook(tmp_path, {"constant_memory": True})
+    try:
+        for name, value in (properties or {}).items():
+            wb.set_custom_property(name, value)
+        date_format = wb.add_format({"num_format": "mm/dd/yy"})
+        green = wb.add_format({"bg_color": "#C6EFCE"})
+        red = wb.add_format({"bg_color": "#FFC7CE"})
+
+        # -------------------------------
+        # Bet Log (streamed)
+        # -------------------------------
+        ws_log = wb.add_worksheet("Bet Log")
+        ws_log.write_row(0, 0, HEADERS)
+        row = 0
+        days = {}
+        stats = LedgerAnalytics()
+        chunk = []
+
+        def stream():
+            nonlocal row
+            for record in (iter_priced(records) if reprice else records):
+                row += 1
+                if record is None:
+                    continue
+                for col, header in enumerate(HEADERS):
+                    value = record.get(header)
+                    if col == 0:
+                        value = parse_date(value)
+                    _write_value(ws_log, row, col, value, date_format)
+                add_day(days, record)
+                chunk.append((row, record))
+                if len(chunk) >= ANALYTICS_CHUNK:
+                    stats.add(BetLog.from_rows(chunk))
+                    chunk.clear()
+                yield record
+            stats.add(BetLog.from_rows(chunk))
+
+        with profiling.span("stream bet log") as timing:
+            summary = aggregate(stream())
+            timing.add(rows=row)
+
+        # Conditional formatting for Net PnL, one rule pair over the whole column
+        ws_log.conditional_format(1, NET_PNL_COL, 1048575, NET_PNL_COL,
+                                  {"type": "cell", "criteria": ">", "value": 0, "format": green})
+        ws_log.conditional_format(1, NET_PNL_COL, 1048575, NET_PNL_COL,
+                                  {"type": "cell", "criteria": "<", "value": 0, "format": red})
+
+        # -------------------------------
+        # Dashboard
+        # -------------------------------
+        ws_dash = wb.add_worksheet("Dashboard")
+        dash_rows = dashboard_rows(summary, **dashboard_sections(stats))
+        for r, values in enumerate(dash_rows):
+            for c, value in enumerate(values):
+                _write_value(ws_dash, r, c, value, date_format)
+
+        # Line Chart: Cumulative Net PnL, one (downsampled) point per day from the PnL Series sheet
+        series = pnl_series(days, points)
+        last = max(len(series), 1)
+        line = wb.add_chart({"type": "line"})
+        line.add_series({
+            "categories": [SERIES_SHEET, 1, 0, last, 0],
+            "values": [SERIES_SHEET, 1, 1, last, 1],
+            "line": {"color": "#00B050", "width": 1.5},
+        })
+        line.set_title({"name": "Cumulative Net PnL Over Time"})
+        line.set_x_axis({"name": "Date"})
+        line.set_y_axis({"name": "Cumulative Net PnL ($)"})
+        line.set_legend({"none": True})
+        line.set_size(CHART_SIZE)
+        ws_dash.insert_chart("A12", line)
+
+        # Bar Chart: Net PnL by Sportsbook, one bar per book from the By Sportsbook table
+        by_book = breakdown_range(dash_rows, "sportsbook")
+        if by_book is not None:
+            first, last, key_col, net_col = (n - 1 for n in by_book)
+            bar = wb.add_chart({"type": "column"})
+            bar.add_series({
+                "categories": ["Dashboard", first, key_col, last, key_col],
+                "values": ["Dashboard", first, net_col, last, net_col],
+            })
+            bar.set_title({"name": "Net PnL by Sportsbook"})
+            bar.set_x_axis({"name": "Sportsbook"})
+            bar.set_y_axis({"name": "Net PnL ($)"})
+            bar.set_legend({"none": True})
+            bar.set_size(CHART_SIZE)
+            ws_dash.insert_chart("L12", bar)
+
+        ws_series = wb.add_worksheet(SERIES_SHEET)
+        ws_series.write_row(0, 0, SERIES_HEADERS)
+        for r, (day, cumulative) in enumerate(series, start=1):
+            _write_value(ws_series, r, 0, parse_date(day), date_format)
+            ws_series.write_number(r, 1, cumulative)
+
+        with profiling.span("save workbook"):
+            wb.close()
+    except BaseException:
+        # Leave no half-written temp file behind
+        if not wb.fileclosed:
+            try:
+                wb.close()
+            except Exception:
+                pass
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+    return summary
+
+
+def is_excel_ledger(path):
+    """Whether path is the workbook the Excel backend keeps the ledger in."""
+    return BACKEND == "excel" and os.path.abspath(path) == os.path.abspath(FILE_PATH)
+
+
+def rewrite_ledger(path=FILE_PATH, points=SERIES_POINTS):
+    """
+    Rewrite an Excel ledger in place with write_workbook(): its Bet Log streamed back,
+    a fresh Dashboard and PnL Series, and its custom document properties (where the
+    journal keeps its fold marker) carried over. Raises ValueError if it has any other
+    sheet, whose formatting and charts would not survive. Returns the KPI summary.
+    Read and replaced under the ledger lock, so no bet saved in between is lost; fold
+    the journal first (that goes through the writer, which takes the same lock).
+    """
+    with ledger_lock("excel"):
+        properties, others = workbook_extras(path)
+        if others:
+            raise ValueError(f"{path} has other sheets ({', '.join(others)}) that a streamed rewrite would flatten")
+        return write_workbook(read_bet_log(path), path, points=points, properties=properties)
+
+
+def export_ledger(path=FILE_PATH, backend=None, points=SERIES_POINTS):
+    """Stream the configured ledger into a fresh Bet Log + Dashboard + PnL Series workbook."""
+    with profiling.operation("export", path=path) as timing:
+        summary = _export_ledger(path, backend, points)
+        timing.add(rows=summary["totals"]["bets"], bytes=profiling.file_size(path))
+    return summary
+
+
+def _export_ledger(path, backend, points):
+    if journal.has_pending(backend):
+        journal.fold_now(backend)
+    if is_excel_ledger(path):
+        if (backend or BACKEND) != "excel":
+            raise ValueError(f"{path} is the Excel ledger; export the {backend} ledger to another --out")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        return rewrite_ledger(path, points)
+    if (backend or BACKEND) == "excel":
+        # The workbook is the ledger: read it in read-only mode while the new one is written
+        if not os.path.exists(FILE_PATH):
+            raise FileNotFoundError(FILE_PATH)
+        return write_workbook(read_bet_log(FILE_PATH), path, points=points)
+    store = open_store(backend, readonly=True)
+    try:
+        return write_workbook(store.iter_records(), path, points=points)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the ledger to Excel with xlsxwriter (constant memory).")
+    parser.add_argument("--out", default=FILE_PATH)
+    parser.add_argument("--points", type=int, default=SERIES_POINTS,
+                        help=f"most points in the cumulative PnL chart (default {SERIES_POINTS})")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    try:
+        summary = export_ledger(args.out, points=args.points)
+    except ValueError as exc:
+        sys.exit(f"❌ Nothing exported, {exc}")
+    print(f"✅ Exported {summary['totals']['bets']} bet(s) to {args.out}")
@@ -0,0 +1,308 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from datetime import datetime
+import argparse
+import csv
+import json
+import os
+import sys
+
+from dedupe import DuplicateFilter
+from log_new_bets import CSV_ALIASES, priced_records, validate_bet
+from pricing import cumulative_pnl, to_optional
+import profiling
+import writer
+
+# Rows validated and priced per task
+CHUNK_SIZE = 5000
+
+# -------------------------------
+# Per-book column mappings
+# -------------------------------
+# "columns" maps a lower-cased CSV header to a log_bet() field; "sportsbook" fills the
+# book for exports that have no such column. Headers vary between export versions, so
+# extra aliases are harmless; pass --book FILE.json to override or add a book.
+MAPPINGS = {
+    "generic": {"columns": CSV_ALIASES},
+    "draftkings": {
+        "sportsbook": "DraftKings",
+        "columns": {
+            "date": "date", "date placed": "date", "placed": "date",
+            "sport": "league", "league": "league",
+            "bet type": "market", "market": "market",
+            "selection": "pick", "pick": "pick", "description": "pick",
+            "odds": "odds",
+            "wager": "stake", "stake": "stake", "amount": "stake",
+            "status": "result", "result": "result", "bet status": "result",
+            "bonus bet": "bonus", "free bet": "bonus",
+            "boost": "profit_boost", "profit boost": "profit_boost",
+        },
+    },
+    "fanduel": {
+        "sportsbook": "FanDuel",
+        "columns": {
+            "date": "date", "placed": "date", "placed date": "date",
+            "sport": "league", "league": "league",
+            "type": "market", "bet type": "market", "market": "market",
+            "bet": "pick", "selection": "pick", "description": "pick",
+            "odds": "odds", "price": "odds",
+            "stake": "stake", "wager": "stake",
+            "result": "result", "status": "result",
+            "bonus bet": "bonus", "bonus": "bonus",
+            "profit boost": "profit_boost", "boost": "profit_boost", "boost %": "profit_boost",
+        },
+    },
+    "betmgm": {
+        "sportsbook": "BetMGM",
+        "columns": {
+            "date": "date", "bet placed": "date", "placed": "date",
+            "sport": "league", "league": "league",
+            "bet type": "market", "market": "market",
+            "selection": "pick", "event / selection": "pick", "pick": "pick",
+            "odds": "odds",
+            "stake": "stake", "wager": "stake",
+            "status": "result", "result": "result",
+            "free bet": "bonus", "bonus": "bonus",
+            "boost": "profit_boost", "profit boost": "profit_boost",
+        },
+    },
+}
+
+RESULT_ALIASES = {
+    "win": "Win", "won": "Win", "w": "Win", "cashed out": "Win",
+    "loss": "Loss", "lost": "Loss", "lose": "Loss", "l": "Loss",
+    "push": "Push", "void": "Push", "voided": "Push", "cancelled": "Push", "canceled": "Push",
+    "refunded": "Push", "refund": "Push", "p": "Push",
+    "open": "Open", "pending": "Open", "unsettled": "Open", "active": "Open",
+    "": "",
+}
+TRUE_VALUES = ("y", "yes", "true", "1", "bonus", "bonus bet", "free bet", "freebet")
+DATE_FORMATS = ("%m/%d/%y", "%m/%d/%Y", "%Y-%m-%d", "%d %b %Y", "%b %d, %Y", "%B %d, %Y")
+
+
+def load_mapping(name_or_path):
+    """A built-in mapping by book name, or a JSON file with the same shape."""
+    if name_or_path.lower() in MAPPINGS:
+        return MAPPINGS[name_or_path.lower()]
+    with open(name_or_path, encoding="utf-8") as handle:
+        mapping = json.load(handle)
+    mapping["columns"] = {key.strip().lower(): field for key, field in mapping.get("columns", {}).items()}
+    return mapping
+
+
+# -------------------------------
+# Normalization
+# -------------------------------
+def _number(value):
+    """'$1,250.00' / '25%' / '+150' -> number; blanks stay None."""
+    if value is None:
+        return None
+    text = str(value).strip().replace("$", "").replace(",", "").replace("%", "")
+    if not text:
+        return None
+    number = float(text)
+    return int(number) if number.is_integer() else number
+
+
+def normalize_odds(value):
+    """American odds as-is; decimal odds (1.01 - 99) converted to American."""
+    odds = _number(value)
+    if odds is None:
+        return None
+    if 1 < odds < 100 and "." in str(value):
+        odds = (odds - 1) * 100 if odds >= 2 else -100 / (odds - 1)
+        return round(odds)
+    return odds
+
+
+_date_cache = {}
+
+
+def normalize_date(value):
+    """Any common export date (or ISO timestamp) as MM/DD/YY; cached, since dates repeat."""
+    text = str(value or "").strip()
+    if not text:
+        return None
+    if "T" in text[:11]:
+        text = text[:10]  # ISO timestamp
+    date = _date_cache.get(text)
+    if date is None:
+        date = _date_cache[text] = _parse_date(text)
+    return date
+
+
+def _parse_date(text):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%m/%d/%y")
+        except ValueError:
+            continue
+    # Keep a leading date from "MM/DD/YYYY hh:mm" style values
+    head = text.split(" ")[0]
+    for fmt in DATE_FORMATS[:3]:
+        try:
+            return datetime.strptime(head, fmt).strftime("%m/%d/%y")
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {text!r}")
+
+
+def normalize_row(row, mapping):
+    """Map one CSV row (header -> text) onto log_bet() fields; None for a blank line."""
+    columns = mapping["columns"]
+    bet = {}
+    for key, value in row.items():
+        field = columns.get((key or "").strip().lower())
+        if field is not None and value not in (None, ""):
+            bet[field] = value.strip() if isinstance(value, str) else value
+    if not bet:
+        return None
+    if mapping.get("sportsbook") and not bet.get("sportsbook"):
+        bet["sportsbook"] = mapping["sportsbook"]
+
+    result = str(bet.get("result", "")).strip().lower()
+    if result not in RESULT_ALIASES:
+        raise ValueError(f"unrecognised result {bet['result']!r}")
+    bet["result"] = RESULT_ALIASES[result]
+    bet["bonus"] = str(bet.get("bonus", "")).strip().lower() in TRUE_VALUES
+    bet["odds"] = normalize_odds(bet.get("odds"))
+    bet["stake"] = _number(bet.get("stake"))
+    bet["profit_boost"] = _number(bet.get("profit_boost"))
+    if "date" in bet:
+        bet["date"] = normalize_date(bet["date"])
+    return bet
+
+
+def prepare_chunk(task):
+    """
+    Normalize, validate and price one chunk of CSV rows (runs in a worker process).
+    Returns (records, errors); records carry no Cumulative PnL yet.
+    """
+    rows, mapping, source, first_line = task
+    cleaned, errors = [], []
+    for line, row in enumerate(rows, start=first_line):
+        try:
+            bet = normalize_row(row, mapping)
+            if bet is not None:
+                cleaned.append(validate_bet(bet))
+        except ValueError as exc:
+            errors.append(f"{source}:{line}: {exc}")
+    records = priced_records(cleaned) if cleaned else []
+    for record in records:
+        record["Cumulative PnL ($)"] = None
+    return records, errors
+
+
+# -------------------------------
+# Streaming pipeline
+# -------------------------------
+def iter_tasks(paths, mapping, chunk_size=CHUNK_SIZE):
+    """Read every file in order and cut it into chunks of raw rows."""
+    for path in paths:
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.DictReader(handle)
+            chunk, first_line = [], 2
+            for row in reader:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk, mapping, path, first_line
+                    first_line = reader.line_num + 1
+                    chunk = []
+            if chunk:
+                yield chunk, mapping, path, first_line
+
+
+def iter_prepared(tasks, workers=1):
+    """
+    Yield prepare_chunk() results in input order. With workers > 1 chunks are
+    processed by a process pool, at most 2 per worker in flight, so memory stays
+    bounded however large the files are.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield prepare_chunk(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.submit(prepare_chunk, task))
+            if len(in_flight) >= workers * 2:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+def import_files(paths, mapping="generic", workers=None, skip_invalid=False, chunk_size=CHUNK_SIZE,
+                 allow_duplicates=False):
+    """
+    Import CSV files into the ledger in a single write (one writer job, one save).
+    Rows are appended in file order. Unless skip_invalid, any bad row aborts the
+    import and leaves the ledger untouched. Bets the ledger already holds (a re-imported
+    export) are skipped unless allow_duplicates.
+    Returns {"imported", "skipped", "duplicates", "errors"}.
+    """
+    if isinstance(mapping, str):
+        mapping = load_mapping(mapping)
+    if workers is None:
+        workers = min(len(paths), os.cpu_count() or 1)
+
+    def write(store):
+        # Runs on the ledger writer; nothing is saved unless the whole stream succeeds.
+        # Counted afresh on each run: the writer re-runs a job when another in its batch fails
+        stats = {"imported": 0, "skipped": 0, "duplicates": 0, "errors": []}
+        running = store.last_cumulative()
+        duplicates = None if allow_duplicates else DuplicateFilter(store)
+        for records, errors in iter_prepared(iter_tasks(paths, mapping, chunk_size), workers):
+            if errors:
+                if not skip_invalid:
+                    raise ValueError(errors[0])
+                stats["skipped"] += len(errors)
+                stats["errors"].extend(errors[:100 - len(stats["errors"])])
+            if duplicates is not None and records:
+                flags = duplicates.flags(records)
+                stats["duplicates"] += sum(flags)
+                records = [record for record, duplicate in zip(records, flags) if not duplicate]
+            if not records:
+                continue
+            net = [record["Net PnL ($)"] for record in records]
+            for record, cum in zip(records, cumulative_pnl(net, running)):
+                record["Cumulative PnL ($)"] = to_optional(cum)
+                if record["Cumulative PnL ($)"] is not None:
+                    running = record["Cumulative PnL ($)"]
+            store.append(records)
+            stats["imported"] += len(records)
+        return stats
+
+    with profiling.operation("import", files=len(paths), workers=workers) as timing:
+        stats = writer.run(write)
+        timing.add(rows=stats["imported"])
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import sportsbook CSV exports into the Bet Tracker.")
+    parser.add_argument("files", nargs="+", metavar="CSV")
+    parser.add_argument("--book", default="generic",
+                        help=f"column mapping: {', '.join(MAPPINGS)} or a JSON mapping file")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per file, up to CPUs)")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="skip rows that fail validation instead of aborting the import")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="import bets even if the ledger already holds an identical one")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    try:
+        stats = import_files(args.files, args.book, args.workers, args.skip_invalid,
+                             allow_duplicates=args.allow_duplicates)
+    except ValueError as exc:
+        sys.exit(f"❌ Nothing imported, {exc}")
+    print(f"✅ Imported {stats['imported']} bet(s) from {len(args.files)} file(s)")
+    if stats["duplicates"]:
+        print(f"⚠️ Skipped {stats['duplicates']} bet(s) already in the ledger")
+    if stats["skipped"]:
+        print(f"⚠️ Skipped {stats['skipped']} invalid row(s):")
+        for error in stats["errors"]:
+            print(f"   {error}")
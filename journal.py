@@ -0,0 +1,367 @@
+from bisect import bisect_left
+from datetime import datetime, date as _date
+import argparse
+import json
+import os
+import threading
+import uuid
+
+from pricing import cumulative_pnl, price_columns, to_optional
+from profiling import span
+from storage import SETTLED_RESULTS, file_lock, ledger_path, partition_of
+
+# Seconds between a journaled write and the background fold into the ledger
+FOLD_DELAY = 2.0
+
+# Ledger meta key holding the id of the last event folded into it
+LAST_ID_KEY = "journal_last_id"
+
+
+def journal_path(backend=None):
+    return ledger_path(backend) + ".journal"
+
+
+def _lock_path(backend=None):
+    return journal_path(backend) + ".lock"
+
+
+def _encode(value):
+    if isinstance(value, (datetime, _date)):
+        return value.strftime("%m/%d/%y")
+    return str(value)
+
+
+# -------------------------------
+# Writing events
+# -------------------------------
+def append_event(event, backend=None):
+    """
+    Durably append one event ({"op": "append" | "update" | "delete" | "settle", ...}) to the
+    journal and schedule a fold. The line is fsync'd before returning. Returns its id.
+    """
+    event = dict(event, id=uuid.uuid4().hex)
+    line = (json.dumps(event, default=_encode, separators=(",", ":")) + "\n").encode("utf-8")
+    with span("journal append", bytes=len(line)), file_lock(_lock_path(backend)):
+        fd = os.open(journal_path(backend), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # A line torn by a crash must not swallow this one
+            if os.fstat(fd).st_size:
+                os.lseek(fd, -1, os.SEEK_END)
+                if os.read(fd, 1) != b"\n":
+                    line = b"\n" + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    schedule_fold(backend)
+    return event["id"]
+
+
+def append_bet(record, backend=None):
+    """Journal a new, already priced bet; its Cumulative PnL is filled in on fold."""
+    return append_event({"op": "append", "record": record}, backend)
+
+
+def update_bet(row_id, record, backend=None):
+    return append_event({"op": "update", "row": int(row_id), "record": record}, backend)
+
+
+def delete_bets(row_ids, soft=False, backend=None):
+    return append_event({"op": "delete", "rows": [int(rid) for rid in row_ids], "soft": bool(soft)}, backend)
+
+
+def settle_bets(results, backend=None):
+    """Journal final results for many bets ({row_id: "Win" | "Loss" | "Push"}), applied as one settle()."""
+    for result in results.values():
+        # Checked here: a bad event would fail every fold after it
+        if result not in SETTLED_RESULTS:
+            raise ValueError(f"result must be one of {'/'.join(SETTLED_RESULTS)}, got {result!r}")
+    return append_event({"op": "settle", "results": {str(int(rid)): result for rid, result in results.items()}}, backend)
+
+
+# -------------------------------
+# Reading events
+# -------------------------------
+def read_events(backend=None):
+    """Every complete event in the journal, plus the byte offset they end at."""
+    try:
+        with open(journal_path(backend), "rb") as handle:
+            data = handle.read()
+    except FileNotFoundError:
+        return [], 0
+    events = []
+    end = 0
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break  # still being written
+        end += len(line)
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue  # torn by a crash; the bet it held was never acknowledged
+    return events, end
+
+
+def pending_events(store, backend=None):
+    """Events not yet folded into `store`, and the journal offset read up to."""
+    events, end = read_events(backend)
+    last_id = store.get_meta(LAST_ID_KEY)
+    if last_id:
+        for idx, event in enumerate(events):
+            if event.get("id") == last_id:
+                events = events[idx + 1:]
+                break
+    return events, end
+
+
+# -------------------------------
+# Folding into the ledger
+# -------------------------------
+def _apply_update(store, row_id, record):
+    previous = store.get(row_id)
+    if previous is None or not any(value not in (None, "") for value in previous.values()):
+        # Deleted (an Excel tombstone is a blank row), compacted away or renumbered since it
+        # was journaled: dropped, as _merge() does. Updating it would give an Excel ledger a
+        # row holding only the edited fields
+        return
+    store.update(row_id, record)
+    # Only rows from the edited one onward move, and only if its Net PnL did
+    if "Net PnL ($)" in record and previous.get("Net PnL ($)") != record["Net PnL ($)"]:
+        store.recompute_cumulative(from_row=row_id)
+
+
+def fold(store, backend=None):
+    """
+    Apply pending journal events to an open store, in order. The caller holds the
+    ledger lock and saves; the last folded id is saved with the ledger, so a crash
+    before release() never applies an event twice. Returns the offset for release().
+    """
+    events, end = pending_events(store, backend)
+    appends = []
+
+    def flush_appends():
+        if appends:
+            net = [record.get("Net PnL ($)") for record in appends]
+            for record, cum in zip(appends, cumulative_pnl(net, store.last_cumulative())):
+                record["Cumulative PnL ($)"] = to_optional(cum)
+            store.append(list(appends))
+            appends.clear()
+
+    for event in events:
+        op = event.get("op")
+        if op == "append":
+            appends.append(event["record"])
+            continue
+        flush_appends()
+        if op == "update":
+            _apply_update(store, int(event["row"]), event["record"])
+        elif op == "delete":
+            store.delete(event["rows"], soft=event.get("soft", False))
+        elif op == "settle":
+            store.settle(event["results"])
+    flush_appends()
+
+    if events:
+        store.set_meta(LAST_ID_KEY, events[-1]["id"])
+    return end
+
+
+def release(end, backend=None):
+    """
+    Drop the events up to `end` from the journal once they are in the saved ledger.
+    Events appended since the fold read it are kept, in a rewritten file, for the next one.
+    """
+    if not end:
+        return
+    path = journal_path(backend)
+    with file_lock(_lock_path(backend)):
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size == end:
+            os.truncate(path, 0)
+            return
+        # Logging kept arriving during the fold: keep only the unfolded tail, so the
+        # journal (and every fold's read of it) stays as small as the backlog
+        tmp_path = path + ".tmp"
+        with open(path, "rb") as handle:
+            handle.seek(end)
+            tail = handle.read()
+        with open(tmp_path, "wb") as handle:
+            handle.write(tail)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+
+
+def _noop(store):
+    return None
+
+
+def fold_now(backend=None):
+    """Fold the journal into the ledger on the writer thread and wait for it."""
+    import writer
+    writer.run(_noop, backend)
+
+
+_fold_timers = {}
+_fold_timers_lock = threading.Lock()
+
+
+def _fold_later(backend):
+    import writer
+    writer.submit(_noop, backend)
+
+
+def schedule_fold(backend=None, delay=FOLD_DELAY):
+    """Fold the journal in the background after `delay` seconds (once per burst of writes)."""
+    with _fold_timers_lock:
+        timer = _fold_timers.get(backend)
+        if timer is not None and timer.is_alive():
+            return
+        timer = _fold_timers[backend] = threading.Timer(delay, _fold_later, args=(backend,))
+        timer.daemon = True
+        timer.start()
+
+
+# -------------------------------
+# Readers
+# -------------------------------
+def merged_rows(store, backend=None, months=None):
+    """
+    store.rows() with the journal tail applied in memory: the rows the ledger will
+    hold once folded, including the row ids pending bets will get.
+    With months, only the bets of those partitions (see storage.partition_of).
+    """
+    events, _ = pending_events(store, backend)
+    if months is None:
+        rows = store.rows()
+        if not events:
+            return rows
+        with span("journal merge", events=len(events)):
+            return _merge(store, rows, events)
+
+    months = set(months)
+    if not events:
+        return store.rows_in(months)
+    with span("journal merge", events=len(events)):
+        if store.renumbers_on_delete:
+            # Excel row ids shift under a pending delete: merge the whole sheet
+            rows, start = store.rows(), None
+        else:
+            # Every bet from the first one an event touches, so Cumulative PnL carries through
+            # the months not loaded; the bets before it are as stored
+            first = _first_touched(store, events)
+            loaded = dict(store.rows_in(months))
+            loaded.update(store.rows_after(first - 1))
+            rows, start = sorted(loaded.items()), store.cumulative_before(first)
+        rows = _merge(store, rows, events, start)
+    return [(rid, record) for rid, record in rows if partition_of(record.get("Date")) in months]
+
+
+def _first_touched(store, events):
+    """Lowest row id any of the events changes (appends get the next one)."""
+    ids = []
+    for event in events:
+        op = event.get("op")
+        if op == "append":
+            ids.append(store.next_row_id())
+        elif op == "update":
+            ids.append(int(event["row"]))
+        elif op == "delete":
+            ids.extend(int(rid) for rid in event["rows"])
+        elif op == "settle":
+            ids.extend(int(rid) for rid in event["results"])
+    return min(ids, default=store.next_row_id())
+
+
+def _merge(store, rows, events, start=None):
+    """Apply events to rows; start is the Cumulative PnL before the first changed row if rows skip some."""
+    next_id = store.next_row_id()
+    first_dirty = None
+    for event in events:
+        op = event.get("op")
+        if op == "append":
+            rows.append((next_id, dict(event["record"])))
+            next_id += 1
+            pos = len(rows) - 1
+        elif op == "update":
+            row_id = int(event["row"])
+            pos = next((idx for idx, (rid, _) in enumerate(rows) if rid == row_id), None)
+            if pos is None:
+                continue
+            rows[pos] = (row_id, {**rows[pos][1], **event["record"]})
+        elif op == "delete":
+            drop = {int(rid) for rid in event["rows"]}
+            pos = next((idx for idx, (rid, _) in enumerate(rows) if rid in drop), None)
+            if pos is None:
+                continue
+            rows = [(rid, record) for rid, record in rows if rid not in drop]
+            if store.renumbers_on_delete and not event.get("soft"):
+                # Excel rows below a hard delete shift up
+                gone = sorted(rid for rid in drop if 2 <= rid < next_id)
+                rows = [(rid - bisect_left(gone, rid), record) for rid, record in rows]
+                next_id -= len(gone)
+        elif op == "settle":
+            pos = _merge_settle(rows, {int(rid): result for rid, result in event["results"].items()})
+            if pos is None:
+                continue
+        else:
+            continue
+        first_dirty = pos if first_dirty is None else min(first_dirty, pos)
+
+    # Cumulative PnL from the first changed row onward, continuing the stored value before it
+    if first_dirty is not None and first_dirty < len(rows):
+        if start is None:
+            start = 0.0
+            for _, record in reversed(rows[:first_dirty]):
+                if record.get("Cumulative PnL ($)") not in (None, ""):
+                    start = float(record["Cumulative PnL ($)"])
+                    break
+        tail = rows[first_dirty:]
+        net = [record.get("Net PnL ($)") for _, record in tail]
+        for (_, record), cum in zip(tail, cumulative_pnl(net, start)):
+            record["Cumulative PnL ($)"] = to_optional(cum)
+    return rows
+
+
+def _merge_settle(rows, results):
+    """store.settle() on in-memory rows; returns the first position changed."""
+    hits = [idx for idx, (rid, _) in enumerate(rows) if rid in results]
+    if not hits:
+        return None
+    records = [rows[idx][1] for idx in hits]
+    settled = [results[rows[idx][0]] for idx in hits]
+    priced = price_columns(
+        [record.get("Odds") for record in records],
+        [record.get("Stake ($)") for record in records],
+        settled,
+        [record.get("Bonus") for record in records],
+        [record.get("Profit Boost (%)") for record in records],
+    )
+    for n, idx in enumerate(hits):
+        rows[idx] = (rows[idx][0], {
+            **records[n],
+            "Result": settled[n],
+            "Decimal Odds": to_optional(priced["decimal_odds"][n]),
+            "Payout ($)": to_optional(priced["payout"][n]),
+            "Net PnL ($)": to_optional(priced["net_pnl"][n]),
+        })
+    return hits[0]
+
+
+def has_pending(backend=None):
+    try:
+        return os.path.getsize(journal_path(backend)) > 0
+    except FileNotFoundError:
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold the Bet Tracker write-ahead journal into the ledger.")
+    parser.parse_args()
+
+    events, _ = read_events()
+    fold_now()
+    print(f"✅ Folded {len(events)} journaled event(s) into {ledger_path()}")
@@ -0,0 +1,558 @@
+from datetime import datetime, date as _date
+
+import numpy as np
+import pandas as pd
+
+from betlog import NO_DATE, BetLog, date_ordinal
+from profiling import span
+from storage import SUM_FIELDS, UNSETTLED_RESULTS
+
+
+# -------------------------------
+# Group-by dimensions
+# -------------------------------
+DATE_FORMATS = ("%m/%d/%y", "%m/%d/%Y", "%Y-%m-%d")
+_month_cache = {}
+
+
+def month_of(value):
+    """'YYYY-MM' for a Bet Log date (datetime or MM/DD/YY string), '' if unparseable."""
+    if isinstance(value, (datetime, _date)):
+        return value.strftime("%Y-%m")
+    if value in (None, ""):
+        return ""
+    key = str(value).strip()
+    month = _month_cache.get(key)
+    if month is None:
+        month = ""
+        for fmt in DATE_FORMATS:
+            try:
+                month = datetime.strptime(key, fmt).strftime("%Y-%m")
+                break
+            except ValueError:
+                continue
+        _month_cache[key] = month
+    return month
+
+
+DIMENSIONS = {
+    "sportsbook": lambda record: record.get("Sportsbook") or "",
+    "league": lambda record: record.get("League") or "",
+    "market": lambda record: record.get("Market") or "",
+    "month": lambda record: month_of(record.get("Date")),
+}
+
+
+def _to_number(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# -------------------------------
+# KPI rules
+# -------------------------------
+# How a bet counts towards the KPIs, defined once: KpiTotals applies it to records,
+# aggregate_log() to BetLog columns and sums_sql() turns it into the SQL behind the
+# SQLite partition manifest and rollups. The sums are storage.SUM_FIELDS.
+# Result -> outcome code; any other result counts as settled, under OTHER_OUTCOME
+OUTCOMES = {"": 0, "Open": 1, "Win": 2, "Loss": 3, "Push": 4}
+OTHER_OUTCOME = 5
+# Count sums -> the results each one counts; every bet counts in "bets"
+COUNTED_RESULTS = {
+    "wins": ("Win",),
+    "losses": ("Loss",),
+    "pushes": ("Push",),
+    "open_bets": ("Open",),
+    "pending_bets": UNSETTLED_RESULTS,
+}
+MONEY_FIELDS = ("total_stake", "total_pnl")
+
+
+def result_of(value):
+    """A Result cell as the rules read it: stripped text, "" if blank."""
+    return value.strip() if isinstance(value, str) else ("" if value is None else str(value))
+
+
+def is_settled(result):
+    """Settled bets have an outcome; blank and Open ones are still pending."""
+    return result not in UNSETTLED_RESULTS
+
+
+def stake_counts(result, bonus):
+    """A stake counts towards Total Stake / ROI once settled, unless a bonus bet (those risk nothing)."""
+    return is_settled(result) and not bonus
+
+
+# The same rules per outcome code, for whole-column scans: the counted sums of each result
+# and the counts matrix (code x COUNTED_RESULTS) and settled flag they give
+_CODE_RESULTS = sorted(OUTCOMES, key=OUTCOMES.get) + [None]
+_RESULT_COUNTS = {result: tuple(f for f, results in COUNTED_RESULTS.items() if result in results) for result in OUTCOMES}
+COUNT_WEIGHTS = np.array(
+    [[result in results for results in COUNTED_RESULTS.values()] for result in _CODE_RESULTS], dtype=np.int64
+)
+SETTLED_OUTCOMES = np.array([is_settled(result) for result in _CODE_RESULTS])
+
+
+def outcome_codes(log):
+    """Outcome code per bet of a BetLog (OUTCOMES; OTHER_OUTCOME for any other result)."""
+    lookup = np.array([OUTCOMES.get(value, OTHER_OUTCOME) for value in log.categories["Result"]] or [0])
+    return lookup[log.codes["Result"]] if len(log) else np.zeros(0, dtype=np.int64)
+
+
+def counted_stakes(log, outcome):
+    """Stake per bet as stake_counts() counts it (0.0 where it does not), from whole columns."""
+    counted = SETTLED_OUTCOMES[outcome] & ~log.bonus
+    return np.where(counted, np.nan_to_num(log.floats["Stake ($)"], nan=0.0), 0.0)
+
+
+def _sql_in(expr, results):
+    literals = ", ".join("'" + result.replace("'", "''") + "'" for result in results)
+    return f"({expr} IN ({literals}))"
+
+
+def sum_terms_sql(result, bonus, stake, net):
+    """
+    One bet's share of each SUM_FIELDS sum as SQL expressions, given SQL for its Result
+    (trimmed, '' if NULL), Bonus, Stake and Net PnL.
+    """
+    terms = {
+        "bets": "1",
+        **{field: _sql_in(result, results) for field, results in COUNTED_RESULTS.items()},
+        "total_stake": f"(CASE WHEN NOT {_sql_in(result, UNSETTLED_RESULTS)} AND NOT COALESCE({bonus}, 0) "
+                       f"THEN COALESCE(CAST({stake} AS REAL), 0.0) ELSE 0.0 END)",
+        "total_pnl": f"COALESCE(CAST({net} AS REAL), 0.0)",
+    }
+    return [terms[field] for field in SUM_FIELDS]
+
+
+def sums_sql(result, bonus, stake, net):
+    """SUM_FIELDS summed over a group of rows: SELECT expressions over sum_terms_sql()."""
+    return ", ".join(
+        f"{'TOTAL' if field in MONEY_FIELDS else 'SUM'}({term})"
+        for field, term in zip(SUM_FIELDS, sum_terms_sql(result, bonus, stake, net))
+    )
+
+
+# -------------------------------
+# Accumulator
+# -------------------------------
+class KpiTotals:
+    """Running KPI sums (SUM_FIELDS) for one group; add() is O(1) so any number of groups fit in one pass."""
+
+    __slots__ = SUM_FIELDS
+
+    def __init__(self):
+        for field in SUM_FIELDS:
+            setattr(self, field, 0.0 if field in MONEY_FIELDS else 0)
+
+    def add(self, result, stake, net, bonus):
+        self.bets += 1
+        self.total_pnl += net
+        for field in _RESULT_COUNTS.get(result, ()):
+            setattr(self, field, getattr(self, field) + 1)
+        if stake_counts(result, bonus):
+            self.total_stake += stake
+
+    def add_record(self, record):
+        """add() one Bet Log record (dict keyed by HEADERS)."""
+        self.add(result_of(record.get("Result")), _to_number(record.get("Stake ($)")),
+                 _to_number(record.get("Net PnL ($)")), bool(record.get("Bonus")))
+
+    @classmethod
+    def from_dict(cls, kpis):
+        """Inverse of as_dict() (or sums()), to keep adding to a saved summary."""
+        totals = cls()
+        for field in SUM_FIELDS:
+            setattr(totals, field, kpis[field])
+        return totals
+
+    def sums(self):
+        """The SUM_FIELDS dict kept by the partition manifest and rollups."""
+        return {field: getattr(self, field) for field in SUM_FIELDS}
+
+    def as_dict(self):
+        settled = self.bets - self.pending_bets
+        return {
+            **self.sums(),
+            "total_bets": settled,
+            "win_pct": (self.wins / settled) if settled > 0 else 0.0,
+            "roi_pct": (self.total_pnl / self.total_stake) if self.total_stake > 0 else 0.0,
+        }
+
+
+def combine_kpis(parts):
+    """One KpiTotals.as_dict() summing several: partition manifest entries and / or summary totals."""
+    totals = KpiTotals()
+    for part in parts:
+        other = KpiTotals.from_dict(part)
+        for field in SUM_FIELDS:
+            setattr(totals, field, getattr(totals, field) + getattr(other, field))
+    return totals.as_dict()
+
+
+def sums_kpis(sums):
+    """{key: KpiTotals.as_dict()} from stored sums keyed by group (store.rollups(), partitions)."""
+    return {key: KpiTotals.from_dict(part).as_dict() for key, part in sums.items()}
+
+
+# -------------------------------
+# Streaming aggregation
+# -------------------------------
+def aggregate(records, group_by=tuple(DIMENSIONS), summary=None):
+    """
+    Consume Bet Log records (dicts keyed by HEADERS) in a single pass.
+    Returns {"totals": kpis, "groups": {dimension: {key: kpis}}}; kpis are
+    KpiTotals.as_dict() results and groups keep first-seen order.
+    Pass an earlier result as `summary` to add records to it instead of starting from zero.
+    """
+    totals = KpiTotals()
+    keyers = [(dim, DIMENSIONS[dim]) for dim in group_by]
+    groups = {dim: {} for dim in group_by}
+    if summary is not None:
+        totals = KpiTotals.from_dict(summary["totals"])
+        for dim in group_by:
+            groups[dim] = {key: KpiTotals.from_dict(kpis) for key, kpis in summary["groups"].get(dim, {}).items()}
+
+    for record in records:
+        result = result_of(record.get("Result"))
+        stake = _to_number(record.get("Stake ($)"))
+        net = _to_number(record.get("Net PnL ($)"))
+        bonus = bool(record.get("Bonus"))
+
+        totals.add(result, stake, net, bonus)
+        for dim, keyer in keyers:
+            key = keyer(record)
+            bucket = groups[dim].get(key)
+            if bucket is None:
+                bucket = groups[dim][key] = KpiTotals()
+            bucket.add(result, stake, net, bonus)
+
+    return {
+        "totals": totals.as_dict(),
+        "groups": {
+            dim: {key: bucket.as_dict() for key, bucket in buckets.items()}
+            for dim, buckets in groups.items()
+        },
+    }
+
+
+def breakdown_rows(groups, dimension):
+    """Flatten one dimension of aggregate()["groups"] into table rows, sorted by key."""
+    return [
+        {
+            dimension.title(): key or "(blank)",
+            "Bets": kpis["bets"],
+            "Settled": kpis["total_bets"],
+            "Wins": kpis["wins"],
+            "Open": kpis["open_bets"],
+            "Stake ($)": kpis["total_stake"],
+            "Net PnL ($)": kpis["total_pnl"],
+            "Win %": kpis["win_pct"],
+            "ROI (%)": kpis["roi_pct"],
+        }
+        for key, kpis in sorted(groups[dimension].items(), key=lambda item: str(item[0]))
+    ]
+
+
+# -------------------------------
+# Columnar aggregation (BetLog)
+# -------------------------------
+def _month_codes(log):
+    """(codes, keys) grouping a BetLog by month_of(Date), computed once per distinct date."""
+    ordinals, inverse = np.unique(log.dates, return_inverse=True)
+    months = [
+        _date.fromordinal(int(ordinal)).strftime("%Y-%m") if ordinal != NO_DATE else ""
+        for ordinal in ordinals
+    ]
+    keys, month_idx = np.unique(np.asarray(months, dtype=object), return_inverse=True)
+    return month_idx[inverse], keys
+
+
+def _group_sums(codes, size, outcome, stake, net):
+    """Per-group KpiTotals for integer group codes, from whole columns."""
+    counts = np.bincount(outcome * size + codes, minlength=size * (OTHER_OUTCOME + 1))
+    counts = counts.reshape(OTHER_OUTCOME + 1, size)
+    counted = COUNT_WEIGHTS.T @ counts  # COUNTED_RESULTS x group
+    stakes = np.bincount(codes, weights=stake, minlength=size)
+    pnl = np.bincount(codes, weights=net, minlength=size)
+    buckets = []
+    for idx in range(size):
+        bucket = KpiTotals()
+        bucket.bets = int(counts[:, idx].sum())
+        for field, values in zip(COUNTED_RESULTS, counted):
+            setattr(bucket, field, int(values[idx]))
+        bucket.total_stake = float(stakes[idx])
+        bucket.total_pnl = float(pnl[idx])
+        buckets.append(bucket)
+    return buckets
+
+
+def aggregate_log(log, group_by=tuple(DIMENSIONS)):
+    """
+    aggregate() over a BetLog with whole-column numpy scans (bincount per group)
+    instead of a loop over records. Same result shape and values.
+    """
+    outcome = outcome_codes(log)
+    net = np.nan_to_num(log.floats["Net PnL ($)"], nan=0.0)
+    stake = counted_stakes(log, outcome)
+
+    (totals,) = _group_sums(np.zeros(len(log), dtype=np.int64), 1, outcome, stake, net)
+    groups = {}
+    for dim in group_by:
+        if dim == "month":
+            codes, keys = _month_codes(log)
+        else:
+            header = dim.title()
+            codes, keys = log.codes[header], log.categories[header]
+        buckets = _group_sums(codes, len(keys), outcome, stake, net)
+        # First-seen order, like aggregate()
+        present, first = np.unique(codes, return_index=True)
+        groups[dim] = {
+            keys[code]: buckets[code].as_dict() for code in present[np.argsort(first, kind="stable")]
+        }
+    return {"totals": totals.as_dict(), "groups": groups}
+
+
+# -------------------------------
+# Cumulative PnL series
+# -------------------------------
+# The PnL charts plot one point per day with a bet (the day's closing cumulative Net
+# PnL), downsampled to at most SERIES_POINTS so a chart stays light on any ledger.
+SERIES_POINTS = 500
+
+
+def daily_pnl(log, days=None):
+    """
+    {date ordinal: Net PnL} of a BetLog's dated bets, added to `days` (e.g. the last
+    build's) if given. One bincount over the days spanned; undated bets are left out.
+    """
+    days = dict(days or {})
+    dated = log.dates != NO_DATE
+    if not dated.any():
+        return days
+    offsets = log.dates[dated].astype(np.int64)
+    first = int(offsets.min())
+    offsets -= first
+    net = np.nan_to_num(log.floats["Net PnL ($)"][dated], nan=0.0)
+    sums = np.bincount(offsets, weights=net)
+    for offset in np.flatnonzero(np.bincount(offsets)).tolist():
+        days[first + offset] = days.get(first + offset, 0.0) + float(sums[offset])
+    return days
+
+
+def add_day(days, record):
+    """Count one record's Net PnL into daily_pnl()-style {date ordinal: Net PnL}."""
+    ordinal = date_ordinal(record.get("Date"))
+    if ordinal != NO_DATE:
+        days[ordinal] = days.get(ordinal, 0.0) + _to_number(record.get("Net PnL ($)"))
+
+
+def rollup_days(sums):
+    """{date ordinal: Net PnL} from the "day" rollups (store.rollups("day"))."""
+    days = {}
+    for day, part in sums.items():
+        ordinal = date_ordinal(day)
+        if ordinal != NO_DATE:
+            days[ordinal] = days.get(ordinal, 0.0) + part["total_pnl"]
+    return days
+
+
+def lttb(x, y, points):
+    """
+    Positions kept by largest-triangle-three-buckets: the first and last point, and from
+    each of points - 2 equal buckets in between the one forming the largest triangle with
+    the point kept before it and the mean of the next bucket. Keeps peaks and drawdowns
+    that every-nth sampling would cut off. O(n); all positions if n <= points.
+    """
+    n = len(x)
+    points = max(int(points), 3)
+    if n <= points:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = 1 + (np.arange(points - 1) * (n - 2)) // (points - 2)
+    keep = np.empty(points, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    prev = 0
+    for bucket in range(points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[hi:edges[bucket + 2]].mean(), y[hi:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[prev] - next_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (next_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        keep[bucket + 1] = prev
+    return keep
+
+
+def pnl_series(days, points=SERIES_POINTS):
+    """[(date, cumulative Net PnL)] for daily_pnl()-style sums, downsampled to `points` with lttb()."""
+    ordinals = np.array(sorted(days), dtype=np.int64)
+    cumulative = np.cumsum([days[ordinal] for ordinal in ordinals.tolist()])
+    keep = lttb(ordinals, cumulative, points)
+    return [(_date.fromordinal(int(ordinals[pos])), float(cumulative[pos])) for pos in keep]
+
+
+# -------------------------------
+# App view of the ledger
+# -------------------------------
+# Columns the Bet Log table can be filtered on (besides a date range), and its page sizes
+FILTER_COLUMNS = ("Sportsbook", "League", "Market", "Result")
+PAGE_SIZES = (50, 100, 250, 500)
+
+
+def month_bounds(month):
+    """First and last day of a "YYYY-MM" partition."""
+    first = datetime.strptime(month, "%Y-%m").date()
+    following = _date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first, _date.fromordinal(following.toordinal() - 1)
+
+
+def months_in_range(partitions, start=None, end=None):
+    """Dated partitions (manifest months) overlapping start..end; either bound may be None."""
+    months = []
+    for part in partitions:
+        if not part["month"]:
+            continue
+        first, last = month_bounds(part["month"])
+        if (start is None or last >= start) and (end is None or first <= end):
+            months.append(part["month"])
+    return months
+
+
+def ledger_view(rows):
+    """
+    What the app renders from (row_id, record) pairs: the ledger as a BetLog and
+    every KPI / group-by, computed once per ledger version.
+    """
+    # For the Excel backend RowID is the actual Excel row number, for SQLite the bet id
+    with span("columns") as timing:
+        log = BetLog.from_rows(rows)
+        timing.add(rows=len(log), bytes=log.nbytes)
+
+    with span("kpis"):
+        kpis = aggregate_log(log)
+
+    return {"log": log, "days": log.days(), "kpis": kpis}
+
+
+def query_ledger(view, start=None, end=None, filters=None, sort_by="RowID", descending=False,
+                 page=1, page_size=100):
+    """
+    One page of the Bet Log table: filtered (date range plus {column: [values]})
+    and sorted on the BetLog's columns, so only that page is decoded into a
+    DataFrame. Returns {"frame", "row_ids", "total", "pages", "page"}.
+    """
+    log = view["log"]
+    mask = np.ones(len(log), dtype=bool)
+    days = view["days"]
+    if start is not None:
+        mask &= days >= np.datetime64(start, "D")
+    if end is not None:
+        mask &= days <= np.datetime64(end, "D")
+    for column, values in (filters or {}).items():
+        if values:
+            mask &= log.isin(column, values)
+    positions = np.flatnonzero(mask)
+
+    if sort_by == "Date":
+        keys = np.where(log.dates[positions] == NO_DATE, np.nan, log.dates[positions])
+    elif sort_by in log.floats:
+        keys = log.floats[sort_by][positions]
+    elif sort_by in log.codes:
+        keys = log.column(sort_by)[positions]
+    elif sort_by == "Bonus":
+        keys = log.bonus[positions]
+    else:
+        keys = None
+    if keys is None:
+        if descending:
+            positions = positions[::-1]
+    else:
+        # Blanks sort last either way
+        try:
+            order = pd.Series(keys).sort_values(ascending=not descending, kind="stable", na_position="last")
+        except TypeError:  # mixed numbers and text
+            order = pd.Series(keys).astype(str).sort_values(ascending=not descending, kind="stable")
+        positions = positions[order.index.to_numpy()]
+
+    total = len(positions)
+    pages = max((total + page_size - 1) // page_size, 1)
+    page = min(max(int(page), 1), pages)
+    visible = log[positions[(page - 1) * page_size:page * page_size]]
+    return {
+        "frame": visible.to_frame(),
+        "row_ids": [int(rid) for rid in visible.row_ids],
+        "total": total,
+        "pages": pages,
+        "page": page,
+    }
+
+
+# -------------------------------
+# Dashboard sheet layout
+# -------------------------------
+# KPIs start at A1 with a side table from D1 (at most 11 rows), breakdown tables start
+# below the charts (anchored at row 12)
+SIDE_COLUMN = 3
+BREAKDOWN_FIRST_ROW = 34
+
+
+# Helper sheet the line chart plots: pnl_series() under a header row
+SERIES_SHEET = "PnL Series"
+SERIES_HEADERS = ["Date", "Cumulative PnL ($)"]
+
+
+def breakdown_range(rows, dimension, column="Net PnL ($)"):
+    """
+    Where one breakdown table of dashboard_rows() holds its data, for chart ranges:
+    (first row, last row, key column, `column`'s column), 1-based; None if it is empty.
+    """
+    title = [f"By {dimension.title()}"]
+    for idx, row in enumerate(rows[:-1]):
+        if row == title and column in rows[idx + 1]:
+            count = 0
+            while idx + 2 + count < len(rows) and rows[idx + 2 + count]:
+                count += 1
+            if count:
+                return idx + 3, idx + 2 + count, 1, rows[idx + 1].index(column) + 1
+    return None
+
+
+def dashboard_rows(summary, side=None, tables=None):
+    """
+    Rows (lists of values) of the Dashboard sheet, top to bottom, for any xlsx writer.
+    side: [label, value] rows placed next to the KPIs (from column D, above the charts);
+    tables: {title: table rows (dicts)} added below the breakdowns.
+    """
+    kpis = summary["totals"]
+    rows = [
+        ["KPI", "Value"],
+        ["Total PnL ($)", kpis["total_pnl"]],
+        ["Total Stake ($)", kpis["total_stake"]],
+        ["Wins", kpis["wins"]],
+        ["Total Bets", kpis["total_bets"]],
+        ["Pending Bets", kpis["pending_bets"]],
+        ["Win %", kpis["win_pct"]],
+        ["ROI (%)", kpis["roi_pct"]],
+    ]
+
+    rows.extend([] for _ in range(len(side or ()) - len(rows)))
+    for row, values in zip(rows, side or ()):
+        row.extend([None] * (SIDE_COLUMN - len(row)) + list(values))
+
+    # Breakdown tables below the charts
+    rows.extend([] for _ in range(BREAKDOWN_FIRST_ROW - 1 - len(rows)))
+    titled = [(f"By {dimension.title()}", breakdown_rows(summary["groups"], dimension))
+              for dimension in summary["groups"]]
+    for title, table in titled + list((tables or {}).items()):
+        rows.append([title])
+        if table:
+            columns = list(table[0])
+            rows.append(columns)
+            rows.extend([entry[name] for name in columns] for entry in table)
+        rows.extend(([], []))
+    return rows
@@ -1,220 +1,319 @@
-import openpyxl
-from openpyxl.styles import PatternFill
-from openpyxl.formatting.rule import CellIsRule
 from datetime import datetime
+import argparse
+import csv
 import os
-
-FILE_PATH = "Bet_Tracker.xlsx"
-
-HEADERS = [
-    "Date",
-    "Sportsbook",
-    "League",
-    "Market",
-    "Pick",
-    "Stake ($)",
-    "Odds",
-    "Result",
-    "Bonus",
-    "Decimal Odds",
-    "Payout ($)",
-    "Net PnL ($)",
-    "Cumulative PnL ($)",
-    "Profit Boost (%)"
-]
-
-# -------------------------------
-# Utility: Convert American odds to Decimal
-# -------------------------------
-def american_to_decimal(odds):
-    if odds == 0 or odds is None:
-        return 0
-    return 1 + (odds / 100 if odds > 0 else 100 / abs(odds))
+import sys
+
+from pricing import price_bet, price_columns, to_optional
+from storage import ledger_path
+# Re-exported: these were defined here before moving to pricing / storage, and scripts
+# still import them from log_new_bets
+from pricing import american_to_decimal  # noqa: F401
+from storage import FILE_PATH, HEADERS, ensure_bet_log_headers  # noqa: F401
+from dedupe import DuplicateFilter, is_logged
+import journal
+import profiling
+import writer
 
 # -------------------------------
-# Header maintenance
+# Validation
 # -------------------------------
-def ensure_bet_log_headers(ws):
-    header_values = [cell.value for cell in ws[1]] if ws.max_row >= 1 else []
-
-    if not any(header_values):
-        ws.append(HEADERS)
-        return
-
-    rename_map = {"Bet Type": "Market", "Selection": "Pick"}
-    for idx, value in enumerate(header_values, start=1):
-        if value in rename_map:
-            ws.cell(row=1, column=idx, value=rename_map[value])
-
-    header_values = [cell.value for cell in ws[1]]
-
-    if "League" not in header_values:
+BET_FIELDS = ["date", "sportsbook", "league", "market", "pick", "odds", "stake", "result", "bonus", "profit_boost"]
+VALID_RESULTS = ("", "Open", "Win", "Loss", "Push")
+
+
+def validate_bet(bet):
+    """Return a normalized copy of a bet dict, raising ValueError on bad input."""
+    unknown = set(bet) - set(BET_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(sorted(unknown))}")
+
+    clean = {
+        "date": bet.get("date") or datetime.today().strftime("%m/%d/%y"),
+        "sportsbook": (bet.get("sportsbook") or "").strip(),
+        "league": (bet.get("league") or "").strip(),
+        "market": (bet.get("market") or "").strip(),
+        "pick": (bet.get("pick") or "").strip(),
+        "result": (bet.get("result") or "").strip().title(),
+        "bonus": bool(bet.get("bonus", False)),
+    }
+    for field in ("sportsbook", "pick"):
+        if not clean[field]:
+            raise ValueError(f"{field} is required")
+    if clean["result"] not in VALID_RESULTS:
+        raise ValueError(f"result must be one of Win/Loss/Push/Open/blank, got {clean['result']!r}")
+
+    if bet.get("odds") in (None, ""):
+        raise ValueError("odds is required")
+    for field, default in (("odds", None), ("stake", 0), ("profit_boost", 0)):
+        raw = bet.get(field, default)
+        if raw in (None, ""):
+            raw = default
         try:
-            sportsbook_idx = header_values.index("Sportsbook") + 1
-        except ValueError:
-            sportsbook_idx = 2
-        ws.insert_cols(sportsbook_idx + 1)
-        ws.cell(row=1, column=sportsbook_idx + 1, value="League")
+            value = float(raw)
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be numeric, got {raw!r}") from None
+        clean[field] = int(value) if value.is_integer() and isinstance(raw, (int, str)) else value
 
-    for idx, header in enumerate(HEADERS, start=1):
-        ws.cell(row=1, column=idx, value=header)
+    if clean["stake"] < 0:
+        raise ValueError("stake cannot be negative")
+    if clean["profit_boost"] < 0:
+        raise ValueError("profit_boost cannot be negative")
+    return clean
 
 
-def log_bet(date, sportsbook, league, market, pick, odds, stake=0, result="", bonus=False, profit_boost=0):
+# -------------------------------
+# Logging
+# -------------------------------
+def log_bets(bets, allow_duplicates=False):
     """
-    Append a single bet to Bet Tracker.
-    Payout, Net PnL, and Cumulative PnL are calculated in Python and stored as numeric values.
+    Append many bets to the ledger with a single load and save.
+    Every bet is validated and priced before anything is written, so a bad row
+    leaves the ledger untouched. Bets already in the ledger are skipped unless
+    allow_duplicates. Returns the row ids written.
     """
-    # Load workbook or create if not exist
-    try:
-        wb = openpyxl.load_workbook(FILE_PATH)
-        ws = wb["Bet Log"]
-    except FileNotFoundError:
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Bet Log"
-        ws.append(HEADERS)
-    else:
-        ensure_bet_log_headers(ws)
-
-    next_row = ws.max_row + 1
-
-    # Actual stake for bonus bets
-    actual_stake = 0 if bonus else stake
-    dec_odds_original = american_to_decimal(odds)
-
-    base_profit = (dec_odds_original - 1) * stake
-    if profit_boost and profit_boost > 0:
-        boosted_profit = base_profit * (1 + profit_boost / 100)
-        dec_odds_effective = (
-            1 + ((dec_odds_original - 1) * (1 + profit_boost / 100))
-            if stake not in (0, None)
-            else dec_odds_original
+    with profiling.operation("log_bets") as timing:
+        cleaned = []
+        with profiling.span("validate"):
+            for idx, bet in enumerate(bets, start=1):
+                try:
+                    cleaned.append(validate_bet(bet))
+                except ValueError as exc:
+                    raise ValueError(f"bet #{idx}: {exc}") from None
+        timing.add(rows=len(cleaned))
+        if not cleaned:
+            return []
+        # Load, price and save happen on the writer thread (its own "write batch" operation)
+        with profiling.span("write"):
+            return writer.run(lambda store: _append_priced(store, cleaned, allow_duplicates))
+
+
+def _append_priced(store, cleaned, allow_duplicates=False):
+    # This runs on the ledger writer under its lock, so the cumulative PnL is never stale
+    if not allow_duplicates:
+        with profiling.span("dedupe", rows=len(cleaned)):
+            flags = DuplicateFilter(store).flags([make_record(bet, None, None, None, None) for bet in cleaned])
+            cleaned = [bet for bet, duplicate in zip(cleaned, flags) if not duplicate]
+        if not cleaned:
+            return []
+    with profiling.span("price", rows=len(cleaned)):
+        records = priced_records(cleaned, start_cumulative=store.last_cumulative())
+    return store.append(records)
+
+
+def priced_records(cleaned, start_cumulative=0.0):
+    """
+    Bet Log records for validated bets, all priced in one vectorized call with
+    Cumulative PnL continuing from start_cumulative.
+    """
+    priced = price_columns(
+        [bet["odds"] for bet in cleaned],
+        [bet["stake"] for bet in cleaned],
+        [bet["result"] for bet in cleaned],
+        [bet["bonus"] for bet in cleaned],
+        [bet["profit_boost"] for bet in cleaned],
+        start_cumulative=start_cumulative,
+    )
+    return [
+        make_record(
+            bet,
+            to_optional(priced["decimal_odds"][idx]),
+            to_optional(priced["payout"][idx]),
+            to_optional(priced["net_pnl"][idx]),
+            to_optional(priced["cumulative_pnl"][idx]),
         )
-    else:
-        boosted_profit = base_profit
-        dec_odds_effective = dec_odds_original
-
-    # -------------------------------
-    # Compute values directly in Python
-    # -------------------------------
-    payout = None
-    net_pnl = None
-    cumulative_pnl = None
-
-    result_clean = (result or "").strip()
-    boost_active = bool(profit_boost and profit_boost > 0)
-
-    if result_clean == "Win":
-        if bonus:
-            payout = boosted_profit if boost_active else stake * (dec_odds_original - 1)
-        else:
-            payout = (
-                actual_stake + boosted_profit
-                if boost_active
-                else actual_stake * dec_odds_original
+        for idx, bet in enumerate(cleaned)
+    ]
+
+
+def make_record(bet, dec_odds_effective, payout, net_pnl, cumulative_pnl):
+    """Map a validated bet plus its priced values onto the Bet Log columns."""
+    return {
+        "Date": bet["date"],
+        "Sportsbook": bet["sportsbook"],
+        "League": bet["league"],
+        "Market": bet["market"],
+        "Pick": bet["pick"],
+        "Stake ($)": bet["stake"],
+        "Odds": bet["odds"],
+        "Result": bet["result"],
+        "Bonus": bet["bonus"],
+        "Decimal Odds": dec_odds_effective,
+        "Payout ($)": payout,
+        "Net PnL ($)": net_pnl,
+        "Cumulative PnL ($)": cumulative_pnl,
+        "Profit Boost (%)": bet["profit_boost"],
+    }
+
+
+def log_bet(date, sportsbook, league, market, pick, odds, stake=0, result="", bonus=False, profit_boost=0,
+            allow_duplicate=False):
+    """
+    Append a single bet to Bet Tracker.
+    Payout and Net PnL are calculated in Python and the bet is written to the
+    fsync'd journal, so this returns without touching the ledger; Cumulative PnL
+    is filled in when the journal is folded in the background.
+    A bet already in the ledger or journal (same date, book, league, market, pick,
+    odds and stake) is not logged again unless allow_duplicate. Returns whether it was logged.
+    """
+    bet = {
+        "date": date,
+        "sportsbook": sportsbook,
+        "league": league,
+        "market": market,
+        "pick": pick,
+        "odds": odds,
+        "stake": stake,
+        "result": result,
+        "bonus": bonus,
+        "profit_boost": profit_boost,
+    }
+    with profiling.operation("log_bet", rows=1):
+        if not os.path.exists(ledger_path()):
+            # First bet ever: create the ledger straight away
+            (row,) = log_bets([bet])
+            print(f"✅ Logged bet in row {row}: {league} {market} - {pick} ({sportsbook})")
+            return True
+
+        with profiling.span("validate"):
+            bet = validate_bet(bet)
+        with profiling.span("price"):
+            dec_odds, payout, net = price_bet(
+                bet["odds"], bet["stake"], bet["result"], bet["bonus"], bet["profit_boost"]
             )
-    elif result_clean == "Push":
-        payout = actual_stake
-    elif result_clean == "Loss":
-        payout = 0
-    else:  # Open or blank
-        payout = None
+        record = make_record(bet, dec_odds, payout, net, None)
+        if not allow_duplicate:
+            with profiling.span("dedupe"):
+                duplicate = is_logged(record)
+            if duplicate:
+                print(f"⚠️ Already logged, skipped: {league} {market} - {pick} ({sportsbook})")
+                return False
+        journal.append_bet(record)
+    print(f"✅ Logged bet: {league} {market} - {pick} ({sportsbook})")
+    return True
 
-    net_pnl = payout - actual_stake if payout is not None else None
 
-    if net_pnl is not None:
-        prev_raw = ws[f"M{next_row-1}"].value if next_row > 2 else 0
+# -------------------------------
+# Batch Mode (CSV / stdin)
+# -------------------------------
+CSV_ALIASES = {
+    "date": "date",
+    "sportsbook": "sportsbook",
+    "league": "league",
+    "market": "market",
+    "bet type": "market",
+    "pick": "pick",
+    "selection": "pick",
+    "odds": "odds",
+    "stake": "stake",
+    "stake ($)": "stake",
+    "result": "result",
+    "bonus": "bonus",
+    "profit boost": "profit_boost",
+    "profit boost (%)": "profit_boost",
+    "profit_boost": "profit_boost",
+}
+
+
+def _parse_bool(value):
+    return str(value or "").strip().lower() in ("y", "yes", "true", "1")
+
+
+def read_bets_csv(handle):
+    """Yield bet dicts from a CSV file whose header matches the Bet Log or log_bet() names."""
+    reader = csv.DictReader(handle)
+    for line in reader:
+        bet = {}
+        for key, value in line.items():
+            field = CSV_ALIASES.get((key or "").strip().lower())
+            if field is None:
+                continue  # derived columns (Payout, Net PnL...) are recomputed
+            bet[field] = value.strip() if isinstance(value, str) else value
+        if not any(v not in (None, "") for v in bet.values()):
+            continue
+        bet["bonus"] = _parse_bool(bet.get("bonus"))
+        yield bet
+
+
+def _prompt_number(label, cast):
+    """Ask until the answer parses with cast (int / float)."""
+    while True:
+        raw = input(label).strip()
         try:
-            prev_cum = float(prev_raw)
-        except (TypeError, ValueError):
-            prev_cum = 0.0
-        cumulative_pnl = prev_cum + net_pnl
-    else:
-        cumulative_pnl = None
-
-    # -------------------------------
-    # Append data into worksheet
-    # -------------------------------
-    ws[f"A{next_row}"] = date
-    ws[f"B{next_row}"] = sportsbook
-    ws[f"C{next_row}"] = league
-    ws[f"D{next_row}"] = market
-    ws[f"E{next_row}"] = pick
-    ws[f"F{next_row}"] = stake
-    ws[f"G{next_row}"] = odds
-    ws[f"H{next_row}"] = result_clean
-    ws[f"I{next_row}"] = bonus
-    ws[f"J{next_row}"] = dec_odds_effective
-    ws[f"K{next_row}"] = payout
-    ws[f"L{next_row}"] = net_pnl
-    ws[f"M{next_row}"] = cumulative_pnl
-    header_values = [cell.value for cell in ws[1]]
-    try:
-        boost_col = header_values.index("Profit Boost (%)") + 1
-        ws.cell(row=next_row, column=boost_col, value=profit_boost)
-    except ValueError:
-        pass
-
-    # Conditional formatting for Net PnL
-    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
-    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
-    ws.conditional_formatting.add(f"L2:L{ws.max_row}",
-                                  CellIsRule(operator='greaterThan', formula=['0'], fill=green_fill))
-    ws.conditional_formatting.add(f"L2:L{ws.max_row}",
-                                  CellIsRule(operator='lessThan', formula=['0'], fill=red_fill))
-
-    # -------------------------------
-    # Dashboard - update KPIs
-    # -------------------------------
-    if "Dashboard" in wb.sheetnames:
-        ws_dash = wb["Dashboard"]
-        for row in ws_dash.iter_rows(min_row=2, max_col=2, max_row=20):
-            for cell in row:
-                cell.value = None
-    else:
-        ws_dash = wb.create_sheet("Dashboard")
-        ws_dash["A1"], ws_dash["B1"] = "Metric", "Value"
-
-    ws_dash["A2"], ws_dash["B2"] = "Total PnL ($)", f"=SUM('Bet Log'!L2:L{ws.max_row})"
-    ws_dash["A3"], ws_dash["B3"] = "Total Stake ($)", f"=SUMIF('Bet Log'!I2:I{ws.max_row},FALSE,'Bet Log'!F2:F{ws.max_row})"
-    ws_dash["A4"], ws_dash["B4"] = "Wins", f'=COUNTIF(\'Bet Log\'!H2:H{ws.max_row},"Win")'
-    ws_dash["A5"], ws_dash["B5"] = "Total Bets", f'=COUNTA(\'Bet Log\'!H2:H{ws.max_row})'
-    ws_dash["A6"], ws_dash["B6"] = "Pending Bets", f'=COUNTIF(\'Bet Log\'!H2:H{ws.max_row},"")'
-    ws_dash["A7"], ws_dash["B7"] = "Win %", f"=IF(B5=0,0,B4/B5)"
-    ws_dash["A8"], ws_dash["B8"] = "ROI (%)", f"=IF(B3=0,0,B2/B3)"
+            return cast(raw)
+        except ValueError:
+            print(f"❌ Not a number: {raw!r}, try again")
 
-    wb.save(FILE_PATH)
-    wb.close()
-    
 
-    print(f"✅ Logged bet in row {next_row}: {league} {market} - {pick} ({sportsbook})")
+def prompt_bets():
+    """Collect bets from interactive prompts until the user types 'done'."""
+    print("📊 Bet Logger - Enter your bets (type 'done' at sportsbook to stop)\n")
+    bets = []
+    try:
+        while True:
+            sportsbook = input("Sportsbook (or 'done' to quit): ").strip()
+            if sportsbook.lower() == "done":
+                break
+
+            # Default date = today
+            date = input(f"Date (MM/DD/YY, default today {datetime.today().strftime('%m/%d/%y')}): ").strip()
+            if date == "":
+                date = datetime.today().strftime("%m/%d/%y")
+
+            league = input("League (e.g., NFL, NBA): ").strip()
+            market = input("Market: ").strip()
+            pick = input("Pick: ").strip()
+            odds = _prompt_number("Odds (e.g., -110, +125): ", int)
+            stake = _prompt_number("Stake ($): ", float)
+            result = input("Result (Win/Loss/Push/blank): ").strip()
+            bonus = input("Bonus bet? (y/n): ").strip().lower() == "y"
+
+            bet = {
+                "date": date, "sportsbook": sportsbook, "league": league, "market": market,
+                "pick": pick, "odds": odds, "stake": stake, "result": result, "bonus": bonus,
+            }
+            try:
+                validate_bet(bet)
+            except ValueError as exc:
+                print(f"❌ {exc} - bet discarded")
+                continue
+            bets.append(bet)
+    except (KeyboardInterrupt, EOFError):
+        print()
+    return bets
 
 
 # -------------------------------
-# Interactive Mode
+# Interactive / Batch Mode
 # -------------------------------
 if __name__ == "__main__":
-    print("📊 Bet Logger - Enter your bets (type 'done' at sportsbook to stop)\n")
+    parser = argparse.ArgumentParser(description="Log bets into the Bet Tracker.")
+    parser.add_argument("--csv", metavar="PATH",
+                        help="log every bet in a CSV file ('-' reads from stdin) with one save")
+    parser.add_argument("--allow-duplicates", action="store_true",
+                        help="log bets even if the ledger already holds an identical one")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    if args.csv:
+        if args.csv == "-":
+            bets = list(read_bets_csv(sys.stdin))
+        else:
+            with open(args.csv, newline="", encoding="utf-8-sig") as handle:
+                bets = list(read_bets_csv(handle))
+    else:
+        bets = prompt_bets()
 
-    while True:
-        sportsbook = input("Sportsbook (or 'done' to quit): ").strip()
-        if sportsbook.lower() == "done":
-            break
-
-        # Default date = today
-        date = input(f"Date (MM/DD/YY, default today {datetime.today().strftime('%m/%d/%y')}): ").strip()
-        if date == "":
-            date = datetime.today().strftime("%m/%d/%y")
-
-        league = input("League (e.g., NFL, NBA): ").strip()
-        market = input("Market: ").strip()
-        pick = input("Pick: ").strip()
-        odds = int(input("Odds (e.g., -110, +125): ").strip())
-        stake = float(input("Stake ($): ").strip())
-        result = input("Result (Win/Loss/Push/blank): ").strip()
-        bonus = input("Bonus bet? (y/n): ").strip().lower() == "y"
-
-        log_bet(date, sportsbook, league, market, pick, odds, stake, result, bonus)
-
-    print("✅ All bets logged successfully!")
+    try:
+        rows = log_bets(bets, allow_duplicates=args.allow_duplicates)
+    except ValueError as exc:
+        sys.exit(f"❌ Nothing logged, {exc}")
+
+    if rows:
+        print(f"✅ Logged {len(rows)} bet(s) in rows {rows[0]}-{rows[-1]}")
+    elif not bets:
+        print("ℹ️ No bets to log.")
+    if len(rows) < len(bets):
+        print(f"⚠️ Skipped {len(bets) - len(rows)} bet(s) already in the ledger (--allow-duplicates to log them)")
@@ -0,0 +1,149 @@
+import numpy as np
+
+
+# -------------------------------
+# Utility: Convert American odds to Decimal
+# -------------------------------
+def american_to_decimal(odds):
+    if odds == 0 or odds is None:
+        return 0
+    return 1 + (odds / 100 if odds > 0 else 100 / abs(odds))
+
+
+# -------------------------------
+# Scalar pricing (one bet)
+# -------------------------------
+def price_bet(odds, stake=0, result="", bonus=False, profit_boost=0):
+    """
+    Price a single bet.
+    Returns (effective decimal odds, payout, net PnL); payout and net are None for open bets.
+    """
+    # Actual stake for bonus bets
+    actual_stake = 0 if bonus else stake
+    dec_odds_original = american_to_decimal(odds)
+
+    base_profit = (dec_odds_original - 1) * stake
+    if profit_boost and profit_boost > 0:
+        boosted_profit = base_profit * (1 + profit_boost / 100)
+        dec_odds_effective = (
+            1 + ((dec_odds_original - 1) * (1 + profit_boost / 100))
+            if stake not in (0, None)
+            else dec_odds_original
+        )
+    else:
+        boosted_profit = base_profit
+        dec_odds_effective = dec_odds_original
+
+    result_clean = (result or "").strip()
+    boost_active = bool(profit_boost and profit_boost > 0)
+
+    if result_clean == "Win":
+        if bonus:
+            payout = boosted_profit if boost_active else stake * (dec_odds_original - 1)
+        else:
+            payout = (
+                actual_stake + boosted_profit
+                if boost_active
+                else actual_stake * dec_odds_original
+            )
+    elif result_clean == "Push":
+        payout = actual_stake
+    elif result_clean == "Loss":
+        payout = 0
+    else:  # Open or blank
+        payout = None
+
+    net_pnl = payout - actual_stake if payout is not None else None
+    return dec_odds_effective, payout, net_pnl
+
+
+# -------------------------------
+# Vectorized pricing (whole columns)
+# -------------------------------
+def as_float_column(values):
+    """Column of numbers (None / blanks / junk become NaN) as float64."""
+    if isinstance(values, np.ndarray) and values.dtype.kind == "f":
+        return values
+    out = np.empty(len(values), dtype=np.float64)
+    for idx, value in enumerate(values):
+        try:
+            out[idx] = float(value)
+        except (TypeError, ValueError):
+            out[idx] = np.nan
+    return out
+
+
+def as_result_column(values):
+    """Column of stripped result strings, None becomes ""."""
+    arr = np.asarray(values, dtype=object)
+    arr = np.where(arr == None, "", arr).astype(str)  # noqa: E711 (elementwise)
+    return np.char.strip(arr)
+
+
+def american_to_decimal_array(odds):
+    odds = as_float_column(odds)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dec = np.where(odds > 0, 1 + odds / 100, 1 + 100 / np.abs(odds))
+    dec[(odds == 0) | np.isnan(odds)] = 0
+    return dec
+
+
+def cumulative_pnl(net_pnl, start=0.0):
+    """
+    Running total of Net PnL, carried across open bets (NaN in, NaN out).
+    Summed left to right so results match a scalar `last += net` loop exactly.
+    """
+    net = as_float_column(net_pnl)
+    open_mask = np.isnan(net)
+    steps = np.concatenate(([start], np.where(open_mask, 0.0, net)))
+    cum = np.cumsum(steps)[1:]
+    cum[open_mask] = np.nan
+    return cum
+
+
+def price_columns(odds, stake, result, bonus, profit_boost, start_cumulative=0.0):
+    """
+    Price whole ledger columns in one pass.
+    Returns a dict of float64 arrays: decimal_odds, payout, net_pnl, cumulative_pnl
+    (NaN where the bet is still open). Values match price_bet() row by row.
+    """
+    stake = np.nan_to_num(as_float_column(stake), nan=0.0)
+    boost = np.nan_to_num(as_float_column(profit_boost), nan=0.0)
+    bonus = np.asarray(bonus, dtype=bool)
+    result = as_result_column(result)
+
+    dec_original = american_to_decimal_array(odds)
+    actual_stake = np.where(bonus, 0.0, stake)
+
+    boost_active = boost > 0
+    base_profit = (dec_original - 1) * stake
+    boost_factor = 1 + boost / 100
+    boosted_profit = np.where(boost_active, base_profit * boost_factor, base_profit)
+    dec_effective = np.where(
+        boost_active & (stake != 0), 1 + ((dec_original - 1) * boost_factor), dec_original
+    )
+
+    win_payout = np.where(
+        bonus,
+        np.where(boost_active, boosted_profit, stake * (dec_original - 1)),
+        np.where(boost_active, actual_stake + boosted_profit, actual_stake * dec_original),
+    )
+    payout = np.select(
+        [result == "Win", result == "Push", result == "Loss"],
+        [win_payout, actual_stake, 0.0],
+        default=np.nan,
+    )
+    net = payout - actual_stake
+
+    return {
+        "decimal_odds": dec_effective,
+        "payout": payout,
+        "net_pnl": net,
+        "cumulative_pnl": cumulative_pnl(net, start_cumulative),
+    }
+
+
+def to_optional(value):
+    """NaN -> None, numpy scalars -> float, for writing back to the ledger."""
+    value = float(value)
+    return None if np.isnan(value) else value
@@ -0,0 +1,138 @@
+from collections import deque
+import json
+import logging
+import os
+import threading
+import time
+
+# Off unless a CLI gets --profile, the app's Performance panel turns it on,
+# or BET_TRACKER_PROFILE=1 is set. While off, span() and operation() return a
+# shared do-nothing context manager.
+ENABLED = os.environ.get("BET_TRACKER_PROFILE", "") not in ("", "0")
+
+# Most recent finished operations, newest last (read by the app's Performance panel)
+RECENT = deque(maxlen=50)
+
+log = logging.getLogger("bet_tracker.perf")
+_local = threading.local()
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, **fields):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """One timed step (load, parse, compute, save...) of an operation."""
+
+    __slots__ = ("name", "fields", "started", "ms")
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.started = None
+        self.ms = None
+
+    def add(self, **fields):
+        """Attach facts only known inside the span (rows read, bytes written...)."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.ms = (time.perf_counter() - self.started) * 1000
+        op = getattr(_local, "operation", None)
+        if op is not None and op is not self:
+            op.spans.append(self)
+        return False
+
+    def as_dict(self):
+        return {"span": self.name, "ms": round(self.ms, 3), **self.fields}
+
+
+class Operation(Span):
+    """A user-visible action; collects the spans run on this thread while it is open."""
+
+    __slots__ = ("spans", "error")
+
+    def __init__(self, name, fields):
+        super().__init__(name, fields)
+        self.spans = []
+        self.error = None
+
+    def __enter__(self):
+        _local.operation = self
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _local.operation = None
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        record = self.as_dict()
+        RECENT.append(record)
+        log.info(json.dumps(record, default=str))
+        return False
+
+    def as_dict(self):
+        record = {"op": self.name, "ms": round(self.ms, 3), **self.fields}
+        if self.error:
+            record["error"] = self.error
+        record["spans"] = [span.as_dict() for span in self.spans]
+        return record
+
+
+def span(name, **fields):
+    """Time a step of the current operation (or on its own if none is open)."""
+    if not ENABLED:
+        return _NULL
+    if getattr(_local, "operation", None) is None:
+        return Operation(name, fields)
+    return Span(name, fields)
+
+
+def operation(name, **fields):
+    """Time a whole action; emits one structured log line when it finishes."""
+    if not ENABLED:
+        return _NULL
+    if getattr(_local, "operation", None) is not None:
+        # Nested actions (log_bet -> log_bets) are steps of the outer one
+        return Span(name, fields)
+    return Operation(name, fields)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def setup_cli(profile):
+    """--profile: turn spans on and print one JSON line per operation to stderr."""
+    if not profile:
+        return
+    enable()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
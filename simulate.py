@@ -0,0 +1,251 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+
+import numpy as np
+
+from betlog import BetLog
+from kpis import OUTCOMES, outcome_codes
+from pricing import american_to_decimal_array
+from storage import open_store
+import journal
+import profiling
+
+PATHS = 100_000
+HORIZON = 1000          # bets per simulated path
+BANKROLL_UNITS = 100    # starting bankroll, in flat units
+KELLY_FRACTION = 0.25
+STRATEGIES = ("flat", "kelly")
+# "calibrated": the odds' implied probability scaled to the ledger's realized win rate;
+# "implied": the odds' implied probability as is (vig included, so expect to lose)
+PROBABILITY_MODELS = ("calibrated", "implied")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Paths per task. Each task draws from its own seeded stream, so results depend on
+# the seed and the parameters only, not on the number of workers
+TASK_PATHS = 25_000
+# Paths whose bankroll is kept at each checkpoint for the percentile bands
+BAND_PATHS = 10_000
+CHECKPOINTS = 50
+
+
+# -------------------------------
+# Betting history
+# -------------------------------
+def betting_history(log, model="calibrated"):
+    """
+    The won and lost bets of a BetLog with odds, as the simulator resamples them:
+    {"profit": profit per $1 staked (profit boost included), "probability", "kelly":
+    full-Kelly fraction, "stake", "bonus"} arrays plus "unit", the median cash stake.
+    Raises ValueError if there is nothing to resample.
+    """
+    outcome = outcome_codes(log)
+    posted = american_to_decimal_array(log.floats["Odds"])
+    graded = ((outcome == OUTCOMES["Win"]) | (outcome == OUTCOMES["Loss"])) & (posted > 1)
+    if not graded.any():
+        raise ValueError("no won or lost bets with odds to resample")
+
+    posted = posted[graded]
+    won = outcome[graded] == OUTCOMES["Win"]
+    stake = np.nan_to_num(log.floats["Stake ($)"][graded], nan=0.0)
+    boost = np.nan_to_num(log.floats["Profit Boost (%)"][graded], nan=0.0)
+    profit = (posted - 1) * np.where(boost > 0, 1 + boost / 100, 1.0)
+
+    probability = 1 / posted
+    if model == "calibrated":
+        probability = probability * (won.sum() / probability.sum())
+    elif model != "implied":
+        raise ValueError(f"unknown probability model {model!r}")
+    probability = np.clip(probability, 0.001, 0.999)
+
+    bonus = log.bonus[graded]
+    cash = stake[~bonus & (stake > 0)]
+    return {
+        "profit": profit,
+        "probability": probability,
+        "kelly": np.clip((profit * probability - (1 - probability)) / profit, 0.0, 1.0),
+        "stake": stake,
+        "bonus": bonus,
+        "unit": float(np.median(cash)) if len(cash) else 1.0,
+    }
+
+
+# -------------------------------
+# Simulation
+# -------------------------------
+def checkpoint_steps(horizon):
+    """Bet numbers (0 = the start) at which the percentile bands are taken."""
+    return np.unique(np.linspace(0, horizon, CHECKPOINTS + 1).astype(int))
+
+
+def simulate_paths(task):
+    """
+    One task's paths (runs in a worker process). Every path bets `horizon` bets resampled
+    from the history, each won with its modelled probability; flat and fractional-Kelly
+    staking see the same bets and outcomes. A path is ruined once its bankroll drops
+    below one unit and bets no more. Bonus bets keep their own (free) stake.
+    Returns {strategy: {"final", "drawdown", "bands"}}.
+    """
+    history, params, seed, paths, band_paths = task
+    rng = np.random.default_rng(seed)
+    unit, horizon = history["unit"], params["horizon"]
+    start = params["bankroll_units"] * unit
+    checkpoints = set(checkpoint_steps(horizon)[1:].tolist())
+
+    # Per historical bet: $ staked by flat staking, bankroll share staked by Kelly
+    # (both 0 for bonus bets) and a bonus bet's winnings
+    cash = ~history["bonus"]
+    profit, probability = history["profit"], history["probability"]
+    flat = unit * cash
+    kelly = params["kelly_fraction"] * history["kelly"] * cash
+    bonus_win = np.where(history["bonus"], history["stake"] * profit, 0.0)
+
+    # One row per strategy (STRATEGIES order); updated in place, a step at a time over all paths
+    bank = np.full((len(STRATEGIES), paths), start)
+    peak = bank.copy()
+    drawdown = np.zeros_like(bank)
+    bands = [bank[:, :band_paths].copy()]
+    ret, change, ratio = np.empty(paths), np.empty(paths), np.empty_like(bank)
+    for step in range(1, horizon + 1):
+        pick = rng.integers(len(profit), size=paths)
+        won = rng.random(paths) < probability.take(pick)
+        # Return per $ staked: the (boosted) profit on a win, -1 on a loss
+        np.copyto(ret, -1.0)
+        np.copyto(ret, profit.take(pick), where=won)
+        bonus = bonus_win.take(pick)
+        bonus *= won
+        for row, strategy in enumerate(STRATEGIES):
+            stake = flat.take(pick) if strategy == "flat" else kelly.take(pick) * bank[row]
+            np.multiply(stake, ret, out=change)
+            change += bonus
+            change *= bank[row] >= unit
+            bank[row] += change
+        np.maximum(peak, bank, out=peak)
+        np.divide(bank, peak, out=ratio)
+        np.subtract(1, ratio, out=ratio)
+        np.maximum(drawdown, ratio, out=drawdown)
+        if step in checkpoints:
+            bands.append(bank[:, :band_paths].copy())
+
+    bands = np.stack(bands, axis=1)
+    return {
+        strategy: {"final": bank[row], "drawdown": drawdown[row], "bands": bands[row]}
+        for row, strategy in enumerate(STRATEGIES)
+    }
+
+
+def simulate(history, paths=PATHS, horizon=HORIZON, bankroll_units=BANKROLL_UNITS,
+             kelly_fraction=KELLY_FRACTION, seed=0, workers=None):
+    """
+    Simulate `paths` bankroll paths of `horizon` bets for flat staking (one unit a bet)
+    and fractional Kelly, from a betting_history(). Tasks of TASK_PATHS paths each get a
+    child of SeedSequence(seed) and run on a process pool (workers > 1), so the same seed
+    gives the same result on any machine. Returns {strategy: summary} (see summarize()).
+    Raises ValueError unless paths and horizon are at least 1.
+    """
+    if paths < 1 or horizon < 1:
+        raise ValueError(f"need at least one path and one bet per path (got {paths} paths of {horizon} bets)")
+    # Fractional Kelly never stakes more than the bankroll
+    params = {"horizon": int(horizon), "bankroll_units": float(bankroll_units),
+              "kelly_fraction": min(max(float(kelly_fraction), 0.0), 1.0)}
+    sizes = [TASK_PATHS] * (paths // TASK_PATHS) + ([paths % TASK_PATHS] if paths % TASK_PATHS else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    bands = [-(-BAND_PATHS * size // paths) for size in sizes]  # each task's share, rounded up
+    tasks = [(history, params, child, size, band) for child, size, band in zip(seeds, sizes, bands)]
+    if workers is None:
+        workers = min(len(tasks), os.cpu_count() or 1)
+
+    with profiling.span("simulate", paths=paths, bets=horizon, workers=workers):
+        if workers <= 1:
+            results = [simulate_paths(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(simulate_paths, tasks))
+
+    start = params["bankroll_units"] * history["unit"]
+    return {
+        strategy: summarize([result[strategy] for result in results], start, history["unit"],
+                            checkpoint_steps(horizon))
+        for strategy in STRATEGIES
+    }
+
+
+def summarize(parts, start, unit, steps):
+    """
+    Merge one strategy's task results: final bankroll mean and PERCENTILES, the share of
+    paths ending in profit and ruined (under one unit), the median max drawdown, and
+    percentile bands of the bankroll at each checkpoint {"step": steps, "percentiles": {p: values}}.
+    """
+    final = np.concatenate([part["final"] for part in parts])
+    drawdown = np.concatenate([part["drawdown"] for part in parts])
+    sample = np.hstack([part["bands"] for part in parts])
+    bands = {
+        "step": steps.tolist(),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(sample, PERCENTILES, axis=1).tolist())),
+    }
+    return {
+        "paths": len(final),
+        "start": start,
+        "mean": float(final.mean()),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(final, PERCENTILES).tolist())),
+        "profit_pct": float((final > start).mean()),
+        "ruin_pct": float((final < unit).mean()),
+        "median_drawdown_pct": float(np.median(drawdown)),
+        "bands": bands,
+    }
+
+
+def simulation_rows(results):
+    """One table row (dict) per strategy."""
+    rows = []
+    for strategy, result in results.items():
+        row = {"Strategy": "Flat" if strategy == "flat" else "Fractional Kelly", "Mean ($)": result["mean"]}
+        for p, value in result["percentiles"].items():
+            row[f"P{p} ($)"] = value
+        row["P(profit)"] = result["profit_pct"]
+        row["Risk of ruin"] = result["ruin_pct"]
+        row["Median max drawdown"] = result["median_drawdown_pct"]
+        rows.append(row)
+    return rows
+
+
+def _positive_int(value):
+    """argparse type: an int of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo bankroll paths for flat vs fractional Kelly staking.")
+    parser.add_argument("--paths", type=_positive_int, default=PATHS)
+    parser.add_argument("--bets", type=_positive_int, default=HORIZON, help=f"bets per path (default {HORIZON})")
+    parser.add_argument("--bankroll", type=float, default=BANKROLL_UNITS,
+                        help=f"starting bankroll in flat units, a unit being the median stake (default {BANKROLL_UNITS})")
+    parser.add_argument("--kelly", type=float, default=KELLY_FRACTION, help=f"Kelly fraction (default {KELLY_FRACTION})")
+    parser.add_argument("--model", choices=PROBABILITY_MODELS, default="calibrated",
+                        help="win probabilities: implied by the odds, scaled to the realized win rate (calibrated) or not")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=_positive_int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+    profiling.setup_cli(args.profile)
+
+    with profiling.operation("simulate") as timing:
+        store = open_store(readonly=True)
+        try:
+            log = BetLog.from_rows(journal.merged_rows(store))
+        finally:
+            store.close()
+        history = betting_history(log, args.model)
+        results = simulate(history, args.paths, args.bets, args.bankroll, args.kelly, args.seed, args.workers)
+        timing.add(rows=len(history["profit"]))
+
+    print(f"✅ {args.paths:,} paths of {args.bets:,} bets resampled from {len(history['profit']):,} bets; "
+          f"unit ${history['unit']:,.2f}, bankroll ${args.bankroll * history['unit']:,.2f}")
+    for row in simulation_rows(results):
+        print(f"\n{row.pop('Strategy')}:")
+        for label, value in row.items():
+            print(f"  {label:<20} {value:,.2f}" if "$" in label else f"  {label:<20} {value:.1%}")
@@ -0,0 +1,1678 @@
+import openpyxl
+from openpyxl.styles import PatternFill
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.packaging.custom import StringProperty
+from contextlib import contextmanager
+from copy import copy
+from datetime import datetime, date as _date
+import argparse
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from pricing import cumulative_pnl, price_columns, to_optional
+from profiling import file_size, operation, setup_cli, span
+
+FILE_PATH = "Bet_Tracker.xlsx"
+DB_PATH = "Bet_Tracker.db"
+
+# "sqlite" keeps the ledger in DB_PATH and treats FILE_PATH as an export,
+# "excel" uses FILE_PATH as the system of record (legacy behaviour).
+BACKEND = os.environ.get("BET_TRACKER_BACKEND", "sqlite")
+
+
+def ledger_path(backend=None):
+    """The file holding the system of record for a backend."""
+    return FILE_PATH if (backend or BACKEND) == "excel" else DB_PATH
+
+HEADERS = [
+    "Date",
+    "Sportsbook",
+    "League",
+    "Market",
+    "Pick",
+    "Stake ($)",
+    "Odds",
+    "Result",
+    "Bonus",
+    "Decimal Odds",
+    "Payout ($)",
+    "Net PnL ($)",
+    "Cumulative PnL ($)",
+    "Profit Boost (%)"
+]
+
+# SQLite column name for every Bet Log header, in sheet order
+COLUMNS = [
+    "date",
+    "sportsbook",
+    "league",
+    "market",
+    "pick",
+    "stake",
+    "odds",
+    "result",
+    "bonus",
+    "decimal_odds",
+    "payout",
+    "net_pnl",
+    "cumulative_pnl",
+    "profit_boost",
+]
+
+NET_PNL_COL = HEADERS.index("Net PnL ($)") + 1
+CUM_PNL_COL = HEADERS.index("Cumulative PnL ($)") + 1
+
+# Results of bets still waiting on an outcome, and the outcomes that settle them
+UNSETTLED_RESULTS = ("Open", "")
+SETTLED_RESULTS = ("Win", "Loss", "Push")
+
+# Inputs and outputs of the pricing engine, as Bet Log headers
+PRICING_INPUTS = ["Odds", "Stake ($)", "Result", "Bonus", "Profit Boost (%)"]
+PRICING_OUTPUTS = {
+    "Decimal Odds": "decimal_odds",
+    "Payout ($)": "payout",
+    "Net PnL ($)": "net_pnl",
+    "Cumulative PnL ($)": "cumulative_pnl",
+}
+
+
+def _to_float(x, default=0.0):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return default
+
+
+# -------------------------------
+# Bet fingerprints (duplicate detection)
+# -------------------------------
+# Two bets with the same fingerprint are treated as the same bet
+FINGERPRINT_FIELDS = ["Date", "Sportsbook", "League", "Market", "Pick", "Odds", "Stake ($)"]
+FINGERPRINT_DATE_FORMATS = ("%m/%d/%y", "%m/%d/%Y", "%Y-%m-%d")
+
+_fingerprint_dates = {}
+
+
+def _fingerprint_date(value):
+    if isinstance(value, (datetime, _date)):
+        return value.strftime("%m/%d/%y")
+    text = str(value or "").strip()
+    date = _fingerprint_dates.get(text)
+    if date is None:
+        date = text.lower()
+        for fmt in FINGERPRINT_DATE_FORMATS:
+            try:
+                date = datetime.strptime(text.split(" ")[0], fmt).strftime("%m/%d/%y")
+                break
+            except ValueError:
+                continue
+        _fingerprint_dates[text] = date
+    return date
+
+
+def fingerprint(record):
+    """
+    64-bit hash of a record's normalized date, book, league, market, pick, odds and
+    stake: "1/2/25" and "01/02/2025", " FanDuel" and "fanduel", 10 and "10.0" all match.
+    """
+    parts = [_fingerprint_date(record.get("Date"))]
+    for header in FINGERPRINT_FIELDS[1:5]:
+        parts.append(str(record.get(header) or "").strip().lower())
+    for header in FINGERPRINT_FIELDS[5:]:
+        value = record.get(header)
+        number = _to_float(value, None)
+        parts.append(repr(number) if number is not None else str(value or "").strip())
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)  # fits a SQLite INTEGER
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+# -------------------------------
+# Monthly partitions
+# -------------------------------
+# Bets are partitioned by the month of their date ("YYYY-MM", "" for a blank or
+# unparseable date). The manifest holds per-partition sums, so all-time KPIs never
+# read the bets and readers only load the months they show (see BetStore.partitions).
+# KPI sums kept per partition and per rollup key, counted by the rules in kpis
+SUM_FIELDS = (
+    "bets", "wins", "losses", "pushes", "open_bets", "pending_bets", "total_stake", "total_pnl",
+)
+PARTITION_COLUMNS = SUM_FIELDS + ("closing_cumulative", "first_id", "last_id")
+
+_partition_months = {}
+
+
+def partition_of(value):
+    """Partition ("YYYY-MM") of a Bet Log date; "" if it is blank or does not parse."""
+    if isinstance(value, (datetime, _date)):
+        return value.strftime("%Y-%m")
+    text = str(value or "").strip()
+    month = _partition_months.get(text)
+    if month is None:
+        month = ""
+        for fmt in FINGERPRINT_DATE_FORMATS:
+            try:
+                month = datetime.strptime(text.split(" ")[0], fmt).strftime("%Y-%m")
+                break
+            except ValueError:
+                continue
+        _partition_months[text] = month
+    return month
+
+
+def partition_manifest(rows):
+    """Manifest entries (see BetStore.partitions) summed from (row_id, record) pairs."""
+    from kpis import KpiTotals  # the KPI rules; kpis loads pandas, so only on first use
+
+    parts, totals = {}, {}
+    for row_id, record in rows:
+        month = partition_of(record.get("Date"))
+        part = parts.get(month)
+        if part is None:
+            part = parts[month] = {"month": month, "closing_cumulative": None, "first_id": row_id}
+            totals[month] = KpiTotals()
+        totals[month].add_record(record)
+        if record.get("Cumulative PnL ($)") not in (None, ""):
+            part["closing_cumulative"] = _to_float(record["Cumulative PnL ($)"], None)
+        part["last_id"] = row_id
+    return [{**parts[month], **totals[month].sums()} for month in sorted(parts)]
+
+
+# -------------------------------
+# Rollups
+# -------------------------------
+# KPI sums per sportsbook, league, market and day, keyed by the column's value ("" if
+# blank; a day is the Date as stored, MM/DD/YY). SQLite keeps them in the rollups table
+# and its triggers move them by the old row's and the new row's values on every write,
+# so readers get a handful of rows instead of scanning the bets (see BetStore.rollups).
+ROLLUP_DIMENSIONS = {"sportsbook": "Sportsbook", "league": "League", "market": "Market", "day": "Date"}
+
+
+def rollup_key(dimension, record):
+    value = record.get(ROLLUP_DIMENSIONS[dimension])
+    if dimension == "day":
+        value = _normalize_date(value)
+    return "" if value is None else str(value)
+
+
+def rollup_sums(rows, dimension):
+    """{key: SUM_FIELDS dict} of one dimension, summed from (row_id, record) pairs."""
+    from kpis import KpiTotals
+
+    totals = {}
+    for _, record in rows:
+        key = rollup_key(dimension, record)
+        if key not in totals:
+            totals[key] = KpiTotals()
+        totals[key].add_record(record)
+    return {key: totals[key].sums() for key in sorted(totals)}
+
+
+class FingerprintIndex:
+    """
+    fingerprint -> number of bets, for workbooks (SQLite keeps an indexed column).
+    Persisted next to the workbook (path + ".fingerprints") together with the
+    workbook's file signature; a workbook saved by anything else, e.g. edited in
+    Excel, no longer matches and the index is rebuilt from the sheet.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = counts if counts is not None else {}
+
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for record in records:
+            if record is not None:
+                index.add(fingerprint(record))
+        return index
+
+    @staticmethod
+    def sidecar(path):
+        return path + ".fingerprints"
+
+    @classmethod
+    def load(cls, path, signature):
+        """The saved index for the workbook at `path`, or None if missing or stale."""
+        try:
+            with open(cls.sidecar(path), "rb") as handle:
+                saved = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if signature is None or saved.get("signature") != signature:
+            return None
+        return cls(saved["counts"])
+
+    def save(self, path):
+        """Write the index for the workbook as it is on disk now."""
+        sidecar = self.sidecar(path)
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as handle:
+            pickle.dump({"signature": file_signature(path), "counts": self.counts}, handle,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, sidecar)
+
+    def add(self, fp):
+        self.counts[fp] = self.counts.get(fp, 0) + 1
+
+    def remove(self, fp):
+        left = self.counts.get(fp, 0) - 1
+        if left > 0:
+            self.counts[fp] = left
+        else:
+            self.counts.pop(fp, None)
+
+    def lookup(self, fingerprints):
+        return {fp: self.counts[fp] for fp in fingerprints if fp in self.counts}
+
+
+def workbook_index(path=FILE_PATH):
+    """
+    The fingerprint index of a saved workbook without loading it into openpyxl:
+    read from the sidecar, or rebuilt by streaming the sheet (and saved) if stale.
+    """
+    signature = file_signature(path)
+    index = FingerprintIndex.load(path, signature)
+    if index is None:
+        with span("rebuild fingerprint index", path=path):
+            index = FingerprintIndex.build(read_bet_log(path))
+        if file_signature(path) == signature:
+            index.save(path)
+    return index
+
+
+# -------------------------------
+# Header maintenance
+# -------------------------------
+LEGACY_HEADERS = {"Bet Type": "Market", "Selection": "Pick"}
+
+
+def ensure_bet_log_headers(ws):
+    header_values = [cell.value for cell in ws[1]] if ws.max_row >= 1 else []
+
+    if not any(header_values):
+        ws.append(HEADERS)
+        return
+
+    for idx, value in enumerate(header_values, start=1):
+        if value in LEGACY_HEADERS:
+            ws.cell(row=1, column=idx, value=LEGACY_HEADERS[value])
+
+    header_values = [cell.value for cell in ws[1]]
+
+    if "League" not in header_values:
+        try:
+            sportsbook_idx = header_values.index("Sportsbook") + 1
+        except ValueError:
+            sportsbook_idx = 2
+        ws.insert_cols(sportsbook_idx + 1)
+        ws.cell(row=1, column=sportsbook_idx + 1, value="League")
+
+    for idx, header in enumerate(HEADERS, start=1):
+        ws.cell(row=1, column=idx, value=header)
+
+
+def read_bet_log(path=FILE_PATH):
+    """
+    Stream the "Bet Log" sheet with openpyxl's read-only mode, one record at a time.
+    Columns are matched by header name (legacy names included); blank rows yield None
+    so callers can keep Excel row numbers aligned.
+    """
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb["Bet Log"].iter_rows(values_only=True)
+        header_row = next(rows, None) or ()
+        positions = {}
+        for idx, value in enumerate(header_row):
+            name = LEGACY_HEADERS.get(value, value)
+            if name in HEADERS and name not in positions:
+                positions[name] = idx
+        for values in rows:
+            if not any(cell not in (None, "") for cell in values):
+                yield None
+                continue
+            yield {
+                header: (values[positions[header]] if header in positions and positions[header] < len(values) else None)
+                for header in HEADERS
+            }
+    finally:
+        wb.close()
+
+
+# -------------------------------
+# Workbook formatting
+# -------------------------------
+# One rule pair over the whole Net PnL column, so appends never need a new range
+NET_PNL_RANGE = "L2:L1048576"
+NET_PNL_OPERATORS = ("greaterThan", "lessThan")
+
+
+def _is_net_pnl_rule(cf, rule):
+    in_column = all(
+        cell_range.min_col == NET_PNL_COL and cell_range.max_col == NET_PNL_COL
+        for cell_range in cf.sqref.ranges
+    )
+    return (
+        in_column
+        and rule.type == "cellIs"
+        and rule.operator in NET_PNL_OPERATORS
+        and list(rule.formula or []) == ["0"]
+    )
+
+
+def count_conditional_rules(ws):
+    return sum(len(cf.rules) for cf in ws.conditional_formatting)
+
+
+def add_net_pnl_formatting(ws):
+    """
+    Keep exactly one green/red Net PnL rule pair covering the whole column.
+    Older per-append copies (L2:L<n>) are dropped; other rules are kept as-is.
+    """
+    entries = [(cf, rule) for cf in ws.conditional_formatting for rule in cf.rules]
+    current = [(str(cf.sqref), rule.operator) for cf, rule in entries if _is_net_pnl_rule(cf, rule)]
+    if sorted(current) == sorted((NET_PNL_RANGE, op) for op in NET_PNL_OPERATORS):
+        return
+
+    kept = ConditionalFormattingList()
+    for cf, rule in entries:
+        if not _is_net_pnl_rule(cf, rule):
+            kept.add(str(cf.sqref), rule)
+
+    # Conditional formatting for Net PnL
+    green_fill = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
+    red_fill = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
+    kept.add(NET_PNL_RANGE, CellIsRule(operator='greaterThan', formula=['0'], fill=green_fill))
+    kept.add(NET_PNL_RANGE, CellIsRule(operator='lessThan', formula=['0'], fill=red_fill))
+    ws.conditional_formatting = kept
+
+
+def update_dashboard_formulas(wb, ws):
+    if "Dashboard" in wb.sheetnames:
+        ws_dash = wb["Dashboard"]
+        for row in ws_dash.iter_rows(min_row=2, max_col=2, max_row=20):
+            for cell in row:
+                cell.value = None
+    else:
+        ws_dash = wb.create_sheet("Dashboard")
+        ws_dash["A1"], ws_dash["B1"] = "Metric", "Value"
+
+    ws_dash["A2"], ws_dash["B2"] = "Total PnL ($)", f"=SUM('Bet Log'!L2:L{ws.max_row})"
+    ws_dash["A3"], ws_dash["B3"] = "Total Stake ($)", f"=SUMIF('Bet Log'!I2:I{ws.max_row},FALSE,'Bet Log'!F2:F{ws.max_row})"
+    ws_dash["A4"], ws_dash["B4"] = "Wins", f'=COUNTIF(\'Bet Log\'!H2:H{ws.max_row},"Win")'
+    ws_dash["A5"], ws_dash["B5"] = "Total Bets", f'=COUNTA(\'Bet Log\'!H2:H{ws.max_row})'
+    ws_dash["A6"], ws_dash["B6"] = "Pending Bets", f'=COUNTIF(\'Bet Log\'!H2:H{ws.max_row},"")'
+    ws_dash["A7"], ws_dash["B7"] = "Win %", f"=IF(B5=0,0,B4/B5)"
+    ws_dash["A8"], ws_dash["B8"] = "ROI (%)", f"=IF(B3=0,0,B2/B3)"
+
+
+def reprice_sheet(ws, from_row=2):
+    """
+    Reprice Bet Log rows from from_row down in one vectorized pass and write the derived
+    columns back; Cumulative PnL continues from the last one above from_row.
+    """
+    if ws.max_row < from_row:
+        return
+    start = 0.0
+    for row in range(from_row - 1, 1, -1):
+        value = ws.cell(row=row, column=CUM_PNL_COL).value
+        if value not in (None, ""):
+            start = _to_float(value, 0.0)
+            break
+    columns = {header: [] for header in PRICING_INPUTS}
+    col_index = {header: HEADERS.index(header) for header in PRICING_INPUTS}
+    row_numbers = []
+    for r, values in enumerate(ws.iter_rows(min_row=from_row, max_col=len(HEADERS), values_only=True),
+                               start=from_row):
+        if not any(cell not in (None, "") for cell in values):
+            continue
+        values = tuple(values) + (None,) * (len(HEADERS) - len(values))
+        for header, idx in col_index.items():
+            columns[header].append(values[idx])
+        row_numbers.append(r)
+    priced = price_columns(*(columns[header] for header in PRICING_INPUTS), start_cumulative=start)
+    for header, key in PRICING_OUTPUTS.items():
+        col = HEADERS.index(header) + 1
+        for r, value in zip(row_numbers, priced[key]):
+            ws.cell(row=r, column=col).value = to_optional(value)
+
+
+def iter_priced(records, chunk_size=5000):
+    """
+    Reprice a stream of records in fixed-size vectorized chunks, carrying cumulative
+    PnL across chunks. None entries (blank rows) pass through untouched.
+    """
+    chunk = []
+    running = 0.0
+
+    def flush(chunk, running):
+        bets = [record for record in chunk if record is not None]
+        if bets:
+            priced = price_columns(
+                *([record.get(header) for record in bets] for header in PRICING_INPUTS),
+                start_cumulative=running,
+            )
+            for idx, record in enumerate(bets):
+                for header, key in PRICING_OUTPUTS.items():
+                    record[header] = to_optional(priced[key][idx])
+            for value in reversed(priced["cumulative_pnl"]):
+                if value == value:  # last settled bet (NaN != NaN)
+                    running = float(value)
+                    break
+        return running
+
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            running = flush(chunk, running)
+            yield from chunk
+            chunk = []
+    flush(chunk, running)
+    yield from chunk
+
+
+# -------------------------------
+# Store interface
+# -------------------------------
+class BetStore:
+    """
+    Ledger backend. Bets are dicts keyed by HEADERS and addressed by a row id
+    (Excel row number or SQLite primary key). Mutations are persisted by save();
+    used as a context manager the store saves on a clean exit.
+    """
+
+    def rows(self):
+        """Return [(row_id, record), ...] in ledger order."""
+        raise NotImplementedError
+
+    def iter_records(self):
+        """Yield records in ledger order without materializing the whole ledger."""
+        for _, record in self.rows():
+            yield record
+
+    def get(self, row_id):
+        for rid, record in self.rows():
+            if rid == row_id:
+                return record
+        return None
+
+    def select(self, result=None, sportsbook=None, date=None):
+        """
+        [(row_id, record), ...] of the bets matching every given filter, in ledger order.
+        Each filter is one value or a list of values; result "" also matches a blank Result.
+        """
+        filters = _select_filters(result, sportsbook, date)
+        return [
+            (rid, record) for rid, record in self.rows()
+            if all(_select_key(header, record.get(header)) in values for header, values in filters)
+        ]
+
+    def open_bets(self):
+        """Bets without a final result (Open or blank), in ledger order."""
+        return self.select(result=UNSETTLED_RESULTS)
+
+    def rows_after(self, row_id):
+        """[(row_id, record), ...] for bets after row_id, in ledger order."""
+        return [(rid, record) for rid, record in self.rows() if rid > row_id]
+
+    def rows_in(self, months):
+        """[(row_id, record), ...] for bets in the given partitions, in ledger order."""
+        months = set(months)
+        return [(rid, record) for rid, record in self.rows() if partition_of(record.get("Date")) in months]
+
+    def partitions(self):
+        """
+        The partition manifest, oldest month first: {"month", the KpiTotals.as_dict()
+        sums (bets, wins, ..., total_stake, total_pnl), "closing_cumulative" (Cumulative
+        PnL of the month's last bet in ledger order), "first_id", "last_id"}.
+        Summed from every row here; SQLite keeps it as a table.
+        """
+        return partition_manifest(self.rows())
+
+    def rollups(self, dimension):
+        """
+        {key: SUM_FIELDS dict} for one of ROLLUP_DIMENSIONS (sportsbook, league, market,
+        day), sorted by key. Summed from every row here; SQLite keeps them as a table.
+        """
+        return rollup_sums(self.rows(), dimension)
+
+    # Whether a hard delete renumbers the rows after it (Excel rows shift up)
+    renumbers_on_delete = False
+    # Whether rows_in() and partitions() read only what they return (not every bet)
+    partitioned = False
+
+    def next_row_id(self):
+        """Row id the next appended bet will get."""
+        raise NotImplementedError
+
+    def get_meta(self, key, default=None):
+        """Small string settings stored with the ledger (saved with it)."""
+        raise NotImplementedError
+
+    def set_meta(self, key, value):
+        raise NotImplementedError
+
+    def last_cumulative(self):
+        """Cumulative PnL of the most recent settled bet (0.0 for an empty ledger)."""
+        return self.cumulative_before(None)
+
+    def cumulative_before(self, row_id):
+        """Cumulative PnL of the last settled bet before row_id (None: end of the ledger)."""
+        raise NotImplementedError
+
+    def append(self, records):
+        """Append records and return their row ids."""
+        raise NotImplementedError
+
+    def fingerprint_counts(self, fingerprints):
+        """{fingerprint: number of bets in the ledger} for those present (see fingerprint())."""
+        raise NotImplementedError
+
+    def update(self, row_id, record):
+        raise NotImplementedError
+
+    def delete(self, row_ids, soft=False):
+        """
+        Remove bets and bring Cumulative PnL up to date in the same call.
+        soft=True leaves a tombstone instead of moving rows, so row ids stay
+        stable until compact() reclaims the space. Returns the number of bets removed.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """Physically drop tombstoned rows. Returns the number of rows reclaimed."""
+        return 0
+
+    def settle(self, results):
+        """
+        Give many bets their final result at once ({row_id: "Win" | "Loss" | "Push"}):
+        they are repriced in one vectorized call and Cumulative PnL is rebuilt in one
+        forward pass from the earliest of them. Returns the row ids settled.
+        """
+        results = {int(rid): result for rid, result in results.items()}
+        for result in results.values():
+            if result not in SETTLED_RESULTS:
+                raise ValueError(f"result must be one of {'/'.join(SETTLED_RESULTS)}, got {result!r}")
+        found = [(rid, self.get(rid)) for rid in sorted(results)]
+        found = [(rid, record) for rid, record in found if record is not None]
+        if not found:
+            return []
+        priced = price_columns(
+            [record.get("Odds") for _, record in found],
+            [record.get("Stake ($)") for _, record in found],
+            [results[rid] for rid, _ in found],
+            [record.get("Bonus") for _, record in found],
+            [record.get("Profit Boost (%)") for _, record in found],
+        )
+        for idx, (rid, _) in enumerate(found):
+            self.update(rid, {
+                "Result": results[rid],
+                "Decimal Odds": to_optional(priced["decimal_odds"][idx]),
+                "Payout ($)": to_optional(priced["payout"][idx]),
+                "Net PnL ($)": to_optional(priced["net_pnl"][idx]),
+            })
+        self.recompute_cumulative(from_row=found[0][0])
+        return [rid for rid, _ in found]
+
+    def recompute_cumulative(self, from_row=None):
+        """
+        Rebuild Cumulative PnL from Net PnL in ledger order, starting at from_row
+        (the first row whose Net PnL or position changed) and continuing from the
+        stored cumulative before it. from_row=None rebuilds the whole column.
+        """
+        raise NotImplementedError
+
+    def reprice(self):
+        """Recompute Decimal Odds, Payout, Net and Cumulative PnL for every bet."""
+        raise NotImplementedError
+
+    def save(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.save()
+        finally:
+            self.close()
+        return False
+
+
+def _select_key(header, value):
+    if header == "Date":
+        return _fingerprint_date(value)
+    return "" if value is None else value
+
+
+def _select_filters(result, sportsbook, date):
+    """[(header, {normalized values}), ...] for the filters given to select()."""
+    filters = []
+    for header, value in (("Result", result), ("Sportsbook", sportsbook), ("Date", date)):
+        if value is None:
+            continue
+        values = [value] if isinstance(value, (str, datetime, _date)) else list(value)
+        filters.append((header, {_select_key(header, item) for item in values}))
+    return filters
+
+
+# -------------------------------
+# Excel backend
+# -------------------------------
+class ExcelStore(BetStore):
+    """The "Bet Log" sheet of an .xlsx workbook; row ids are Excel row numbers."""
+
+    renumbers_on_delete = True
+
+    def __init__(self, path=FILE_PATH, create=True):
+        self.path = path
+        self.signature = file_signature(path)
+        self._fingerprints = None
+        try:
+            with span("load workbook", path=path, bytes=file_size(path)):
+                self.wb = openpyxl.load_workbook(path)
+            self.ws = self.wb["Bet Log"]
+        except FileNotFoundError:
+            if not create:
+                raise
+            self.wb = openpyxl.Workbook()
+            self.ws = self.wb.active
+            self.ws.title = "Bet Log"
+            self.ws.append(HEADERS)
+        else:
+            ensure_bet_log_headers(self.ws)
+
+    def _read(self, row):
+        return {
+            header: self.ws.cell(row=row, column=idx).value
+            for idx, header in enumerate(HEADERS, start=1)
+        }
+
+    def _write(self, row, record):
+        for idx, header in enumerate(HEADERS, start=1):
+            if header in record:
+                self.ws.cell(row=row, column=idx).value = record[header]
+
+    def rows(self):
+        out = []
+        with span("parse rows") as timing:
+            for row_id, values in enumerate(
+                self.ws.iter_rows(min_row=2, max_col=len(HEADERS), values_only=True), start=2
+            ):
+                if not any(cell not in (None, "") for cell in values):
+                    continue
+                values = tuple(values) + (None,) * (len(HEADERS) - len(values))
+                out.append((row_id, dict(zip(HEADERS, values))))
+            timing.add(rows=len(out))
+        return out
+
+    def get(self, row_id):
+        if row_id < 2 or row_id > self.ws.max_row:
+            return None
+        return self._read(row_id)
+
+    def next_row_id(self):
+        return self.ws.max_row + 1
+
+    @property
+    def fingerprints(self):
+        """The FingerprintIndex, loaded (or rebuilt from the sheet) on first use."""
+        if self._fingerprints is None:
+            index = FingerprintIndex.load(self.path, self.signature)
+            if index is None:
+                with span("rebuild fingerprint index", path=self.path):
+                    index = FingerprintIndex.build(record for _, record in self.rows())
+            self._fingerprints = index
+        return self._fingerprints
+
+    def fingerprint_counts(self, fingerprints):
+        return self.fingerprints.lookup(fingerprints)
+
+    def get_meta(self, key, default=None):
+        # Kept as custom document properties so they travel with the workbook
+        props = self.wb.custom_doc_props
+        return props[key].value if key in props.names else default
+
+    def set_meta(self, key, value):
+        props = self.wb.custom_doc_props
+        if key in props.names:
+            props[key].value = str(value)
+        else:
+            props.append(StringProperty(name=key, value=str(value)))
+
+    def cumulative_before(self, row_id):
+        start = self.ws.max_row if row_id is None else min(int(row_id), self.ws.max_row + 1) - 1
+        for row in range(start, 1, -1):
+            value = self.ws.cell(row=row, column=CUM_PNL_COL).value
+            if value not in (None, ""):
+                return _to_float(value, 0.0)
+        return 0.0
+
+    def append(self, records):
+        first_row = self.ws.max_row + 1
+        row_ids = []
+        index = self.fingerprints
+        for offset, record in enumerate(records):
+            self._write(first_row + offset, record)
+            index.add(fingerprint(record))
+            row_ids.append(first_row + offset)
+        if row_ids:
+            add_net_pnl_formatting(self.ws)
+            update_dashboard_formulas(self.wb, self.ws)
+        return row_ids
+
+    def update(self, row_id, record):
+        row_id = int(row_id)
+        if any(header in record for header in FINGERPRINT_FIELDS):
+            old = self._read(row_id)
+            if not self._is_blank(list(old.values())):
+                self.fingerprints.remove(fingerprint(old))
+            self._write(row_id, record)
+            self.fingerprints.add(fingerprint(self._read(row_id)))
+        else:
+            self._write(row_id, record)
+
+    def _is_blank(self, values):
+        return not any(cell not in (None, "") for cell in values[:len(HEADERS)])
+
+    def delete(self, row_ids, soft=False):
+        drop = {int(rid) for rid in row_ids if 2 <= int(rid) <= self.ws.max_row}
+        if not drop:
+            return 0
+        for rid in drop:
+            old = self._read(rid)
+            if not self._is_blank(list(old.values())):
+                self.fingerprints.remove(fingerprint(old))
+        if soft:
+            # Tombstone = blank row: readers already skip it and nothing below moves
+            width = max(self.ws.max_column, len(HEADERS))
+            for rid in drop:
+                for col in range(1, width + 1):
+                    self.ws.cell(row=rid, column=col).value = None
+            self.recompute_cumulative(from_row=min(drop))
+            return len(drop)
+        return self._compact_rows(drop)
+
+    def compact(self):
+        # Tombstones and blank/style-only rows go in the same pass as the trailing tail
+        removed = self._compact_rows(set(), drop_blank=True)
+        add_net_pnl_formatting(self.ws)
+        return removed
+
+    def _compact_rows(self, drop, drop_blank=False):
+        """
+        Shift surviving rows up over the dropped ones in a single pass (instead of
+        one delete_rows per row) and rewrite Cumulative PnL as rows are placed.
+        """
+        ws = self.ws
+        width = max(ws.max_column, len(HEADERS))
+        first = min(drop) if drop else None
+        if drop_blank:
+            for r, values in enumerate(ws.iter_rows(min_row=2, max_col=len(HEADERS), values_only=True), start=2):
+                if self._is_blank(values):
+                    first = r if first is None else min(first, r)
+                    break
+        if first is None:
+            return 0
+
+        last_row = ws.max_row
+        running = self.cumulative_before(first)
+        target = first
+        for r, cells in enumerate(ws.iter_rows(min_row=first, max_row=last_row, max_col=width), start=first):
+            values = [cell.value for cell in cells]
+            if r in drop or (drop_blank and self._is_blank(values)):
+                continue
+            if target != r:
+                for col, cell in enumerate(cells, start=1):
+                    moved = ws.cell(row=target, column=col)
+                    moved.value = cell.value
+                    # Number format, font, fill, border, alignment and protection move with
+                    # the value, as in openpyxl's move_range()
+                    moved._style = copy(cell._style)
+            net = values[NET_PNL_COL - 1]
+            if net in (None, ""):
+                cum = None
+            else:
+                running += _to_float(net, 0.0)
+                cum = running
+            ws.cell(row=target, column=CUM_PNL_COL).value = cum
+            target += 1
+
+        removed = last_row - target + 1
+        if removed:
+            # Only the now-unused tail is deleted, so nothing has to shift
+            ws.delete_rows(target, removed)
+        return removed
+
+    def recompute_cumulative(self, from_row=None):
+        first = max(int(from_row), 2) if from_row is not None else 2
+        if first > self.ws.max_row:
+            return
+        net = [row[0] for row in self.ws.iter_rows(
+            min_row=first, min_col=NET_PNL_COL, max_col=NET_PNL_COL, values_only=True
+        )]
+        start = self.cumulative_before(first) if first > 2 else 0.0
+        for r, value in enumerate(cumulative_pnl(net, start), start=first):
+            self.ws.cell(row=r, column=CUM_PNL_COL).value = to_optional(value)
+
+    def reprice(self):
+        reprice_sheet(self.ws)
+
+    def save(self):
+        # Write next to the workbook and rename over it, so readers and a crash
+        # mid-save only ever see the old or the new file, never half of one
+        tmp_path = self.path + ".tmp"
+        with span("save workbook", path=self.path) as timing:
+            self.wb.save(tmp_path)
+            os.replace(tmp_path, self.path)
+            timing.add(bytes=file_size(self.path))
+        # Re-stamped with the new file signature, so only outside edits trigger a rebuild
+        self.fingerprints.save(self.path)
+        self.signature = file_signature(self.path)
+
+    def close(self):
+        self.wb.close()
+
+
+# -------------------------------
+# SQLite backend
+# -------------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT,
+    sportsbook TEXT,
+    league TEXT,
+    market TEXT,
+    pick TEXT,
+    stake NUMERIC,
+    odds NUMERIC,
+    result TEXT,
+    bonus INTEGER NOT NULL DEFAULT 0,
+    decimal_odds REAL,
+    payout REAL,
+    net_pnl REAL,
+    cumulative_pnl REAL,
+    profit_boost NUMERIC,
+    fingerprint INTEGER,
+    month TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS partitions (
+    month TEXT PRIMARY KEY,
+    bets INTEGER,
+    wins INTEGER,
+    losses INTEGER,
+    pushes INTEGER,
+    open_bets INTEGER,
+    pending_bets INTEGER,
+    total_stake REAL,
+    total_pnl REAL,
+    closing_cumulative REAL,
+    first_id INTEGER,
+    last_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bets INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    pushes INTEGER NOT NULL,
+    open_bets INTEGER NOT NULL,
+    pending_bets INTEGER NOT NULL,
+    total_stake REAL NOT NULL,
+    total_pnl REAL NOT NULL,
+    PRIMARY KEY (dimension, key)
+);
+-- Months whose manifest row is out of date (filled by the bets_partition_* triggers)
+CREATE TABLE IF NOT EXISTS partitions_dirty (
+    month TEXT PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS bets_result ON bets (result);
+CREATE INDEX IF NOT EXISTS bets_date ON bets (date);
+CREATE INDEX IF NOT EXISTS bets_sportsbook ON bets (sportsbook);
+CREATE TRIGGER IF NOT EXISTS bets_dashboard_update
+AFTER UPDATE OF {columns} ON bets
+WHEN {behind_mark}
+BEGIN {mark_stale}; END;
+CREATE TRIGGER IF NOT EXISTS bets_dashboard_delete
+AFTER DELETE ON bets
+WHEN {behind_mark}
+BEGIN {mark_stale}; END;
+"""
+
+
+# dashboard.py's high-water mark (last bet id already in the workbook). Editing or deleting
+# a bet at or below it raises the stale flag, which forces its next run to rebuild in full.
+DASHBOARD_MARK_KEY = "dashboard_row"
+DASHBOARD_STALE_KEY = "dashboard_stale"
+
+SCHEMA = SCHEMA.format(
+    columns=", ".join(COLUMNS),
+    # Only the first such write in a run pays for the insert
+    behind_mark=(
+        f"OLD.id <= CAST((SELECT value FROM meta WHERE key = '{DASHBOARD_MARK_KEY}') AS INTEGER) "
+        f"AND COALESCE((SELECT value FROM meta WHERE key = '{DASHBOARD_STALE_KEY}'), '0') = '0'"
+    ),
+    mark_stale=f"INSERT OR REPLACE INTO meta (key, value) VALUES ('{DASHBOARD_STALE_KEY}', '1')",
+)
+
+
+# Meta key set once the rollups table has been filled and its triggers created
+ROLLUPS_KEY = "rollups_ready"
+
+
+def _rollup_deltas(row, sign):
+    """Upserts moving each rollup row of one bet (row = "NEW" or "OLD") by sign (1 or -1)."""
+    from kpis import sum_terms_sql
+
+    deltas = sum_terms_sql(f"TRIM(COALESCE({row}.result, ''))", f"{row}.bonus", f"{row}.stake", f"{row}.net_pnl")
+    statements = []
+    for dimension, header in ROLLUP_DIMENSIONS.items():
+        column = COLUMNS[HEADERS.index(header)]
+        statements.append(
+            f"INSERT INTO rollups (dimension, key, {', '.join(SUM_FIELDS)}) "
+            f"VALUES ('{dimension}', COALESCE({row}.{column}, ''), "
+            f"{', '.join(f'{sign} * {delta}' for delta in deltas)}) "
+            f"ON CONFLICT (dimension, key) DO UPDATE SET "
+            f"{', '.join(f'{field} = {field} + excluded.{field}' for field in SUM_FIELDS)}"
+        )
+    return "; ".join(statements)
+
+
+def _normalize_date(value):
+    if isinstance(value, (datetime, _date)):
+        return value.strftime("%m/%d/%y")
+    return value
+
+
+# PRAGMA user_version of a ledger whose schema, triggers and rollups are current;
+# bump it whenever the upgrades in SQLiteStore.__init__ change
+SCHEMA_VERSION = 2
+
+
+class SQLiteStore(BetStore):
+    """
+    Bets as rows of a local SQLite table; row ids are the primary key.
+    A read-write open brings the schema and the backfills up to date under the ledger
+    lock (lock_path, the one the writer holds). A read-only open never writes: it
+    only asks for that upgrade when the ledger needs one.
+    """
+
+    partitioned = True  # bets_month index and the partitions manifest table
+
+    def __init__(self, path=DB_PATH, create=True, readonly=False, lock_path=None):
+        if (readonly or not create) and not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.path = path
+        self.readonly = readonly
+        self.lock_path = lock_path or path + ".lock"
+        if readonly:
+            self.conn = self._connect_readonly()
+            if self._needs_upgrade():
+                self.conn.close()
+                SQLiteStore(path, lock_path=self.lock_path).close()
+                self.conn = self._connect_readonly()
+            return
+        self.conn = sqlite3.connect(path)
+        with file_lock(self.lock_path):
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self._ensure_fingerprints()
+            self._ensure_partitions()
+            self._ensure_rollups()
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+
+    def _connect_readonly(self):
+        return sqlite3.connect(f"file:{quote(os.path.abspath(self.path))}?mode=ro", uri=True)
+
+    def _needs_upgrade(self):
+        """Whether a read-write open would write: another schema version, or rows waiting on a backfill."""
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            return True
+        return any(
+            self.conn.execute(f"SELECT EXISTS ({query})").fetchone()[0]
+            for query in (
+                "SELECT 1 FROM bets WHERE fingerprint IS NULL",
+                "SELECT 1 FROM bets WHERE month IS NULL",
+                "SELECT 1 FROM bets WHERE day IS NULL",
+                "SELECT 1 FROM partitions_dirty",
+            )
+        )
+
+    def _ensure_fingerprints(self):
+        """
+        Add the fingerprint column and its index to older ledgers, and fill it in
+        for rows written without one (a migration, or rows inserted by other tools).
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(bets)")]
+        if "fingerprint" not in columns:
+            self.conn.execute("ALTER TABLE bets ADD COLUMN fingerprint INTEGER")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS bets_fingerprint ON bets (fingerprint)")
+        # Edits from other tools that leave the fingerprint as it was clear it for the backfill below
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS bets_fingerprint_stale "
+            "AFTER UPDATE OF date, sportsbook, league, market, pick, odds, stake ON bets "
+            "WHEN NEW.fingerprint IS OLD.fingerprint "
+            "BEGIN UPDATE bets SET fingerprint = NULL WHERE id = NEW.id; END"
+        )
+        missing = self.conn.execute(
+            f"SELECT id, {', '.join(COLUMNS)} FROM bets WHERE fingerprint IS NULL"
+        ).fetchall()
+        if missing:
+            with span("backfill fingerprints", rows=len(missing)):
+                self.conn.executemany(
+                    "UPDATE bets SET fingerprint = ? WHERE id = ?",
+                    [(fingerprint(self._record(row[1:])), row[0]) for row in missing],
+                )
+        self.conn.commit()
+
+    def _ensure_partitions(self):
+        """
+        Add the month and day columns and their indexes to older ledgers and bring the
+        partition manifest up to date. Triggers queue every month a write touches (ours or
+        another tool's) in partitions_dirty; _refresh_partitions() re-sums only those months.
+        day is the Date normalized as select() compares it (MM/DD/YY).
+        """
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(bets)")]
+        for column in ("month", "day"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE bets ADD COLUMN {column} TEXT")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS bets_{column} ON bets ({column})")
+            # Date edits that leave it as it was clear it, like fingerprints
+            self.conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS bets_{column}_stale "
+                f"AFTER UPDATE OF date ON bets "
+                f"WHEN NEW.{column} IS OLD.{column} "
+                f"BEGIN UPDATE bets SET {column} = NULL WHERE id = NEW.id; END"
+            )
+        queue_old = "INSERT OR IGNORE INTO partitions_dirty (month) SELECT OLD.month WHERE OLD.month IS NOT NULL"
+        queue_new = "INSERT OR IGNORE INTO partitions_dirty (month) SELECT NEW.month WHERE NEW.month IS NOT NULL"
+        self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS bets_partition_insert AFTER INSERT ON bets "
+                          f"BEGIN {queue_new}; END")
+        self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS bets_partition_delete AFTER DELETE ON bets "
+                          f"BEGIN {queue_old}; END")
+        self.conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS bets_partition_update "
+            f"AFTER UPDATE OF month, stake, result, bonus, net_pnl, cumulative_pnl ON bets "
+            f"BEGIN {queue_old}; {queue_new}; END"
+        )
+        self._refresh_partitions()
+        self.conn.commit()
+
+    def _ensure_rollups(self):
+        """
+        Create the triggers keeping the rollups table current and fill it, once per ledger:
+        every insert adds the new row, every delete subtracts the old one and an update
+        that changes a rollup's inputs does both.
+        """
+        if self.get_meta(ROLLUPS_KEY) == "1":
+            return
+        self.conn.execute("BEGIN IMMEDIATE")  # no bet is written between the fill and the triggers
+        changed = " OR ".join(
+            f"OLD.{column} IS NOT NEW.{column}"
+            for column in ("sportsbook", "league", "market", "date", "stake", "result", "bonus", "net_pnl")
+        )
+        self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS bets_rollup_insert AFTER INSERT ON bets "
+                          f"BEGIN {_rollup_deltas('NEW', 1)}; END")
+        self.conn.execute(f"CREATE TRIGGER IF NOT EXISTS bets_rollup_delete AFTER DELETE ON bets "
+                          f"BEGIN {_rollup_deltas('OLD', -1)}; END")
+        self.conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS bets_rollup_update "
+            f"AFTER UPDATE OF sportsbook, league, market, date, stake, result, bonus, net_pnl ON bets "
+            f"WHEN {changed} "
+            f"BEGIN {_rollup_deltas('OLD', -1)}; {_rollup_deltas('NEW', 1)}; END"
+        )
+        self.rebuild_rollups()
+        self.set_meta(ROLLUPS_KEY, "1")
+        self.conn.commit()
+
+    def rebuild_rollups(self):
+        """Re-sum the rollups table from the bets (the triggers keep it current after that)."""
+        from kpis import sums_sql
+
+        with span("rebuild rollups"):
+            self.conn.execute("DELETE FROM rollups")
+            for dimension, header in ROLLUP_DIMENSIONS.items():
+                column = COLUMNS[HEADERS.index(header)]
+                self.conn.execute(
+                    f"INSERT INTO rollups (dimension, key, {', '.join(SUM_FIELDS)}) "
+                    f"SELECT ?, key, {sums_sql('r', 'bonus', 'stake', 'net_pnl')} "
+                    f"FROM (SELECT COALESCE({column}, '') AS key, TRIM(COALESCE(result, '')) AS r, "
+                    f"bonus, stake, net_pnl FROM bets) GROUP BY key",
+                    (dimension,),
+                )
+
+    def _refresh_partitions(self):
+        """Fill in missing months and days, then re-sum the manifest rows of every queued month."""
+        if self.readonly:
+            return  # brought up to date when opened
+        missing = self.conn.execute("SELECT id, date FROM bets WHERE month IS NULL").fetchall()
+        if missing:
+            with span("backfill months", rows=len(missing)):
+                self.conn.executemany(
+                    "UPDATE bets SET month = ? WHERE id = ?",
+                    [(partition_of(date), row_id) for row_id, date in missing],
+                )
+        missing = self.conn.execute("SELECT id, date FROM bets WHERE day IS NULL").fetchall()
+        if missing:
+            with span("backfill days", rows=len(missing)):
+                self.conn.executemany(
+                    "UPDATE bets SET day = ? WHERE id = ?",
+                    [(_fingerprint_date(date), row_id) for row_id, date in missing],
+                )
+        dirty = [row[0] for row in self.conn.execute("SELECT month FROM partitions_dirty")]
+        if not dirty:
+            return
+        from kpis import sums_sql
+
+        with span("refresh partitions", partitions=len(dirty)):
+            for start in range(0, len(dirty), 500):
+                chunk = dirty[start:start + 500]
+                marks = ", ".join("?" * len(chunk))
+                self.conn.execute(f"DELETE FROM partitions WHERE month IN ({marks})", chunk)
+                self.conn.execute(
+                    f"""
+                    INSERT INTO partitions ({', '.join(('month',) + PARTITION_COLUMNS)})
+                    SELECT month, {sums_sql('r', 'bonus', 'stake', 'net_pnl')},
+                           (SELECT cumulative_pnl FROM bets AS last
+                            WHERE last.month = b.month AND last.cumulative_pnl IS NOT NULL
+                            ORDER BY last.id DESC LIMIT 1),
+                           MIN(id), MAX(id)
+                    FROM (SELECT id, month, TRIM(COALESCE(result, '')) AS r, bonus, stake, net_pnl
+                          FROM bets WHERE month IN ({marks})) AS b
+                    GROUP BY month
+                    """,
+                    chunk,
+                )
+            self.conn.execute("DELETE FROM partitions_dirty")
+
+    def _record(self, values):
+        record = dict(zip(HEADERS, values))
+        record["Bonus"] = bool(record["Bonus"])
+        return record
+
+    def _params(self, record):
+        values = []
+        for header in HEADERS:
+            value = record.get(header)
+            if header == "Date":
+                value = _normalize_date(value)
+            elif header == "Bonus":
+                value = int(bool(value))
+            values.append(value)
+        return values
+
+    def rows(self):
+        with span("read rows") as timing:
+            cur = self.conn.execute(f"SELECT id, {', '.join(COLUMNS)} FROM bets ORDER BY id")
+            out = [(row[0], self._record(row[1:])) for row in cur]
+            timing.add(rows=len(out))
+        return out
+
+    def iter_records(self):
+        cur = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM bets ORDER BY id")
+        for row in cur:
+            yield self._record(row)
+
+    def get(self, row_id):
+        row = self.conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM bets WHERE id = ?", (int(row_id),)
+        ).fetchone()
+        return self._record(row) if row else None
+
+    def select(self, result=None, sportsbook=None, date=None):
+        # Each filter is answered by its column index (bets_result / bets_day / bets_sportsbook);
+        # dates are compared normalized, on the day column
+        self._refresh_partitions()
+        clauses, params = [], []
+        for header, values in _select_filters(result, sportsbook, date):
+            column = "day" if header == "Date" else COLUMNS[HEADERS.index(header)]
+            values = sorted(values, key=str)
+            clause = f"{column} IN ({', '.join('?' * len(values))})"
+            if "" in values and header != "Date":
+                clause = f"({clause} OR {column} IS NULL)"
+            clauses.append(clause)
+            params.extend(values)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        cur = self.conn.execute(f"SELECT id, {', '.join(COLUMNS)} FROM bets{where} ORDER BY id", params)
+        return [(row[0], self._record(row[1:])) for row in cur]
+
+    def rows_after(self, row_id):
+        cur = self.conn.execute(
+            f"SELECT id, {', '.join(COLUMNS)} FROM bets WHERE id > ? ORDER BY id", (int(row_id),)
+        )
+        return [(row[0], self._record(row[1:])) for row in cur]
+
+    def rows_in(self, months):
+        # One bets_month index range per partition
+        self._refresh_partitions()
+        months = sorted(set(months))
+        if not months:
+            return []
+        with span("read rows", partitions=len(months)) as timing:
+            cur = self.conn.execute(
+                f"SELECT id, {', '.join(COLUMNS)} FROM bets WHERE month IN ({', '.join('?' * len(months))}) "
+                "ORDER BY id",
+                months,
+            )
+            out = [(row[0], self._record(row[1:])) for row in cur]
+            timing.add(rows=len(out))
+        return out
+
+    def partitions(self):
+        self._refresh_partitions()
+        cur = self.conn.execute(
+            f"SELECT month, {', '.join(PARTITION_COLUMNS)} FROM partitions ORDER BY month"
+        )
+        return [dict(zip(("month",) + PARTITION_COLUMNS, row)) for row in cur]
+
+    def rollups(self, dimension):
+        # Rows emptied by deletes or edits stay in the table with bets = 0
+        cur = self.conn.execute(
+            f"SELECT key, {', '.join(SUM_FIELDS)} FROM rollups WHERE dimension = ? AND bets > 0 ORDER BY key",
+            (dimension,),
+        )
+        return {row[0]: dict(zip(SUM_FIELDS, row[1:])) for row in cur}
+
+    def next_row_id(self):
+        # AUTOINCREMENT never reuses ids, so the next one comes from sqlite_sequence
+        row = self.conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'bets'").fetchone()
+        return (row[0] if row else 0) + 1
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def cumulative_before(self, row_id):
+        if row_id is None:
+            row = self.conn.execute(
+                "SELECT cumulative_pnl FROM bets WHERE cumulative_pnl IS NOT NULL ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT cumulative_pnl FROM bets WHERE id < ? AND cumulative_pnl IS NOT NULL "
+                "ORDER BY id DESC LIMIT 1",
+                (int(row_id),),
+            ).fetchone()
+        return _to_float(row[0], 0.0) if row else 0.0
+
+    def append(self, records):
+        sql = (f"INSERT INTO bets ({', '.join(COLUMNS)}, fingerprint, month, day) "
+               f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))})")
+        return [
+            self.conn.execute(
+                sql,
+                self._params(record)
+                + [fingerprint(record), partition_of(record.get("Date")), _fingerprint_date(record.get("Date"))],
+            ).lastrowid
+            for record in records
+        ]
+
+    def fingerprint_counts(self, fingerprints):
+        fingerprints = list(fingerprints)
+        counts = {}
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            counts.update(self.conn.execute(
+                f"SELECT fingerprint, COUNT(*) FROM bets WHERE fingerprint IN ({', '.join('?' * len(chunk))}) "
+                "GROUP BY fingerprint",
+                chunk,
+            ).fetchall())
+        return counts
+
+    def update(self, row_id, record):
+        present = [(col, header) for col, header in zip(COLUMNS, HEADERS) if header in record]
+        if not present:
+            return
+        params = dict(zip(HEADERS, self._params(record)))
+        self.conn.execute(
+            f"UPDATE bets SET {', '.join(f'{col} = ?' for col, _ in present)} WHERE id = ?",
+            [params[header] for _, header in present] + [int(row_id)],
+        )
+        if any(header in record for header in FINGERPRINT_FIELDS):
+            # Set after the row update, which the staleness triggers answer by clearing them
+            current = self.get(row_id)
+            if current is not None:
+                self.conn.execute(
+                    "UPDATE bets SET fingerprint = ?, month = ?, day = ? WHERE id = ?",
+                    (fingerprint(current), partition_of(current.get("Date")),
+                     _fingerprint_date(current.get("Date")), int(row_id)),
+                )
+
+    def delete(self, row_ids, soft=False):
+        # Rows are removed from the primary-key b-tree in place, so a hard delete is
+        # already as cheap as a tombstone; compact() returns the free pages to the OS.
+        ids = sorted({int(rid) for rid in row_ids})
+        if not ids:
+            return 0
+        # Only the DELETE's own rows: total_changes also counts the rollup and partition triggers
+        removed = self.conn.executemany("DELETE FROM bets WHERE id = ?", [(rid,) for rid in ids]).rowcount
+        self.recompute_cumulative(from_row=ids[0])
+        return removed
+
+    def compact(self):
+        self.conn.commit()
+        free_pages = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        self.conn.execute("VACUUM")
+        return free_pages
+
+    def recompute_cumulative(self, from_row=None):
+        first = int(from_row) if from_row is not None else 0
+        rows = self.conn.execute(
+            "SELECT id, net_pnl FROM bets WHERE id >= ? ORDER BY id", (first,)
+        ).fetchall()
+        if not rows:
+            return
+        ids, net = zip(*rows)
+        cum = cumulative_pnl(net, self.cumulative_before(first) if first else 0.0)
+        self.conn.executemany(
+            "UPDATE bets SET cumulative_pnl = ? WHERE id = ?",
+            [(to_optional(value), row_id) for value, row_id in zip(cum, ids)],
+        )
+
+    def reprice(self):
+        rows = self.conn.execute(
+            "SELECT id, odds, stake, result, bonus, profit_boost FROM bets ORDER BY id"
+        ).fetchall()
+        if not rows:
+            return
+        ids, odds, stake, result, bonus, boost = zip(*rows)
+        priced = price_columns(odds, stake, result, bonus, boost)
+        self.conn.executemany(
+            "UPDATE bets SET decimal_odds = ?, payout = ?, net_pnl = ?, cumulative_pnl = ? WHERE id = ?",
+            [
+                (to_optional(dec), to_optional(payout), to_optional(net), to_optional(cum), row_id)
+                for dec, payout, net, cum, row_id in zip(
+                    priced["decimal_odds"], priced["payout"], priced["net_pnl"], priced["cumulative_pnl"], ids
+                )
+            ],
+        )
+
+    def save(self):
+        self._refresh_partitions()
+        with span("commit", path=self.path):
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+# -------------------------------
+# Backend selection, migration, export
+# -------------------------------
+def migrate_excel_to_sqlite(xlsx_path=FILE_PATH, db_path=DB_PATH):
+    """One-time copy of the "Bet Log" sheet into a new SQLite ledger. Returns rows copied."""
+    if os.path.exists(db_path):
+        raise FileExistsError(f"{db_path} already exists; refusing to migrate over it")
+
+    source = ExcelStore(xlsx_path, create=False)
+    rows = [record for _, record in source.rows()]
+    source.close()
+
+    # Build next to the target and rename so a crash never leaves half a ledger
+    tmp_path = db_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    target = SQLiteStore(tmp_path, lock_path=db_path + ".lock")
+    target.append(rows)
+    target.conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+        (os.path.abspath(xlsx_path),),
+    )
+    target.save()
+    target.conn.execute("PRAGMA journal_mode=DELETE")
+    target.close()
+    os.replace(tmp_path, db_path)
+    return len(rows)
+
+
+def open_store(backend=None, create=True, readonly=False):
+    """
+    Open the configured ledger. The first SQLite open migrates an existing
+    workbook automatically. With create=False a missing ledger raises FileNotFoundError.
+    readonly (readers) implies create=False; a read-only SQLite ledger never writes.
+    """
+    backend = backend or BACKEND
+    if backend == "excel":
+        return ExcelStore(FILE_PATH, create=create and not readonly)
+    if backend == "sqlite":
+        if not os.path.exists(DB_PATH) and os.path.exists(FILE_PATH):
+            with file_lock(DB_PATH + ".lock"):
+                if not os.path.exists(DB_PATH):
+                    migrate_excel_to_sqlite(FILE_PATH, DB_PATH)
+        return SQLiteStore(DB_PATH, create=create, readonly=readonly)
+    raise ValueError(f"Unknown BET_TRACKER_BACKEND {backend!r} (expected 'sqlite' or 'excel')")
+
+
+def compact_workbook(path=FILE_PATH):
+    """
+    Compact an existing workbook in place: drop tombstoned, blank and style-only rows
+    and collapse duplicated conditional formatting. Returns before/after stats.
+    """
+    def measure():
+        started = time.perf_counter()
+        wb = openpyxl.load_workbook(path)
+        load_seconds = time.perf_counter() - started
+        rules = count_conditional_rules(wb["Bet Log"]) if "Bet Log" in wb.sheetnames else 0
+        wb.close()
+        return os.path.getsize(path), load_seconds, rules
+
+    size_before, load_before, rules_before = measure()
+    # The ledger lock (writer.ledger_lock("excel")), so no bet saved meanwhile is lost
+    with file_lock(path + ".lock"):
+        workbook = ExcelStore(path, create=False)
+        rows_removed = workbook.compact()
+        workbook.save()
+        workbook.close()
+    size_after, load_after, rules_after = measure()
+    return {
+        "rows_removed": rows_removed,
+        "rules_before": rules_before,
+        "rules_after": rules_after,
+        "size_before": size_before,
+        "size_after": size_after,
+        "load_seconds_before": load_before,
+        "load_seconds_after": load_after,
+    }
+
+
+_held_locks = threading.local()
+
+
+def holds_lock(path):
+    """Whether this thread is inside file_lock(path)."""
+    return os.path.abspath(path) in getattr(_held_locks, "paths", ())
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive advisory lock on `path` (created if missing) for the block.
+    Blocks until every other holder, in any thread or process, lets go. Re-entrant
+    within a thread: nested blocks share the outer one's lock.
+    """
+    if holds_lock(path):
+        yield
+        return
+    if not hasattr(_held_locks, "paths"):
+        _held_locks.paths = set()
+    key = os.path.abspath(path)
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after ~10s; keep waiting
+                    continue
+        _held_locks.paths.add(key)
+        yield
+    finally:
+        _held_locks.paths.discard(key)
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            handle.close()
+
+
+_compaction_lock = threading.Lock()
+
+
+def _compact_ledger(backend):
+    # Goes through the single writer like any other mutation
+    import writer
+    try:
+        writer.run(lambda store: store.compact(), backend)
+    finally:
+        _compaction_lock.release()
+
+
+def compact_in_background(backend=None):
+    """
+    Compact the ledger on a daemon thread. Returns False (and does nothing)
+    if a compaction is already running in this process.
+    """
+    if not _compaction_lock.acquire(blocking=False):
+        return False
+    threading.Thread(target=_compact_ledger, args=(backend,), daemon=True).start()
+    return True
+
+
+def ledger_signature(backend=None):
+    """
+    (path, mtime_ns, size) for each file backing the ledger, including its journal.
+    Any write changes it, so it is a cheap cache key for readers.
+    Raises FileNotFoundError if there is no ledger.
+    """
+    backend = backend or BACKEND
+    if backend == "sqlite" and os.path.exists(DB_PATH):
+        paths = [DB_PATH, DB_PATH + "-wal"]
+    else:
+        # Excel backend, or a workbook the first SQLite open will migrate
+        paths = [FILE_PATH]
+    paths.append(ledger_path(backend) + ".journal")
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if path == paths[0]:
+                raise
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def export_excel(store, path=FILE_PATH, last_id=None):
+    """
+    Write the ledger (only rows up to last_id, if given) to a fresh "Bet Log" sheet at
+    path. Returns rows written.
+    """
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Bet Log"
+    ws.append(HEADERS)
+    count = 0
+    for row_id, record in store.rows():
+        if last_id is not None and row_id > last_id:
+            break
+        ws.append([record.get(header) for header in HEADERS])
+        count += 1
+    add_net_pnl_formatting(ws)
+    wb.save(path)
+    wb.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bet Tracker ledger maintenance.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help=f"copy the 'Bet Log' sheet of {FILE_PATH} into {DB_PATH}")
+    sub.add_parser("reprice", help="recompute payout, Net and Cumulative PnL for every bet")
+    sub.add_parser("compact", help="remove soft-deleted rows and shrink the workbook")
+    export_cmd = sub.add_parser("export", help="write the SQLite ledger to an Excel workbook")
+    export_cmd.add_argument("--out", default=FILE_PATH)
+    sub.add_parser("partitions", help="print the monthly partition manifest")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a JSON timing line per operation to stderr")
+    args = parser.parse_args()
+
+    setup_cli(args.profile)
+
+    with operation(f"storage {args.command}"):
+        if args.command == "migrate":
+            copied = migrate_excel_to_sqlite(FILE_PATH, DB_PATH)
+            print(f"✅ Migrated {copied} bet(s) from {FILE_PATH} to {DB_PATH}")
+        elif args.command == "reprice":
+            import writer
+            writer.run(lambda store: store.reprice())
+            print("✅ Repriced every bet in the ledger")
+        elif args.command == "compact":
+            if BACKEND != "excel":
+                import writer
+                pages = writer.run(lambda store: store.compact())
+                print(f"✅ Vacuumed {DB_PATH} ({pages} free page(s) reclaimed)")
+            if os.path.exists(FILE_PATH):
+                stats = compact_workbook(FILE_PATH)
+                print(f"✅ Compacted {FILE_PATH}: {stats['rows_removed']} row(s) removed, "
+                      f"{stats['rules_before']} -> {stats['rules_after']} conditional format rule(s)")
+                print(f"   size {stats['size_before'] / 1024:,.1f} KB -> {stats['size_after'] / 1024:,.1f} KB, "
+                      f"load {stats['load_seconds_before']:.2f}s -> {stats['load_seconds_after']:.2f}s")
+        elif args.command == "export":
+            # Streamed through xlsxwriter so large ledgers export in constant memory
+            from export_xlsx import export_ledger
+            try:
+                summary = export_ledger(args.out, backend="sqlite")
+            except ValueError as exc:
+                sys.exit(f"❌ Nothing exported, {exc}")
+            print(f"✅ Exported {summary['totals']['bets']} bet(s) to {args.out}")
+        elif args.command == "partitions":
+            with open_store(readonly=True) as store:
+                for part in store.partitions():
+                    closing = part["closing_cumulative"]
+                    print(f"{part['month'] or 'undated':>8}  {part['bets']:>7,} bet(s)  "
+                          f"stake {part['total_stake']:>12,.2f}  net {part['total_pnl']:>12,.2f}  "
+                          f"cumulative {'-' if closing is None else f'{closing:,.2f}':>12}")
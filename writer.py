@@ -0,0 +1,120 @@
+from concurrent.futures import Future
+import queue
+import threading
+
+import journal
+from profiling import operation, span
+from storage import BACKEND, file_lock, ledger_path, open_store
+
+# Most jobs coalesced into one load / save cycle
+MAX_BATCH = 500
+
+
+# -------------------------------
+# Advisory file lock (shared by every process touching the ledger)
+# -------------------------------
+def lock_path(backend=None):
+    return ledger_path(backend) + ".lock"
+
+
+def ledger_lock(backend=None):
+    """Exclusive advisory lock on the ledger, held by whoever is writing it."""
+    return file_lock(lock_path(backend))
+
+
+# -------------------------------
+# Single writer
+# -------------------------------
+class LedgerWriter:
+    """
+    Serializes every ledger mutation in this process on one background thread.
+    A job is a callable taking the open store; submit() returns a Future with
+    its result. Jobs queued while a save is in flight are applied together under
+    one file lock, one load and one save, in submission order. If a job raises,
+    the batch is discarded unsaved, that job's Future gets the exception and the
+    other jobs are retried, so a bad job never loses or half-applies anyone else's.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or BACKEND
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        future = Future()
+        self.jobs.put((job, future))
+        return future
+
+    def run(self, job):
+        """Submit a job and wait for its result (re-raising its exception)."""
+        return self.submit(job).result()
+
+    def _next_batch(self):
+        batch = [self.jobs.get()]
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return [(job, future) for job, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        while True:
+            pending = self._next_batch()
+            while pending:
+                pending = self._apply(pending)
+
+    def _apply(self, batch):
+        """Apply one batch; returns the jobs that still need to run."""
+        results = []
+        try:
+            with operation("write batch", jobs=len(batch)), ledger_lock(self.backend):
+                # Opened under the lock, so cumulative lookups see every other writer's bets
+                store = open_store(self.backend)
+                try:
+                    # Journaled events go first: they were logged before anything queued here
+                    with span("fold journal"):
+                        folded = journal.fold(store, self.backend)
+                    with span("apply jobs"):
+                        for idx, (job, future) in enumerate(batch):
+                            try:
+                                results.append(job(store))
+                            except BaseException as exc:
+                                future.set_exception(exc)
+                                return batch[:idx] + batch[idx + 1:]
+                    store.save()
+                finally:
+                    store.close()
+                journal.release(folded, self.backend)
+        except BaseException as exc:
+            # Could not open or save the ledger: nothing in the batch was applied
+            for _, future in batch:
+                future.set_exception(exc)
+            return []
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        return []
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(backend=None):
+    """The process-wide writer for a backend, started on first use."""
+    backend = backend or BACKEND
+    with _writers_lock:
+        writer = _writers.get(backend)
+        if writer is None:
+            writer = _writers[backend] = LedgerWriter(backend)
+        return writer
+
+
+def submit(job, backend=None):
+    return get_writer(backend).submit(job)
+
+
+def run(job, backend=None):
+    return get_writer(backend).run(job)